@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The agent views are async and hand blocking agent calls to a bounded executor
+(settings.AGENT_EXECUTOR), so serve the app with an ASGI server, e.g.
+
+    gunicorn OCI_Agents_App.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
@@ -14,3 +19,13 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OCI_Agents_App.settings')
 
 application = get_asgi_application()
+
+# Connect to OCI in the background so the first request does not pay for it (settings.OCI_WARM_UP)
+from agents.oci_clients import start_warm_up  # noqa: E402
+
+start_warm_up()
+
+# Send APEX rows still pending from before a restart (settings.APEX_OUTBOX)
+from agents.outbox import start_flusher  # noqa: E402
+
+start_flusher()
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     ]
 
 MIDDLEWARE = [
+    'agents.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     #'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -69,6 +70,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'OCI_Agents_App.wsgi.application'
+ASGI_APPLICATION = 'OCI_Agents_App.asgi.application'
 
 
 # Database
@@ -179,3 +181,127 @@ SMTP_PASSWORD = env('SMTP_PASSWORD')
 SMTP_MAIL_SERVER = env('SMTP_MAIL_SERVER')
 # Use env.int() to cast the port number to an integer
 SMTP_MAIL_PORT = env.int('SMTP_MAIL_PORT') 
+
+# Shared IMAP connection pool used by every mailbox-backed agent tool
+IMAP_POOL = {
+    "MAX_SIZE": env.int('IMAP_POOL_MAX_SIZE', default=4),
+    "IDLE_TIMEOUT": 300,        # seconds before an unused connection is logged out
+    "HEALTH_CHECK_AFTER": 30,   # seconds idle before a NOOP check on checkout
+    "ACQUIRE_TIMEOUT": 60,
+    "CONNECT_TIMEOUT": 30,
+}
+
+# Attachment uploads to OCI Object Storage
+OBJECT_STORAGE_UPLOAD = {
+    "MAX_WORKERS": env.int('UPLOAD_MAX_WORKERS', default=8),
+    "MAX_RETRIES": 3,
+    "BACKOFF": 1.0,                          # seconds, doubled per retry with jitter
+    "MULTIPART_THRESHOLD": 16 * 1024 * 1024, # bytes; larger objects use UploadManager
+    "PART_SIZE": 8 * 1024 * 1024,
+}
+
+# Pooled HTTP clients per upstream (timeouts in seconds). "default" applies to every upstream.
+HTTP_UPSTREAMS = {
+    "default": {
+        "CONNECT_TIMEOUT": 5,
+        "READ_TIMEOUT": 30,
+        "RETRIES": 3,
+        "BACKOFF": 0.5,
+    },
+    # ORDS endpoints in agents/config_STAGE.py (APEX_API_URL_*)
+    "apex": {
+        "POOL_MAXSIZE": 16,
+        "READ_TIMEOUT": 20,
+    },
+    # PEOPLESOFT_API_URL
+    "peoplesoft": {
+        "POOL_MAXSIZE": 10,
+        "READ_TIMEOUT": 30,
+    },
+}
+
+# Write-behind outbox for APEX email-detail inserts (see agents/outbox.py)
+APEX_OUTBOX = {
+    "ENABLED": env.bool('APEX_OUTBOX_ENABLED', default=True),
+    "BATCH_SIZE": 50,
+    "FLUSH_INTERVAL": 2,
+    "MAX_ATTEMPTS": 8,
+    "BACKOFF": 5,
+    "MAX_BACKOFF": 600,
+    "LEASE_SECONDS": None,    # derived from BATCH_SIZE and the "apex" timeouts above
+    "HIGH_WATERMARK": 5000,
+    "BACKPRESSURE_WAIT": 30,
+}
+
+# In-process caches in front of the PeopleSoft PO and vendor lookups (seconds)
+LOOKUP_CACHE = {
+    "po": {"MAX_ENTRIES": 2048, "TTL": 300, "STALE_TTL": 900, "NEGATIVE_TTL": 60},
+    "vendor": {"MAX_ENTRIES": 2048, "TTL": 3600, "STALE_TTL": 3600, "NEGATIVE_TTL": 120},
+}
+
+# Bulk PO / vendor lookups (agents/bulk_lookup.py)
+BULK_LOOKUP = {
+    "MAX_IDS": 1000,
+    "MAX_WORKERS": env.int('BULK_LOOKUP_MAX_WORKERS', default=8),
+}
+
+# Process-wide agent registry (agents/agent_registry.py)
+AGENT_REGISTRY = {
+    "REGION": "us-chicago-1",
+    "REUSE_SESSIONS": env.bool('AGENT_REUSE_SESSIONS', default=False),  # shares conversation history across callers
+    "SESSION_MAX_RUNS": 10,
+    "SESSION_MAX_AGE": 1800,
+    "MAX_IDLE_SESSIONS": 4,
+}
+
+# Direct PeopleSoft lookups for well-formed PO / vendor IDs (agents/fast_path.py)
+FAST_PATH = {
+    "ENABLED": env.bool('FAST_PATH_ENABLED', default=True),
+    "SUMMARY": True,
+}
+
+# Bounded thread pool for blocking agent / SDK calls made from async views (agents/executor.py)
+AGENT_EXECUTOR = {
+    "MAX_WORKERS": env.int('AGENT_EXECUTOR_MAX_WORKERS', default=8),
+    "MAX_PENDING": env.int('AGENT_EXECUTOR_MAX_PENDING', default=32),
+}
+
+# Background agent jobs (agents/jobs.py); run `manage.py run_agent_jobs` for dedicated workers
+AGENT_JOBS = {
+    "ENABLED": env.bool('AGENT_JOBS_ENABLED', default=True),
+    "POLL_INTERVAL": 2,
+    "PROGRESS_INTERVAL": 1,
+    "STALE_AFTER": 900,
+    # Set to 0 when run_agent_jobs workers are deployed
+    "IN_PROCESS_WORKERS": env.int('AGENT_JOBS_IN_PROCESS_WORKERS', default=1),
+}
+
+# Resolve the OCI namespace and build the agents on a background thread when a server boots
+OCI_WARM_UP = env.bool('OCI_WARM_UP', default=True)
+
+# Alert classification rules (agents/alert_rules.py); the JSON file is reloaded when it changes
+ALERT_RULES = {
+    "RULES_FILE": env('ALERT_RULES_FILE', default=None),
+    "THRESHOLD": env.float('ALERT_RULES_THRESHOLD', default=1.0),
+}
+
+# Process pool for parsing large RFC822 backlogs (agents/mime_pipeline.py, EMAIL_FETCH_MODE=rfc822);
+# off by default, enable where benchmarks/mime_pipeline_bench.py shows a gain on the host
+MIME_PIPELINE = {
+    "ENABLED": env.bool('MIME_PIPELINE_ENABLED', default=False),
+    "WORKERS": env.int('MIME_PIPELINE_WORKERS', default=0),
+    "MIN_MESSAGES": env.int('MIME_PIPELINE_MIN_MESSAGES', default=200),
+}
+
+# Defaults for `manage.py backfill_invoices` (agents/backfill.py)
+BACKFILL = {
+    "CHUNK_SIZE": 500,
+    "CONNECTIONS": env.int('BACKFILL_CONNECTIONS', default=4),
+    "MAX_COMMANDS_PER_SECOND": env.float('BACKFILL_MAX_COMMANDS_PER_SECOND', default=0),
+}
+
+# Prometheus scrape endpoint at /metrics (agents/metrics.py); set a token to require "Authorization: Bearer <token>"
+# there and at /lookup-cache/stats/
+METRICS = {
+    "TOKEN": env('METRICS_TOKEN', default=None),
+}
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OCI_Agents_App.settings')
 
 application = get_wsgi_application()
+
+# Connect to OCI in the background so the first request does not pay for it (settings.OCI_WARM_UP)
+from agents.oci_clients import start_warm_up  # noqa: E402
+
+start_warm_up()
+
+# Send APEX rows still pending from before a restart (settings.APEX_OUTBOX)
+from agents.outbox import start_flusher  # noqa: E402
+
+start_flusher()
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from oci.addons.adk import Agent, AgentClient
+
+from . import metrics
+from . import progress
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT_REGISTRY = {
+    "AUTH_TYPE": "api_key",
+    "PROFILE": "DEFAULT",
+    "REGION": "us-chicago-1",
+    # Pooled sessions keep their conversation history, which then leaks between callers and
+    # lets an agent answer from an earlier run instead of calling its tool. Off by default.
+    "REUSE_SESSIONS": False,
+    "SESSION_MAX_RUNS": 10,     # runs per session before it is retired
+    "SESSION_MAX_AGE": 1800,    # seconds; kept under the endpoint's idle session timeout
+    "MAX_IDLE_SESSIONS": 4,     # per agent
+}
+
+
+def registry_config():
+    config = dict(DEFAULT_AGENT_REGISTRY)
+    config.update(getattr(settings, "AGENT_REGISTRY", {}))
+    return config
+
+
+_local = threading.local()
+
+
+def _thread_event_loop():
+    """Agent.run drives asyncio.get_event_loop(); give each thread one loop and keep it."""
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _local.loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def _report_tool_action(required_action, performed_action):
+    output = performed_action.function_call_output if performed_action else None
+    progress.report("tool_result", tool=required_action.function_call.name, output=output)
+
+
+def _report_agent_step(request, response):
+    progress.report("agent_step")
+
+
+class _Session:
+    __slots__ = ("session_id", "created_at", "runs")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.created_at = time.monotonic()
+        self.runs = 0
+
+
+class SessionPool:
+    """
+    Idle agent sessions that can be handed to the next run instead of creating a new one.
+    A session is used by one run at a time and retired after `max_runs` runs or `max_age`
+    seconds, so conversation history stays short.
+    """
+
+    def __init__(self, max_idle=4, max_runs=10, max_age=1800):
+        self.max_idle = max_idle
+        self.max_runs = max_runs
+        self.max_age = max_age
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def checkout(self):
+        """Returns an idle session, or None to have the run create one."""
+        with self._lock:
+            while self._idle:
+                session = self._idle.pop()
+                if time.monotonic() - session.created_at < self.max_age:
+                    return session
+        return None
+
+    def checkin(self, session):
+        """Returns a session after a successful run. Returns False if it was retired instead."""
+        session.runs += 1
+        if session.runs >= self.max_runs or time.monotonic() - session.created_at >= self.max_age:
+            return False
+        with self._lock:
+            if len(self._idle) >= self.max_idle:
+                return False
+            self._idle.append(session)
+        return True
+
+
+class AgentSpec:
+    def __init__(self, endpoint_key, instructions, tools=None):
+        self.endpoint_key = endpoint_key
+        self.instructions = instructions
+        self.tools = tools
+
+
+class AgentRegistry:
+    """
+    Builds each registered Agent once per process on a single shared AgentClient, instead
+    of re-reading the OCI config and re-registering tools on every request. Agents are
+    stateless between runs, so one instance serves concurrent requests; each worker thread
+    drives runs on its own long-lived event loop. Each run gets a fresh session that is deleted
+    afterwards; with REUSE_SESSIONS, runs take a warm session from a per-agent pool instead.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._agents = {}
+        self._sessions = {}
+        self._client = None
+        self._lock = threading.Lock()
+
+    def register(self, name, endpoint_key, instructions, tools=None):
+        self._specs[name] = AgentSpec(endpoint_key, instructions, tools)
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    config = registry_config()
+                    self._client = AgentClient(
+                        auth_type=config["AUTH_TYPE"], profile=config["PROFILE"], region=config["REGION"]
+                    )
+        return self._client
+
+    def get(self, name):
+        agent = self._agents.get(name)
+        if agent is None:
+            spec = self._specs[name]
+            client = self.client()
+            with self._lock:
+                agent = self._agents.get(name)
+                if agent is None:
+                    with metrics.timed("agent_setup"):
+                        agent = Agent(
+                            client=client,
+                            agent_endpoint_id=settings.AGENT_ENDPOINT_ID.get(spec.endpoint_key),
+                            instructions=spec.instructions,
+                            tools=spec.tools,
+                        )
+                    self._agents[name] = agent
+                    logger.info(f"Built agent '{name}' for endpoint {spec.endpoint_key}")
+        return agent
+
+    def _session_pool(self, name):
+        pool = self._sessions.get(name)
+        if pool is None:
+            config = registry_config()
+            with self._lock:
+                pool = self._sessions.setdefault(name, SessionPool(
+                    max_idle=config["MAX_IDLE_SESSIONS"],
+                    max_runs=config["SESSION_MAX_RUNS"],
+                    max_age=config["SESSION_MAX_AGE"],
+                ))
+        return pool
+
+    def run(self, name, prompt, **kwargs):
+        """Runs agent `name` on `prompt` and returns the ADK RunResponse. Blocks; call it from a worker thread."""
+        agent = self.get(name)
+        reuse = registry_config()["REUSE_SESSIONS"]
+        session = self._session_pool(name).checkout() if reuse else None
+
+        _thread_event_loop()
+        # Surface tool calls and chat round trips to whoever is listening (jobs, SSE streams).
+        kwargs.setdefault("on_fulfilled_required_action", _report_tool_action)
+        kwargs.setdefault("on_invoked_remote_service", _report_agent_step)
+        if session is None:
+            # Created here rather than inside agent.run so its latency is measured on its own.
+            with metrics.timed("agent_session_create"):
+                session = _Session(agent.create_session())
+        try:
+            with metrics.timed("agent_run"):
+                response = agent.run(prompt, session_id=session.session_id, **kwargs)
+        except Exception:
+            metrics.agent_runs.inc(agent=name, outcome="error")
+            # The session may be mid-conversation or gone; let the next run start clean.
+            self._delete_session(agent, session.session_id)
+            raise
+        metrics.agent_runs.inc(agent=name, outcome="success")
+
+        if not (reuse and self._session_pool(name).checkin(session)):
+            self._delete_session(agent, session.session_id)
+        return response
+
+    def _delete_session(self, agent, session_id):
+        """Deletes a retired session off the request path; the endpoint expires it anyway."""
+        def delete():
+            try:
+                agent.delete_session(session_id)
+            except Exception as e:
+                logger.debug(f"Ignoring error deleting agent session {session_id}: {e}")
+
+        threading.Thread(target=delete, name="agent-session-delete", daemon=True).start()
+
+    def warm(self, names=None):
+        """Builds the named agents (all registered ones by default) ahead of the first request."""
+        for name in names or list(self._specs):
+            self.get(name)
+
+
+registry = AgentRegistry()
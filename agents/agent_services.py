@@ -4,24 +4,50 @@ import logging
 import json
 import requests
 from datetime import datetime
-import asyncio
+import socket
+import threading
+import uuid
+from collections import deque
+from contextlib import closing
 from django.conf import settings
-from oci.addons.adk import tool, AgentClient, Agent
+from django.db import transaction
+from oci.addons.adk import tool
 import imaplib, email
 from datetime import datetime,timedelta
 from email import policy
 from django.http import JsonResponse
-import oci
-from email.header import decode_header, make_header
+from . import alert_rules
+from . import cache
+from .agent_registry import registry as agent_registry
 from . import config_STAGE as l_env
+from . import http_client
+from . import mailbox
+from . import metrics
+from . import mime_pipeline
+from . import oci_clients
+from . import outbox
+from . import progress
+from .imap_pool import get_imap_pool
+from .models import AlertDigest, AttachmentDigest, DuplicateAttachment, MailboxCheckpoint, MessageFailure
+from .uploads import UploadPipeline, content_digest
 
 logger = logging.getLogger(__name__)
 DAYS_INTERVAL = int(os.getenv("DAYS_INTERVAL", "1"))
-
-# OCI setup
-oci_config = oci.config.from_file(l_env.OCI_CONFIG)
-object_storage = oci.object_storage.ObjectStorageClient(oci_config)
-namespace = object_storage.get_namespace().data
+# "structure" fetches BODYSTRUCTURE first and downloads only attachment sections;
+# "rfc822" keeps the original full-message download.
+EMAIL_FETCH_MODE = os.getenv("EMAIL_FETCH_MODE", "structure").lower()
+# Attachments larger than one chunk are downloaded in chunks of this many (encoded) bytes and
+# decoded into a temporary file that stays in memory up to ATTACHMENT_SPOOL_BYTES.
+ATTACHMENT_CHUNK_BYTES = int(os.getenv("ATTACHMENT_CHUNK_BYTES", str(1024 * 1024)))
+ATTACHMENT_SPOOL_BYTES = int(os.getenv("ATTACHMENT_SPOOL_BYTES", str(4 * 1024 * 1024)))
+# Skip uploading attachments whose content is already in the AttachmentDigest index.
+ATTACHMENT_DEDUP = os.getenv("ATTACHMENT_DEDUP", "true").lower() in ("1", "true", "yes")
+# Seconds a scan holds the per-mailbox lease; a crashed holder blocks other scans this long.
+INGEST_LOCK_LEASE = int(os.getenv("INGEST_LOCK_LEASE", "3600"))
+# Failed attempts at one message before scans skip it (recorded in MessageFailure).
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+# OCI setup: clients and the namespace are resolved on first use (see oci_clients)
 bucket_name = settings.OCI_BUCKET_NAME
 
 # ============  EmailAgent ======================
@@ -36,8 +62,8 @@ class EmailData:
         self.PROCESSED = 'N'
         self.L_UID = l_uid
 
-    def insert(self):
-        payload = {
+    def payload(self):
+        return {
             "FROM_EMAIL": self.FROM_EMAIL,
             "TO_EMAIL": self.TO_EMAIL,
             "SUBJECT_LINE": self.SUBJECT_LINE,
@@ -46,149 +72,462 @@ class EmailData:
             "PROCESSED": self.PROCESSED,
             "L_UID": self.L_UID
         }
+
+    def insert(self):
+        payload = self.payload()
         try:
             logging.debug(f"Inserting payload: {payload}")
-            response = requests.post(l_env.APEX_API_URL_EMAIL, json=payload)
+            response = http_client.post("apex", l_env.APEX_API_URL_EMAIL, json=payload)
             response.raise_for_status()
             return True
         except requests.exceptions.RequestException as e:
             logging.error(f"Failed to insert email details for UID {self.L_UID}: {e}")
             return False
 
+    def enqueue(self):
+        """Writes the payload to the local outbox; the background flusher POSTs it to APEX."""
+        outbox.enqueue(self.payload(), l_uid=self.L_UID)
+        logging.debug(f"Queued email details for UID {self.L_UID}")
+        return True
+
 def sanitize_filename(uid, original_name):
     name, ext = os.path.splitext(f"{uid}_{original_name}")
     name = re.sub(r'[^a-zA-Z0-9]+', '_', name).strip('_')[:54]
     return f"{name}{ext}"
 
-def upload_to_oci_object_storage(object_name, file_data):
+_upload_pipeline = None
+_upload_pipeline_lock = threading.Lock()
+
+def get_upload_pipeline():
+    """Process-wide UploadPipeline for the invoice bucket, built on first use."""
+    global _upload_pipeline
+    if _upload_pipeline is None:
+        with _upload_pipeline_lock:
+            if _upload_pipeline is None:
+                options = getattr(settings, 'OBJECT_STORAGE_UPLOAD', {})
+                _upload_pipeline = UploadPipeline(
+                    oci_clients.new_object_storage_client,
+                    oci_clients.get_namespace(),
+                    bucket_name,
+                    max_workers=options.get('MAX_WORKERS', 8),
+                    max_retries=options.get('MAX_RETRIES', 3),
+                    backoff=options.get('BACKOFF', 1.0),
+                    multipart_threshold=options.get('MULTIPART_THRESHOLD', 16 * 1024 * 1024),
+                    part_size=options.get('PART_SIZE', 8 * 1024 * 1024),
+                )
+    return _upload_pipeline
+
+def _close_quietly(file_data):
+    if hasattr(file_data, "close"):
+        try:
+            file_data.close()
+        except Exception:
+            pass
+
+class IngestQueue:
+    """
+    Uploads attachments concurrently but inserts APEX rows and advances the checkpoint
+    strictly in UID order, and only for messages whose objects are all durably stored.
+    After a failed upload nothing later is inserted or checkpointed, so the next run
+    retries from that message (object names are derived from the UID, so re-uploads overwrite).
+    A message that has failed INGEST_MAX_ATTEMPTS times is skipped instead (see give_up).
+
+    With ATTACHMENT_DEDUP on, attachments whose SHA-256 and size are already in the
+    AttachmentDigest index (or queued earlier in this scan) are recorded as a
+    DuplicateAttachment instead of being uploaded and inserted again.
+    """
+
+    def __init__(self, summary, checkpoint=None, max_pending=32, dedup=None):
+        self.summary = summary
+        self.checkpoint = checkpoint
+        self.dedup = ATTACHMENT_DEDUP if dedup is None else dedup
+        self.max_pending = max_pending
+        self.pipeline = get_upload_pipeline()
+        self.pending = deque()
+        self.queued_digests = set()
+        self.completed = []
+        self.failed = False
+
+    def add_message(self, email_uid, attachments):
+        """
+        `attachments` is a list of (email_from, email_subject, decoded_filename, file_data);
+        file_data is bytes or a file object, which is closed once its upload has finished.
+        """
+        if self.failed:
+            for attachment in attachments:
+                _close_quietly(attachment[3])
+            return
+        uploads = []
+        for email_from, email_subject, decoded_filename, file_data in attachments:
+            item = {
+                "future": None,
+                "object_name": sanitize_filename(email_uid, decoded_filename),
+                "from": email_from,
+                "subject": email_subject,
+                "filename": decoded_filename,
+                "digest": content_digest(file_data) if self.dedup else None,
+                "duplicate": False,
+            }
+            if item["digest"] and (item["digest"] in self.queued_digests or self._indexed(item["digest"])):
+                item["duplicate"] = True
+                _close_quietly(file_data)
+            else:
+                item["future"] = self.pipeline.submit(item["object_name"], file_data)
+                if hasattr(file_data, "close"):
+                    item["future"].add_done_callback(lambda _, f=file_data: _close_quietly(f))
+                if item["digest"]:
+                    self.queued_digests.add(item["digest"])
+            uploads.append(item)
+        self.pending.append((email_uid, uploads))
+        in_flight = sum(1 for _, queued in self.pending if any(item["future"] for item in queued))
+        self._drain(block=in_flight > self.max_pending)
+
+    def _indexed(self, digest):
+        sha256, size = digest
+        return AttachmentDigest.objects.filter(sha256=sha256, size=size).exists()
+
+    def _drain(self, block=False):
+        while self.pending and not self.failed:
+            email_uid, uploads = self.pending[0]
+            futures = [item["future"] for item in uploads if item["future"]]
+            if not block and not all(future.done() for future in futures):
+                return
+            failures = [future for future in futures if future.exception() is not None]
+            if failures:
+                self.summary["errors"] += len(failures)
+                metrics.attachments.inc(len(failures), outcome="failed")
+                if self.give_up(email_uid, failures[0].exception()):
+                    self.pending.popleft()
+                    self._record(email_uid, [])
+                    block = False
+                    continue
+                self.failed = True
+                logging.error(f"Upload failed for UID {email_uid}; stopping scan at this message.")
+                for _, later in self.pending:
+                    for item in later:
+                        if item["future"]:
+                            item["future"].cancel()
+                self.pending.clear()
+                return
+            self.pending.popleft()
+            self._record(email_uid, uploads)
+            block = False
+
+    def give_up(self, email_uid, error):
+        """
+        Counts a failed attempt at `email_uid`. Returns True once it has failed
+        INGEST_MAX_ATTEMPTS times; the caller then records the message without its
+        attachments, so the checkpoint moves past it and the scan carries on.
+        """
+        if self.checkpoint is None:
+            return False
+        failure = MessageFailure.record(mailbox_key(), self.checkpoint.uid_validity, email_uid, error, INGEST_MAX_ATTEMPTS)
+        if not failure.skipped:
+            return False
+        logging.error(f"Skipping UID {email_uid} after {failure.attempts} failed attempts: {error}")
+        self.summary["skipped_emails"] += 1
+        return True
+
+    def _record(self, email_uid, uploads):
+        use_outbox = outbox.is_enabled()
+        if use_outbox and uploads:
+            outbox.wait_for_capacity()
+        # Outbox rows, index entries and the checkpoint for a message commit together.
+        with transaction.atomic():
+            for item in uploads:
+                if item["duplicate"]:
+                    self._record_duplicate(email_uid, item)
+                    continue
+
+                self.summary["processed_attachments"] += 1
+                metrics.attachments.inc(outcome="uploaded")
+                if item["digest"]:
+                    sha256, size = item["digest"]
+                    AttachmentDigest.objects.get_or_create(
+                        sha256=sha256, size=size,
+                        defaults={"object_name": item["object_name"], "bucket": bucket_name, "email_uid": email_uid},
+                    )
+
+                # CHANGED: Capture the details of the processed invoice.
+                invoice_details = {
+                    "from": item["from"],
+                    "subject": item["subject"],
+                    "filename": item["filename"]
+                }
+                self.summary["processed_invoices"].append(invoice_details)
+
+                email_record = EmailData(item["from"], settings.SMTP_USER, item["subject"], item["object_name"], l_uid=email_uid)
+                if use_outbox:
+                    email_record.enqueue()
+                elif email_record.insert():
+                    logging.info(f"Inserted email UID {email_uid} with attachment '{item['filename']}'")
+                else:
+                    self.summary["errors"] += 1
+            self.completed.append(email_uid)
+            if self.checkpoint and uploads:
+                self.checkpoint.advance(email_uid)
+
+    def _record_duplicate(self, email_uid, item):
+        sha256, size = item["digest"]
+        original = AttachmentDigest.objects.filter(sha256=sha256, size=size).first()
+        if original is None:
+            # The earlier copy in this scan was never stored; should not happen after an in-order drain.
+            logging.error(f"Duplicate '{item['filename']}' in UID {email_uid} has no indexed original.")
+            self.summary["errors"] += 1
+            return
+        DuplicateAttachment.objects.create(
+            original=original, email_uid=email_uid, filename=item["filename"],
+            from_email=item["from"], subject=item["subject"],
+        )
+        self.summary["duplicate_attachments"] += 1
+        metrics.attachments.inc(outcome="duplicate")
+        logging.info(f"Skipped duplicate '{item['filename']}' in UID {email_uid}; same content as '{original.object_name}'")
+
+    def close(self):
+        """Waits for every outstanding upload and records them. Returns the UIDs fully ingested."""
+        while self.pending and not self.failed:
+            self._drain(block=True)
+        if self.checkpoint and self.completed:
+            self.checkpoint.advance(self.completed[-1])
+        return self.completed
+
+def scan_messages_rfc822(mail, message_ids, summary, checkpoint=None, dedup=None):
+    """Legacy scan: downloads every message in full and walks its MIME tree."""
+    queue = IngestQueue(summary, checkpoint, dedup=dedup)
     try:
-        object_storage.put_object(namespace, bucket_name, object_name, file_data)
-        logging.info(f"Uploaded '{object_name}' to bucket '{bucket_name}'")
-    except Exception as e:
-        logging.error(f"Upload failed for '{object_name}': {e}")
+        _scan_rfc822_into(queue, mail, message_ids, summary)
+    finally:
+        queue.close()
+
+def fetch_rfc822(mail, email_uid):
+    """The full message, or None when the FETCH fails."""
+    result, data = mailbox.uid_fetch(mail, email_uid, '(RFC822)')
+    return data[0][1] if result == 'OK' else None
+
+def _scan_rfc822_into(queue, mail, message_ids, summary):
+    # Large backlogs are parsed on a process pool (see mime_pipeline); results arrive in UID order.
+    messages = mime_pipeline.parse_messages(lambda uid: fetch_rfc822(mail, uid), message_ids)
+    with closing(messages):
+        for email_uid, parsed in messages:
+            if queue.failed:
+                break
+            if parsed is None:
+                summary["errors"] += 1
+                if queue.give_up(email_uid, "RFC822 fetch failed"):
+                    queue.add_message(email_uid, [])
+                    continue
+                # Stop here so the next run retries this message instead of skipping it.
+                logging.error(f"Failed to fetch email UID {email_uid}; stopping scan at this message.")
+                break
+            email_from, email_subject, parts = parsed
 
-@tool(description="Connects to email server, scans inbox for unseen invoice emails, and uploads attachments to OCI Object Storage.")
-def process_from_email():
-    global mail
-    # CHANGED: Added a list to store details of each processed invoice.
-    summary = {
+            summary["processed_emails"] += 1
+            progress.report("scanning", total=len(message_ids), **scan_counters(summary))
+
+            attachments = [(email_from, email_subject, decoded_filename, payload) for decoded_filename, payload in parts]
+            queue.add_message(email_uid, attachments)
+
+def scan_messages_structure(mail, message_ids, summary, checkpoint=None, dedup=None):
+    """
+    Structure-first scan: one batched BODYSTRUCTURE fetch for the whole set, then
+    BODY.PEEK of just the attachment sections. Messages without attachments are never downloaded.
+    """
+    with_attachments = mailbox.fetch_bodystructures(mail, message_ids, uid=True)
+    logging.info(f"{len(with_attachments)} of {len(message_ids)} messages carry attachments.")
+
+    queue = IngestQueue(summary, checkpoint, dedup=dedup)
+    try:
+        _scan_structure_into(queue, mail, message_ids, with_attachments, summary)
+    finally:
+        scanned = queue.close()
+
+    # RFC822 fetches used to flag every scanned message as read; PEEK does not, so do it in one STORE.
+    for batch in mailbox.batched(scanned):
+        mail.uid('STORE', ','.join(batch), '+FLAGS', '(\\Seen)')
+
+def fetch_attachments(mail, email_uid, parts):
+    """
+    Small parts come back with the headers in a single FETCH as bytes; parts larger than
+    one chunk are streamed and decoded into spooled temporary files to keep memory flat.
+    """
+    small = [part for part in parts if part.size <= ATTACHMENT_CHUNK_BYTES]
+    headers, sections = mailbox.fetch_sections(mail, email_uid, [part.section for part in small], uid=True)
+    header_msg = email.message_from_bytes(headers)
+    email_from = mailbox.decode_mime_header(header_msg.get('From'))
+    email_subject = mailbox.decode_mime_header(header_msg.get('Subject'))
+
+    attachments = []
+    try:
+        for part in parts:
+            decoded_filename = mailbox.decode_mime_header(part.filename)
+            if part.size <= ATTACHMENT_CHUNK_BYTES:
+                file_data = mailbox.decode_part_payload(sections[part.section], part.encoding)
+            else:
+                file_data = mailbox.stream_section(
+                    mail, email_uid, part.section, part.encoding, part.size,
+                    chunk_size=ATTACHMENT_CHUNK_BYTES, spool_max_size=ATTACHMENT_SPOOL_BYTES,
+                )
+            attachments.append((email_from, email_subject, decoded_filename, file_data))
+    except BaseException:
+        for attachment in attachments:
+            _close_quietly(attachment[3])
+        raise
+    return attachments
+
+def _scan_structure_into(queue, mail, message_ids, with_attachments, summary):
+    for email_uid in message_ids:
+        if queue.failed:
+            break
+        parts = with_attachments.get(email_uid)
+        attachments = []
+        if parts:
+            try:
+                attachments = fetch_attachments(mail, email_uid, parts)
+            except Exception as e:
+                summary["errors"] += 1
+                # A dropped connection is not this message's fault, so it does not count as an attempt.
+                if not isinstance(e, (imaplib.IMAP4.abort, OSError)) and queue.give_up(email_uid, e):
+                    queue.add_message(email_uid, [])
+                    continue
+                # Stop here so the next run retries this message instead of skipping it.
+                logging.error(f"Attachment fetch failed for UID {email_uid}; stopping scan at this message: {e}")
+                break
+        queue.add_message(email_uid, attachments)
+        summary["processed_emails"] += 1
+        progress.report("scanning", total=len(message_ids), **scan_counters(summary))
+
+def mailbox_key():
+    return f"{settings.SMTP_USER}@{settings.SMTP_HOST}/INBOX"
+
+def find_new_messages(mail):
+    """
+    Returns (checkpoint, uids) for the messages not yet ingested. With a valid checkpoint
+    this is UID SEARCH UID n:*; without one (first run, or UIDVALIDITY changed) the scan
+    bootstraps from the UNSEEN SINCE window used before checkpoints existed.
+
+    The bootstrap checkpoint is saved before anything is fetched, just below the first
+    UID of the window (or below UIDNEXT when the window is empty), so an empty window
+    or a failed first fetch never leaves it at 0 for the next run to scan UID 1:*.
+    """
+    validity = mailbox.uid_validity(mail)
+    checkpoint = MailboxCheckpoint.load(mailbox_key(), validity)
+    if checkpoint is not None:
+        return checkpoint, mailbox.uids_after(mail, checkpoint.last_uid)
+
+    logging.warning(f"No checkpoint for {mailbox_key()} with UIDVALIDITY {validity}; bootstrapping from the last {DAYS_INTERVAL} day(s).")
+    since_date = (datetime.now() - timedelta(days=DAYS_INTERVAL)).strftime("%d-%b-%Y")
+    uids = sorted(mailbox.search_uids(mail, f'(UNSEEN SINCE "{since_date}")'), key=int)
+    start = int(uids[0]) - 1 if uids else mailbox.uid_next(mail) - 1
+    checkpoint = MailboxCheckpoint.reset(mailbox_key(), validity, last_uid=start)
+    return checkpoint, uids
+
+def new_scan_summary():
+    return {
         "processed_emails": 0,
         "processed_attachments": 0,
+        "duplicate_attachments": 0,
+        "skipped_emails": 0,
         "errors": 0,
-        "processed_invoices": []
+        "processed_invoices": [],
+        "skipped_locked": False,
     }
-    try:
-        mail = imaplib.IMAP4_SSL(settings.SMTP_HOST)
-        mail.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-        mail.select('inbox')
-        logging.info("Connected to email server and selected inbox.")
-    except Exception as e:
-        logging.error(f"Email server connection failed: {e}")
-        return {"error": str(e)}
 
-    logging.info("Starting invoice scan...")
+def scan_counters(summary):
+    """The numeric counters of a scan summary, for progress reporting."""
+    return {key: value for key, value in summary.items() if isinstance(value, int) and not isinstance(value, bool)}
+
+def scan_messages(mail, message_ids, summary, checkpoint=None, dedup=None):
+    """Ingests `message_ids` using the configured EMAIL_FETCH_MODE."""
+    if EMAIL_FETCH_MODE == "rfc822":
+        scan_messages_rfc822(mail, message_ids, summary, checkpoint, dedup=dedup)
+    elif message_ids:
+        scan_messages_structure(mail, message_ids, summary, checkpoint, dedup=dedup)
 
+def ingest_new_messages(mail, summary):
+    """
+    Ingests every message after the mailbox checkpoint on an already selected connection.
+    Shared by the process_from_email tool and the watch_inbox daemon.
+    Raises imaplib.IMAP4.error if the search fails.
+
+    The scan runs under the mailbox's lease (MailboxCheckpoint.try_lock), so the daemon,
+    job workers and streamed runs never ingest the same messages twice. When another
+    scan holds it, this returns at once with summary["skipped_locked"] set.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+    if not MailboxCheckpoint.try_lock(mailbox_key(), owner, INGEST_LOCK_LEASE):
+        logging.info(f"Another scan of {mailbox_key()} is in progress; skipping this one.")
+        summary["skipped_locked"] = True
+        return summary
     try:
-        since_date = (datetime.now() - timedelta(days=DAYS_INTERVAL)).strftime("%d-%b-%Y")
-        result, data = mail.search(None, f'(UNSEEN SINCE "{since_date}")')
-
-        if result != 'OK':
-            logging.error("Email search failed.")
-            return {"error": "Email search failed"}
-
-        for num in data[0].split():
-            email_uid = num.decode()
-            result, data = mail.fetch(num, '(RFC822)')
-            if result == 'OK':
-                msg = email.message_from_bytes(data[0][1])
-                # Decode headers to handle special characters
-                email_from = str(make_header(decode_header(msg.get('From'))))
-                email_subject = str(make_header(decode_header(msg.get('Subject'))))
-
-                summary["processed_emails"] += 1
-
-                for part in msg.walk():
-                    if part.get_content_maintype() == 'multipart' or part.get('Content-Disposition') is None:
-                        continue
-                    
-                    file_name = part.get_filename()
-                    if not file_name:
-                        continue
-                    
-                    # Decode filename
-                    decoded_filename = str(make_header(decode_header(file_name)))
-
-                    summary["processed_attachments"] += 1
-
-                    unique_file_name = sanitize_filename(email_uid, decoded_filename)
-                    file_data = part.get_payload(decode=True)
-                    upload_to_oci_object_storage(unique_file_name, file_data)
-
-                    # CHANGED: Capture the details of the processed invoice.
-                    invoice_details = {
-                        "from": email_from,
-                        "subject": email_subject,
-                        "filename": decoded_filename
-                    }
-                    summary["processed_invoices"].append(invoice_details)
-
-                    email_record = EmailData(email_from, settings.SMTP_USER, email_subject, unique_file_name, l_uid=email_uid)
-                    if email_record.insert():
-                        logging.info(f"Inserted email UID {email_uid} with attachment '{decoded_filename}'")
-                    else:
-                        summary["errors"] += 1
-            else:
-                summary["errors"] += 1
+        checkpoint, message_ids = find_new_messages(mail)
+        logging.info(f"{len(message_ids)} new message(s) after UID {checkpoint.last_uid}.")
+        progress.report("messages_found", total=len(message_ids))
+        try:
+            scan_messages(mail, message_ids, summary, checkpoint)
+        except (imaplib.IMAP4.abort, OSError):
+            # Let the caller discard the broken connection.
+            raise
+        except Exception as e:
+            summary["errors"] += 1
+            logging.error(f"Invoice check error: {e}")
+    finally:
+        MailboxCheckpoint.unlock(mailbox_key(), owner)
+    return summary
 
+@tool(description="Connects to email server, scans inbox for new invoice emails, and uploads attachments to OCI Object Storage.")
+def process_from_email():
+    # CHANGED: Added a list to store details of each processed invoice.
+    summary = new_scan_summary()
+    try:
+        with get_imap_pool().connection() as mail:
+            logging.info(f"Starting invoice scan ({EMAIL_FETCH_MODE} mode)...")
+            progress.report("connected", mailbox=mailbox_key())
+            try:
+                ingest_new_messages(mail, summary)
+            except imaplib.IMAP4.abort:
+                raise
+            except imaplib.IMAP4.error as e:
+                logging.error(f"Email search failed: {e}")
+                return {"error": "Email search failed"}
     except Exception as e:
-        summary["errors"] += 1
-        logging.error(f"Invoice check error: {e}")
+        logging.error(f"Email server connection failed: {e}")
+        return {"error": str(e)}
+
+    if summary["skipped_locked"]:
+        return {"message": "Another scan of this mailbox is already running; no emails were processed by this request."}
 
+    progress.report("scan_complete", **scan_counters(summary))
     # CHANGED: Return the detailed list along with the summary counts.
     return {
         "message": "Email processing completed",
         "processed_emails": summary["processed_emails"],
         "attachments_uploaded": summary["processed_attachments"],
+        "duplicates_skipped": summary["duplicate_attachments"],
+        "emails_skipped": summary["skipped_emails"],
         "errors": summary["errors"],
         "invoices": summary["processed_invoices"] # <-- This is the new detailed list
     }
 
 def run_Email_agent():
     """
-    Initializes and runs the OCI agent to get Vendor details.
+    Runs the Email agent, which ingests new invoice emails.
     """
     # This outer try/except catches initialization errors
-    client = AgentClient(auth_type="api_key", profile="DEFAULT", region="us-chicago-1")
-    agent = Agent(
-        client=client,
-        agent_endpoint_id=settings.AGENT_ENDPOINT_ID.get("Email_AGENT_ENDPOINT_ID"),
-        instructions="You process invoice emails and extract relevant data using tools.",
-        tools=[process_from_email]
-    )
-
-       
     try:
+        agent_registry.get("email")
         logger.info(f"Running Email agent")
 
-        # 1. Create and set the event loop for the current thread.
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
         try:
-            
-            response = agent.run("process and check last one day emails and summarize")
+            response = agent_registry.run("email", "process and check last one day emails and summarize")
             # FIX: Use the correct method to get the agent's text response
             agent_content = response.final_output
-        
+            
             # Return a clean JSON object for the frontend
             return {"status": "success", "message": agent_content}
         
         except Exception as e:
             logger.error(f"Agent execution failed: {e}", exc_info=True)
             return {"status": "error", "message": f"Agent call failed: {str(e)}"}
-        
-        finally:
-            loop.close()
 
     except Exception as e:
         logger.exception("Failed to initialize the OCI agent.")
@@ -197,13 +536,83 @@ def run_Email_agent():
 
 # ============ AlertSummaryAgent =============================
 
-ALERT_KEYWORDS = ['alert', 'notification', 'important', 'critical', 'warning']
+# Alert keywords, weights and severities live in agents/alert_rules.py (settings.ALERT_RULES).
+# Bytes of the text/plain part fetched per candidate when confirming a server-side match.
+ALERT_BODY_PREFIX_BYTES = int(os.getenv("ALERT_BODY_PREFIX_BYTES", "2048"))
+# Longer text parts the server matched but the prefix did not are re-fetched up to this many bytes.
+ALERT_BODY_MAX_BYTES = int(os.getenv("ALERT_BODY_MAX_BYTES", str(1024 * 1024)))
+# Days of per-day AlertDigest rows kept per mailbox.
+ALERT_DIGEST_KEEP_DAYS = int(os.getenv("ALERT_DIGEST_KEEP_DAYS", "7"))
+
+def scan_alert_candidates(mail, uids, server_matched=True):
+    """
+    Fetches only From/Subject and a bounded prefix of the text/plain part of the
+    candidates and classifies them locally with the alert rule engine.
+    `server_matched` says the UIDs already passed the rules' IMAP SEARCH filter; those
+    whose prefix misses but whose text part is longer are classified again on the
+    whole part (up to ALERT_BODY_MAX_BYTES), since the match may lie past the prefix.
+    """
+    headers_by_uid = mailbox.fetch_headers_and_structure(mail, uids)
+    text_parts = {}
+    for uid, (_, structure) in headers_by_uid.items():
+        part = mailbox.first_text_part(structure)
+        if part:
+            text_parts[uid] = part
+
+    prefixes = _fetch_text_parts(mail, text_parts, ALERT_BODY_PREFIX_BYTES)
+    messages = {}
+    for uid in uids:
+        if uid not in headers_by_uid:
+            logger.warning(f"Failed to fetch email with UID {uid}.")
+            continue
+        headers, _ = headers_by_uid[uid]
+        msg = email.message_from_bytes(headers, policy=policy.default)
+        messages[uid] = (msg.get('From', ''), msg.get('Subject', ''))
+
+    def classify(uid, raw):
+        sender, subject = messages[uid]
+        part = text_parts.get(uid)
+        body = ""
+        if part:
+            body = mailbox.decode_part_prefix(raw, part.encoding).decode('utf-8', errors='ignore')
+        return alert_rules.engine.classify(subject=subject, sender=sender, body=body)
+
+    classifications = {uid: classify(uid, prefixes.get(uid)) for uid in messages}
+    if server_matched:
+        longer = {
+            uid: text_parts[uid] for uid, classification in classifications.items()
+            if not classification["is_alert"] and uid in text_parts and text_parts[uid].size > ALERT_BODY_PREFIX_BYTES
+        }
+        for uid, raw in _fetch_text_parts(mail, longer, ALERT_BODY_MAX_BYTES).items():
+            classifications[uid] = classify(uid, raw)
+
+    alerts = []
+    for uid, (sender, subject) in messages.items():
+        classification = classifications[uid]
+        if classification["is_alert"]:
+            alerts.append({
+                "uid": uid,
+                "from": sender,
+                "subject": subject,
+                "score": classification["score"],
+                "severity": classification["severity"],
+                "terms": classification["terms"],
+            })
+    return alerts
+
+def _fetch_text_parts(mail, parts_by_uid, limit):
+    """At most `limit` bytes of each message's text part, one batched FETCH per section number."""
+    uids_by_section = {}
+    for uid, part in parts_by_uid.items():
+        uids_by_section.setdefault(part.section, []).append(uid)
+    return mailbox.fetch_section_prefixes(mail, uids_by_section, limit)
 
 @tool(description="Reads today's emails, scans for alerts and notifications, and summarizes key information.")
 def summarize_daily_alerts():
     """
     Connects to an IMAP email server, fetches emails from the current day,
     filters them based on keywords, and returns a formatted summary string.
+    Messages already classified today are kept in an AlertDigest; only newer ones are fetched.
     """
     summary = {
         "total_emails": 0,
@@ -212,75 +621,71 @@ def summarize_daily_alerts():
     }
 
     try:
-        mail = imaplib.IMAP4_SSL(settings.SMTP_HOST)
-        mail.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-        mail.select('inbox')
-        logger.info("Connected to email server and selected inbox.")
+        with get_imap_pool().connection() as mail:
+            logger.info("Using pooled connection to the email server.")
+            progress.report("connected", mailbox=mailbox_key())
+            today = datetime.now().date()
+            digest = AlertDigest.load(mailbox_key(), today, mailbox.uid_validity(mail))
+            if digest.last_uid == 0:
+                AlertDigest.prune(mailbox_key(), today - timedelta(days=ALERT_DIGEST_KEEP_DAYS - 1))
+            # IMAP standard format for date is DD-Mon-YYYY
+            today_date = today.strftime("%d-%b-%Y")
+            # Only messages after the last one already in today's digest are searched.
+            new_since = f'UID {digest.last_uid + 1}:* SINCE "{today_date}"'
+            try:
+                email_ids = [uid for uid in mailbox.search_uids(mail, f'({new_since})') if int(uid) > digest.last_uid]
+            except imaplib.IMAP4.abort:
+                raise
+            except imaplib.IMAP4.error:
+                logger.error("Email search failed.")
+                return "I'm sorry, I failed while trying to search the inbox."
+
+            progress.report("messages_found", total=digest.total_emails + len(email_ids), new=len(email_ids))
+
+            try:
+                criteria = alert_rules.engine.search_criteria()
+                if email_ids and criteria:
+                    # Let the server do the keyword filtering; only candidates are fetched.
+                    candidate_ids = [
+                        uid for uid in mailbox.search_uids(mail, f'({new_since} {criteria})')
+                        if int(uid) > digest.last_uid
+                    ]
+                    logger.info(f"{len(candidate_ids)} of {len(email_ids)} new emails today match alert keywords on the server.")
+                    digest.merge(email_ids, scan_alert_candidates(mail, candidate_ids))
+                elif email_ids:
+                    # Too many rules for one SEARCH; classify every new message locally.
+                    candidate_ids = email_ids
+                    digest.merge(email_ids, scan_alert_candidates(mail, candidate_ids, server_matched=False))
+                else:
+                    candidate_ids = []
+                logger.info(f"Alert digest for {today}: {digest.total_emails} emails up to UID {digest.last_uid}, {len(email_ids)} new.")
+                summary["total_emails"] = digest.total_emails
+                summary["alerts"] = digest.alerts
+                summary["alert_emails"] = len(summary["alerts"])
+                progress.report("alerts_found", candidates=len(candidate_ids), alert_emails=summary["alert_emails"])
+
+            except (imaplib.IMAP4.abort, OSError):
+                # Let the pool discard the broken connection.
+                raise
+            except Exception as e:
+                logger.error(f"Failed during email processing: {e}")
+                # CHANGED: Return a user-friendly error string
+                return f"An unexpected error occurred while processing emails: {e}"
+
+            if not summary["total_emails"]:
+                logger.info("No emails found for today.")
+                return "I checked the inbox but found no new emails for today."
     except Exception as e:
         logger.error(f"Failed to connect to email server: {e}")
         return f"I'm sorry, I was unable to connect to the email server. Please check the configuration. Error: {e}"
 
-    try:
-        # IMAP standard format for date is DD-Mon-YYYY
-        today_date = datetime.now().strftime("%d-%b-%Y")
-        result, data = mail.search(None, f'(SINCE "{today_date}")')
-
-        if result != 'OK':
-            logger.error("Email search failed.")
-            return "I'm sorry, I failed while trying to search the inbox."
-
-        email_ids = data[0].split()
-        if not email_ids:
-            logger.info("No emails found for today.")
-            return "I checked the inbox but found no new emails for today."
-
-        for num in email_ids:
-            summary["total_emails"] += 1
-            result, msg_data = mail.fetch(num, '(RFC822)')
-
-            if result != 'OK':
-                logger.warning(f"Failed to fetch email with ID {num}.")
-                continue
-
-            msg = email.message_from_bytes(msg_data[0][1], policy=policy.default)
-            subject = msg.get('Subject', '')
-            sender = msg.get('From', '')
-            body = ""
-
-            # Extract plain text body
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        break
-            else:
-                if msg.get_content_type() == "text/plain":
-                    body = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-
-            full_text = f"{subject}\n{body}".lower()
-
-            # Check for alert keywords
-            if any(keyword in full_text for keyword in ALERT_KEYWORDS):
-                summary["alert_emails"] += 1
-                summary["alerts"].append({
-                    "from": sender,
-                    "subject": subject
-                })
-
-    except Exception as e:
-        logger.error(f"Failed during email processing: {e}")
-        # CHANGED: Return a user-friendly error string
-        return f"An unexpected error occurred while processing emails: {e}"
-
-    finally:
-        try:
-            mail.logout()
-            logger.info("Logged out from email server.")
-        except Exception as e:
-            logger.error(f"Failed to logout from email server: {e}")
-
     # Build the final output string for the agent
-    alert_info = "\n".join([f"- From: {a['from']}, Subject: {a['subject']}" for a in summary["alerts"]])
+    # Highest severity first; alerts recorded before scoring existed sort last.
+    ranked = sorted(summary["alerts"], key=lambda a: -a.get("score", 0))
+    alert_info = "\n".join([
+        f"- {'[' + a['severity'] + '] ' if a.get('severity') else ''}From: {a['from']}, Subject: {a['subject']}"
+        for a in ranked
+    ])
     message = (
         f"📊 Daily Email Alert Summary:\n\n"
         f"I scanned a total of {summary['total_emails']} emails today and found "
@@ -294,45 +699,49 @@ def summarize_daily_alerts():
 
 def run_alertsummary_agent():
     """
-    Initializes and runs the OCI agent to get Vendor details.
+    Runs the Alert Summary agent over today's emails.
     """
     # This outer try/except catches initialization errors
-    client = AgentClient(auth_type="api_key", profile="DEFAULT", region="us-chicago-1")
-    agent = Agent(
-        client=client,
-        agent_endpoint_id=settings.AGENT_ENDPOINT_ID.get("ALERTSUMMARY_AGENT_ENDPOINT_ID"),
-        instructions="You summarize alerts and notifications from emails...",
-        tools=[summarize_daily_alerts]
-    )
-       
     try:
+        agent_registry.get("alertsummary")
         logger.info(f"Running Alert Summary agent")
 
-        # 1. Create and set the event loop for the current thread.
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
         try:
-            
-            response = agent.run("give me today details")
+            response = agent_registry.run("alertsummary", "give me today details")
             # FIX: Use the correct method to get the agent's text response
             agent_content = response.final_output
-        
+            
             # Return a clean JSON object for the frontend
             return {"status": "success", "message": agent_content}
         
         except Exception as e:
             logger.error(f"Agent execution failed: {e}", exc_info=True)
             return {"status": "error", "message": f"Agent call failed: {str(e)}"}
-        
-        finally:
-            loop.close()
 
     except Exception as e:
         logger.exception("Failed to initialize the OCI agent.")
         return {"status": "error", "message": f"Agent initialization failed: {str(e)}"}
     
 
+# ============ PeopleSoft lookup caches =======================
+
+# Shared by the agent tools; entries are returned as is, so callers must not mutate them.
+po_cache = cache.from_settings("po")
+vendor_cache = cache.from_settings("vendor")
+
+
+def invalidate_po(po_number):
+    return po_cache.invalidate(po_number)
+
+
+def invalidate_vendor(vendor_id):
+    return vendor_cache.invalidate(vendor_id)
+
+
+def lookup_cache_stats():
+    return {"po": po_cache.stats(), "vendor": vendor_cache.stats()}
+
+
 # ============ GetPODetailsAgent =============================
 
 @tool(
@@ -342,13 +751,18 @@ def run_alertsummary_agent():
 )
 def get_po_details(po_number: str) -> dict:
     """Fetches Purchase Order details from an external API."""
+    return po_cache.get_or_load(po_number, lambda: _fetch_po_details(po_number))
+
+
+def _fetch_po_details(po_number):
+    """Calls PeopleSoft for one PO. Returns (result, cache kind) for po_cache."""
     API_URL = settings.PEOPLESOFT_API_URL.get("GET_PO_PEOPLESOFT_API_URL") # Get URL from settings
     payload = {"PO_ID": po_number}
 
     logger.info(f"Attempting to fetch details for PO_ID: {po_number}")
     try:
         logger.debug(f"Making GET request to {API_URL} with params: {payload}")
-        response = requests.get(API_URL, params=payload)
+        response = http_client.get("peoplesoft", API_URL, params=payload)
         logger.info(f"Received status code: {response.status_code}")
         logger.debug(f"Raw response text: {response.text}")
 
@@ -359,54 +773,39 @@ def get_po_details(po_number: str) -> dict:
             if not po_hdr_list:
                 msg = f"No PO_HDR found for PO_ID {po_number}"
                 logger.warning(msg)
-                return {"status": "error", "message": msg}
+                return {"status": "error", "message": msg}, cache.NEGATIVE
 
             matching_po = next((po for po in po_hdr_list if po.get("PO_ID") == po_number), None)
 
             if not matching_po:
                 msg = f"PO_ID {po_number} not found in response."
                 logger.warning(msg)
-                return {"status": "error", "message": msg}
+                return {"status": "error", "message": msg}, cache.NEGATIVE
 
             logger.info(f"Successfully found and processed PO_ID {po_number}")
-            return {"status": "success", "po_header": matching_po}
+            return {"status": "success", "po_header": matching_po}, cache.POSITIVE
         else:
             msg = f"API call failed for PO_ID {po_number}. Status: {response.status_code}"
             logger.error(f"{msg}, Response: {response.text}")
-            return {"status": "error", "code": response.status_code, "message": response.text}
+            kind = cache.NEGATIVE if response.status_code == 404 else cache.SKIP
+            return {"status": "error", "code": response.status_code, "message": response.text}, kind
 
     except Exception as e:
         logger.exception(f"An unexpected error occurred while fetching PO_ID {po_number}")
-        return {"status": "error", "message": str(e)}
+        return {"status": "error", "message": str(e)}, cache.SKIP
 
 
 def run_po_agent(po_number: str) -> dict:
     """
-    Initializes and runs the OCI agent to get PO details.
+    Runs the OCI agent to get PO details.
     """
     # This outer try/except catches initialization errors
     try:
-        client = AgentClient(auth_type="api_key", profile="DEFAULT", region="us-chicago-1")
-        agent = Agent(
-            client=client,
-            agent_endpoint_id=settings.AGENT_ENDPOINT_ID.get("GetPO_AGENT_ENDPOINT_ID"),
-            # instructions=(
-            #     "You are a Purchase Order assistant. "
-            #     "When the user provides a PO number, always call the 'get_po_details' tool "
-            #     "with the PO number string exactly as given. Always use the tool to answer."
-            # ),
-            instructions="Access the PeopleSoft FSCM Instance and invoke the rest API to get the   details",
-            tools=[get_po_details]
-        )
-        
+        agent_registry.get("po")
         logger.info(f"Running PO agent for: {po_number}")
 
-        # 1. Create and set the event loop for the current thread.
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
         try:
-            response = agent.run(f"Get details for PO number {po_number}")
+            response = agent_registry.run("po", f"Get details for PO number {po_number}")
             # FIX: Use the correct method to get the agent's text response
             agent_content = response.final_output
             
@@ -416,9 +815,6 @@ def run_po_agent(po_number: str) -> dict:
         except Exception as e:
             logger.error(f"Agent execution failed: {e}", exc_info=True)
             return {"status": "error", "message": f"Agent call failed: {str(e)}"}
-        
-        finally:
-            loop.close()
 
     except Exception as e:
         logger.exception("Failed to initialize the OCI agent.")
@@ -432,6 +828,11 @@ def run_po_agent(po_number: str) -> dict:
     description="Fetches detailed information for a specific Vendor ID from PeopleSoft."
 )
 def get_vendor_details(vendor_id: str) -> dict:
+    return vendor_cache.get_or_load(vendor_id, lambda: _fetch_vendor_details(vendor_id))
+
+
+def _fetch_vendor_details(vendor_id):
+    """Calls PeopleSoft for one vendor. Returns (result, cache kind) for vendor_cache."""
     API_URL = settings.PEOPLESOFT_API_URL.get("GET_VENDOR_PEOPLESOFT_API_URL")
 
     payload = {
@@ -441,7 +842,7 @@ def get_vendor_details(vendor_id: str) -> dict:
     logger.info(f"Attempting to fetch details for VENDOR_ID: {vendor_id}")
     try:
         logger.debug(f"Making GET request to {API_URL} with params: {payload}")
-        response = requests.get(API_URL, params=payload)
+        response = http_client.get("peoplesoft", API_URL, params=payload)
         logger.info(f"Received status code: {response.status_code}")
 
         # Log the raw response text at a debug level for inspection
@@ -456,7 +857,7 @@ def get_vendor_details(vendor_id: str) -> dict:
                 return {
                     "status": "error",
                     "message": f"No VENDOR found for VENDOR_ID {vendor_id}"
-                }
+                }, cache.NEGATIVE
 
             matching_vendor = next((vendor for vendor in vendor_hdr_list if vendor.get("VENDOR_ID") == vendor_id), None)
 
@@ -465,22 +866,23 @@ def get_vendor_details(vendor_id: str) -> dict:
                 return {
                     "status": "error",
                     "message": f"VENDOR_ID {vendor_id} not found in response."
-                }
+                }, cache.NEGATIVE
 
             logger.info(f"Successfully found and processed VENDOR_ID {vendor_id}")
-            print(matching_vendor) # Kept for immediate console output
+            logger.debug(f"Vendor header for {vendor_id}: {matching_vendor}")
             return {
                 "status": "success",
                 "vendor_header": matching_vendor
-            }
+            }, cache.POSITIVE
 
         else:
             logger.error(f"API call failed for VENDOR_ID {vendor_id}. Status: {response.status_code}, Response: {response.text}")
+            kind = cache.NEGATIVE if response.status_code == 404 else cache.SKIP
             return {
                 "status": "error",
                 "code": response.status_code,
                 "message": response.text
-            }
+            }, kind
 
     except Exception as e:
         # CHANGED: Use logger.exception to automatically include the stack trace
@@ -488,31 +890,20 @@ def get_vendor_details(vendor_id: str) -> dict:
         return {
             "status": "error",
             "message": str(e)
-        }
+        }, cache.SKIP
 
 
 def run_vendor_agent(vendor_id: str) -> dict:
     """
-    Initializes and runs the OCI agent to get Vendor details.
+    Runs the OCI agent to get Vendor details.
     """
     # This outer try/except catches initialization errors
     try:
-        client = AgentClient(auth_type="api_key", profile="DEFAULT", region="us-chicago-1")
-        agent = Agent(
-            client=client,
-            agent_endpoint_id=settings.AGENT_ENDPOINT_ID.get("GetVendor_AGENT_ENDPOINT_ID"),
-            instructions="Access the PeopleSoft FSCM Instance and invoke the rest API to get the vendor  details for a specific Vendor",
-            tools=[get_vendor_details]
-        )
-        
+        agent_registry.get("vendor")
         logger.info(f"Running Vendor agent for: {vendor_id}")
 
-        # 1. Create and set the event loop for the current thread.
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
         try:
-            response = agent.run(vendor_id)
+            response = agent_registry.run("vendor", vendor_id)
             # FIX: Use the correct method to get the agent's text response
             agent_content = response.final_output
             
@@ -522,11 +913,77 @@ def run_vendor_agent(vendor_id: str) -> dict:
         except Exception as e:
             logger.error(f"Agent execution failed: {e}", exc_info=True)
             return {"status": "error", "message": f"Agent call failed: {str(e)}"}
-        
-        finally:
-            loop.close()
 
     except Exception as e:
         logger.exception("Failed to initialize the OCI agent.")
         return {"status": "error", "message": f"Agent initialization failed: {str(e)}"}
-    
\ No newline at end of file
+    
+
+# ================== Bulk lookup summary ===========================
+
+BULK_SUMMARY_MAX_CHARS = 30000
+
+
+def run_bulk_summary_agent(kind: str, table_csv: str) -> dict:
+    """
+    Asks the agent to summarize a bulk lookup result that was already fetched.
+    """
+    label = "purchase orders" if kind == "po" else "vendors"
+    name = f"{kind}_summary"
+    try:
+        agent_registry.get(name)
+        logger.info(f"Running bulk {kind} summary agent")
+
+        try:
+            if len(table_csv) > BULK_SUMMARY_MAX_CHARS:
+                table_csv = table_csv[:BULK_SUMMARY_MAX_CHARS] + "\n[truncated]"
+            response = agent_registry.run(
+                name,
+                f"Summarize these {label}: totals, statuses, anything unusual, and the IDs that failed.\n\n{table_csv}",
+            )
+            return {"status": "success", "message": response.final_output}
+
+        except Exception as e:
+            logger.error(f"Agent execution failed: {e}", exc_info=True)
+            return {"status": "error", "message": f"Agent call failed: {str(e)}"}
+
+    except Exception as e:
+        logger.exception("Failed to initialize the OCI agent.")
+        return {"status": "error", "message": f"Agent initialization failed: {str(e)}"}
+
+
+# ================== Agent registry ===========================
+# Each agent is built once per process, on first use or by agent_registry.warm().
+
+agent_registry.register(
+    "email", "Email_AGENT_ENDPOINT_ID",
+    "You process invoice emails and extract relevant data using tools.",
+    tools=[process_from_email],
+)
+agent_registry.register(
+    "alertsummary", "ALERTSUMMARY_AGENT_ENDPOINT_ID",
+    "You summarize alerts and notifications from emails...",
+    tools=[summarize_daily_alerts],
+)
+agent_registry.register(
+    "po", "GetPO_AGENT_ENDPOINT_ID",
+    "Access the PeopleSoft FSCM Instance and invoke the rest API to get the   details",
+    tools=[get_po_details],
+)
+agent_registry.register(
+    "vendor", "GetVendor_AGENT_ENDPOINT_ID",
+    "Access the PeopleSoft FSCM Instance and invoke the rest API to get the vendor  details for a specific Vendor",
+    tools=[get_vendor_details],
+)
+# Bulk summaries get the data in the prompt. They share the lookup endpoints, whose agents
+# may still request the lookup tool, so they register it too and any such call has a handler.
+agent_registry.register(
+    "po_summary", "GetPO_AGENT_ENDPOINT_ID",
+    "Summarize the PeopleSoft purchase orders in the CSV you are given. Do not look anything up.",
+    tools=[get_po_details],
+)
+agent_registry.register(
+    "vendor_summary", "GetVendor_AGENT_ENDPOINT_ID",
+    "Summarize the PeopleSoft vendors in the CSV you are given. Do not look anything up.",
+    tools=[get_vendor_details],
+)
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parseaddr
+
+from django.conf import settings
+
+from . import mailbox
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("subject", "sender", "body")
+
+DEFAULT_ALERT_RULES = {
+    # JSON rule file; reloaded when its modification time changes. None = DEFAULT_RULES only.
+    "RULES_FILE": None,
+    "RELOAD_INTERVAL": 5,        # seconds between checks of the rule file's mtime
+    "THRESHOLD": 1.0,            # minimum score for a message to count as an alert
+    # Beyond this many subject/body terms the IMAP SEARCH is not narrowed by keyword;
+    # every new message is fetched and classified locally instead.
+    "SERVER_FILTER_MAX_TERMS": 50,
+}
+
+# The original ALERT_KEYWORDS, matched on whole words in the subject and body. "forms" lists
+# other spellings that count as the same rule (plurals, inflections), so "Security Alerts"
+# still matches as it did with substring matching while "importantly" no longer does.
+# RULES_FILE has the same shape, optionally with a top-level "threshold"; "fields" is any of FIELDS.
+DEFAULT_RULES = {
+    "severities": {"critical": 3.0, "high": 2.0, "medium": 1.0},
+    "rules": [
+        {"term": "critical", "weight": 3.0, "fields": ["subject", "body"]},
+        {"term": "alert", "forms": ["alerts", "alerted", "alerting"], "weight": 2.0, "fields": ["subject", "body"]},
+        {"term": "warning", "forms": ["warnings"], "weight": 2.0, "fields": ["subject", "body"]},
+        {"term": "important", "weight": 1.0, "fields": ["subject", "body"]},
+        {"term": "notification", "forms": ["notifications"], "weight": 1.0, "fields": ["subject", "body"]},
+    ],
+}
+
+
+def alert_rules_config():
+    config = dict(DEFAULT_ALERT_RULES)
+    config.update(getattr(settings, "ALERT_RULES", {}))
+    return config
+
+
+@dataclass(frozen=True)
+class Rule:
+    term: str
+    weight: float = 1.0
+    fields: tuple = ("subject", "body")
+    forms: tuple = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        term = str(data["term"]).strip()
+        if not term:
+            raise ValueError("Alert rule with an empty term")
+        fields = tuple(data.get("fields") or ("subject", "body"))
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Alert rule '{term}' has unknown field(s) {sorted(unknown)}")
+        forms = tuple(form for form in (str(f).strip() for f in data.get("forms") or ()) if form)
+        return cls(term=term, weight=float(data.get("weight", 1.0)), fields=fields, forms=forms)
+
+    @property
+    def spellings(self):
+        return (self.term,) + self.forms
+
+
+_WORD = re.compile(r"\w+")
+
+
+def words(text):
+    """Lower-cased word tokens; rules and messages are both matched on these."""
+    return _WORD.findall(text.lower())
+
+
+class RuleSet:
+    """
+    A rule list compiled into one word index per field, keyed by each term's first word.
+    Classifying a field tokenizes it once and intersects its words with the index, so the
+    cost does not grow with the number of terms; only phrases whose first word occurs are
+    checked further. Terms match whole words, case-insensitively, ignoring punctuation
+    between the words of a phrase ("disk-full" matches "disk full").
+    """
+
+    def __init__(self, rules, severities=None, threshold=1.0):
+        self.rules = list(rules)
+        self.severities = sorted((severities or {}).items(), key=lambda item: -item[1])
+        self.threshold = threshold
+        self._index = {}
+        for rule in self.rules:
+            for spelling in rule.spellings:
+                term_words = words(spelling)
+                if not term_words:
+                    raise ValueError(f"Alert rule '{rule.term}' has no words to match in '{spelling}'")
+                for field in rule.fields:
+                    self._index.setdefault(field, {}).setdefault(term_words[0], []).append((tuple(term_words[1:]), rule))
+        self._first_words = {field: frozenset(index) for field, index in self._index.items()}
+
+    @classmethod
+    def from_dict(cls, data, threshold=1.0):
+        return cls((Rule.from_dict(rule) for rule in data.get("rules", [])),
+                   severities=data.get("severities"), threshold=float(data.get("threshold", threshold)))
+
+    def terms(self, *fields):
+        """
+        Terms and forms scoped to any of `fields`, in rule order, for IMAP SEARCH. Spellings
+        that contain one already listed are left out, since SEARCH matches substrings.
+        """
+        found = []
+        for rule in self.rules:
+            if set(fields) & set(rule.fields):
+                for spelling in rule.spellings:
+                    if not any(term.lower() in spelling.lower() for term in found):
+                        found.append(spelling)
+        return found
+
+    def score(self, subject="", sender="", body=""):
+        """Returns (score, matched terms). Each rule counts once, however often its term occurs."""
+        texts = {"subject": subject, "sender": sender, "body": body}
+        matched = {}
+        for field, index in self._index.items():
+            text = texts[field]
+            if not text:
+                continue
+            tokens = words(sender_domain(text) if field == "sender" else text)
+            present = self._first_words[field].intersection(tokens)
+            for first in present:
+                for rest, rule in index[first]:
+                    if rule in matched:
+                        continue
+                    if not rest or _contains_phrase(tokens, first, rest):
+                        matched[rule] = rule.weight
+        return sum(matched.values()), sorted({rule.term for rule in matched})
+
+    def severity(self, score):
+        for name, minimum in self.severities:
+            if score >= minimum:
+                return name
+        return None
+
+    def classify(self, subject="", sender="", body=""):
+        """Returns {"score", "severity", "terms", "is_alert"} for one message."""
+        score, terms = self.score(subject, sender, body)
+        return {"score": score, "severity": self.severity(score), "terms": terms, "is_alert": score >= self.threshold}
+
+
+def _contains_phrase(tokens, first, rest):
+    n = len(rest)
+    return any(token == first and tuple(tokens[i + 1:i + 1 + n]) == rest for i, token in enumerate(tokens))
+
+
+def sender_domain(sender):
+    """The domain of a From header value, lower-cased ('' when there is none)."""
+    address = parseaddr(sender or "")[1]
+    return address.rpartition("@")[2].lower() if "@" in address else ""
+
+
+class RuleEngine:
+    """
+    The active RuleSet, rebuilt when RULES_FILE changes on disk (checked at most every
+    RELOAD_INTERVAL seconds). A file that fails to load is logged and the previous rules stay.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules = None
+        self._source = None
+        self._checked_at = 0.0
+
+    def _load(self, path, threshold):
+        if not path:
+            return RuleSet.from_dict(DEFAULT_RULES, threshold)
+        with open(path, encoding="utf-8") as f:
+            return RuleSet.from_dict(json.load(f), threshold)
+
+    def rules(self):
+        config = alert_rules_config()
+        now = time.monotonic()
+        if self._rules is not None and now - self._checked_at < config["RELOAD_INTERVAL"]:
+            return self._rules
+        with self._lock:
+            self._checked_at = now
+            path = config["RULES_FILE"]
+            try:
+                source = (path, os.stat(path).st_mtime_ns) if path else (None, None)
+            except OSError as e:
+                logger.error(f"Alert rule file unavailable, keeping current rules: {e}")
+                source = self._source or (None, None)
+            if self._rules is None or source != self._source:
+                try:
+                    rules = self._load(source[0], config["THRESHOLD"])
+                    logger.info(f"Loaded {len(rules.rules)} alert rule(s) from {source[0] or 'the defaults'}.")
+                    self._rules, self._source = rules, source
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.error(f"Failed to load alert rules from {path}: {e}")
+                    if self._rules is None:
+                        self._rules, self._source = RuleSet.from_dict(DEFAULT_RULES, config["THRESHOLD"]), source
+            return self._rules
+
+    def classify(self, subject="", sender="", body=""):
+        return self.rules().classify(subject, sender, body)
+
+    def search_criteria(self):
+        """
+        IMAP SEARCH keys matching any rule server-side, or None when the rule set is too large
+        to send (or scopes nothing the server can search). IMAP SEARCH is substring-based, so
+        it over-matches; classify() has the final say.
+        """
+        rules = self.rules()
+        terms = {"SUBJECT": rules.terms("subject"), "BODY": rules.terms("body"), "FROM": rules.terms("sender")}
+        if not any(terms.values()) or len(terms["SUBJECT"]) + len(terms["BODY"]) > alert_rules_config()["SERVER_FILTER_MAX_TERMS"]:
+            return None
+        return mailbox.any_of(f"{key} {mailbox.imap_quote(term)}" for key, values in terms.items() for term in values)
+
+    def reload(self):
+        """Forces the next rules() call to re-read the rule file."""
+        with self._lock:
+            self._source = None
+            self._checked_at = 0.0
+
+
+engine = RuleEngine()
@@ -0,0 +1,196 @@
+import imaplib
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import agent_services
+from . import mailbox
+from .models import BackfillChunk, MailboxCheckpoint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKFILL = {
+    "CHUNK_SIZE": 500,              # messages per chunk
+    "CONNECTIONS": 4,               # IMAP connections (one chunk each) working in parallel
+    "MAX_COMMANDS_PER_SECOND": 0,   # IMAP commands per second across all connections; 0 = unlimited
+}
+
+
+def backfill_config():
+    config = dict(DEFAULT_BACKFILL)
+    config.update(getattr(settings, "BACKFILL", {}))
+    return config
+
+
+def run_name(since, until):
+    """Chunks are keyed by mailbox and date range, so rerunning the same range resumes it."""
+    return f"{agent_services.mailbox_key()} {since.isoformat()}..{until.isoformat()}"
+
+
+def date_criteria(since, until):
+    """IMAP SEARCH keys for `since` through `until`, both inclusive."""
+    return f'SINCE "{since.strftime("%d-%b-%Y")}" BEFORE "{(until + timedelta(days=1)).strftime("%d-%b-%Y")}"'
+
+
+def lock_mailbox(owner):
+    """
+    Takes or renews the mailbox's scan lease (see agent_services.ingest_new_messages) for
+    `owner`. Live scans skip while the backfill holds it, so a range reaching into recent
+    days is never ingested by both at once. Returns True when `owner` holds the lease.
+    """
+    return MailboxCheckpoint.try_lock(agent_services.mailbox_key(), owner, agent_services.INGEST_LOCK_LEASE)
+
+
+def unlock_mailbox(owner):
+    MailboxCheckpoint.unlock(agent_services.mailbox_key(), owner)
+
+
+def plan(mail, run, since, until, chunk_size, restart=False):
+    """
+    Splits the messages in the date range into chunks of `chunk_size` UIDs, once per run.
+    On a rerun the search is skipped and the existing chunks are kept; failed chunks and
+    those left running by a crashed run go back to pending and resume after their done_uid.
+    Raises ValueError if UIDVALIDITY changed since the chunks were planned, as their UIDs
+    no longer name the same messages.
+    """
+    validity = mailbox.uid_validity(mail)
+    chunks = BackfillChunk.objects.filter(run=run)
+    if restart:
+        chunks.delete()
+    existing = chunks.first()
+    if existing is not None:
+        if existing.uid_validity != validity:
+            raise ValueError(
+                f"UIDVALIDITY of {agent_services.mailbox_key()} changed from {existing.uid_validity} to {validity}; "
+                "rerun with --restart to plan the backfill again."
+            )
+        reset = chunks.filter(status__in=[BackfillChunk.RUNNING, BackfillChunk.FAILED]).update(
+            status=BackfillChunk.PENDING
+        )
+        if reset:
+            logger.warning(f"Resuming {reset} unfinished chunk(s) of '{run}'.")
+        return chunks
+
+    uids = sorted(mailbox.search_uids(mail, f"({date_criteria(since, until)})"), key=int)
+    with transaction.atomic():
+        BackfillChunk.objects.bulk_create([
+            BackfillChunk(run=run, uid_validity=validity, first_uid=int(batch[0]), last_uid=int(batch[-1]),
+                          messages=len(batch))
+            for batch in mailbox.batched(uids, chunk_size)
+        ])
+    logger.info(f"Planned {len(uids)} message(s) in {chunks.count()} chunk(s) for '{run}'.")
+    return chunks
+
+
+class RateLimiter:
+    """Token bucket shared by the backfill connections: at most `rate` acquisitions per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedMail:
+    """Wraps an IMAP connection so every UID command first takes a RateLimiter token."""
+
+    def __init__(self, mail, limiter):
+        self._mail = mail
+        self._limiter = limiter
+
+    def uid(self, *args):
+        self._limiter.acquire()
+        return self._mail.uid(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._mail, name)
+
+
+def claim_next(run):
+    """Moves the lowest pending chunk of `run` to running. Returns it, or None."""
+    while True:
+        chunk_id = (BackfillChunk.objects.filter(run=run, status=BackfillChunk.PENDING)
+                    .order_by("first_uid").values_list("id", flat=True).first())
+        if chunk_id is None:
+            return None
+        if BackfillChunk.objects.filter(id=chunk_id, status=BackfillChunk.PENDING).update(status=BackfillChunk.RUNNING):
+            chunk = BackfillChunk.objects.get(id=chunk_id)
+            chunk.attempts += 1
+            chunk.save(update_fields=["attempts", "updated_at"])
+            return chunk
+
+
+def process_chunk(chunk, mail, since, until, dedup=None):
+    """
+    Ingests the chunk's messages after `done_uid` through the regular scan, with the chunk
+    as checkpoint. Marks it done or failed and returns the scan summary. Connection errors
+    are re-raised after the chunk is marked failed, so the pool discards the connection.
+    """
+    summary = agent_services.new_scan_summary()
+    try:
+        start = max(chunk.first_uid, chunk.done_uid + 1)
+        uids = [] if start > chunk.last_uid else sorted(
+            (uid for uid in mailbox.search_uids(mail, f"(UID {start}:{chunk.last_uid} {date_criteria(since, until)})")
+             if start <= int(uid) <= chunk.last_uid),
+            key=int,
+        )
+        agent_services.scan_messages(mail, uids, summary, checkpoint=chunk, dedup=dedup)
+    except Exception as e:
+        _finish(chunk, BackfillChunk.FAILED, str(e))
+        if isinstance(e, (imaplib.IMAP4.abort, OSError)):
+            raise
+        logger.exception(f"Backfill chunk {chunk} failed")
+        return summary
+
+    if summary["errors"] or summary["processed_emails"] < len(uids):
+        _finish(chunk, BackfillChunk.FAILED, f"{summary['errors']} error(s); stopped after UID {chunk.done_uid}.")
+    else:
+        _finish(chunk, BackfillChunk.DONE, "")
+    return summary
+
+
+def _finish(chunk, status, error):
+    chunk.status = status
+    chunk.error = error
+    chunk.save(update_fields=["status", "error", "updated_at"])
+
+
+def work(pool, run, since, until, limiter=None, dedup=None, stopping=None, on_chunk=None):
+    """Claims and processes chunks of `run` on connections from `pool` until none are pending."""
+    try:
+        while not (stopping and stopping.is_set()):
+            close_old_connections()
+            chunk = claim_next(run)
+            if chunk is None:
+                return
+            try:
+                with pool.connection() as mail:
+                    summary = process_chunk(chunk, RateLimitedMail(mail, limiter) if limiter else mail,
+                                            since, until, dedup=dedup)
+            except Exception as e:
+                # A fresh connection takes the next chunk; this one is retried on the next run.
+                logger.warning(f"Backfill connection error on {chunk}: {e}")
+                if chunk.status == BackfillChunk.RUNNING:
+                    _finish(chunk, BackfillChunk.FAILED, str(e))
+                summary = agent_services.new_scan_summary()
+            if on_chunk:
+                on_chunk(chunk, summary)
+    finally:
+        close_old_connections()
@@ -0,0 +1,112 @@
+import csv
+import io
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import agent_services
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BULK_LOOKUP = {
+    "MAX_IDS": 1000,
+    "MAX_WORKERS": 8,
+}
+
+# kind -> (tool, key of the record in a successful result, CSV column names that hold the ID)
+LOOKUPS = {
+    "po": (agent_services.get_po_details, "po_header", ("PO_ID", "PO", "PO_NUMBER")),
+    "vendor": (agent_services.get_vendor_details, "vendor_header", ("VENDOR_ID", "VENDOR", "SUPPLIER_ID")),
+}
+
+_SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def bulk_config():
+    config = dict(DEFAULT_BULK_LOOKUP)
+    config.update(getattr(settings, "BULK_LOOKUP", {}))
+    return config
+
+
+def unique_ids(ids):
+    seen = set()
+    return [i for i in ids if i and not (i in seen or seen.add(i))]
+
+
+def parse_ids(text):
+    """Splits IDs pasted as one per line or separated by commas, semicolons or spaces."""
+    return unique_ids(part.strip() for part in _SEPARATORS.split(text or ""))
+
+
+def parse_csv_ids(kind, data):
+    """
+    Reads IDs from CSV bytes or text. Uses the first column whose header names the ID
+    (e.g. PO_ID or VENDOR_ID); without such a header every row's first cell is an ID.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig", errors="replace")
+    rows = [row for row in csv.reader(io.StringIO(data)) if row and any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().upper() for cell in rows[0]]
+    column = next((header.index(name) for name in LOOKUPS[kind][2] if name in header), None)
+    if column is None:
+        column, body = 0, rows
+    else:
+        body = rows[1:]
+    return unique_ids(row[column].strip() for row in body if len(row) > column)
+
+
+def bulk_lookup(kind, ids, max_workers=None):
+    """
+    Looks up every ID through the cached PeopleSoft tool with bounded concurrency.
+    Returns one row per ID, in input order: {"id", "status", "message", **record fields}.
+    """
+    tool, record_key, _ = LOOKUPS[kind]
+    config = bulk_config()
+    if len(ids) > config["MAX_IDS"]:
+        raise ValueError(f"A bulk lookup accepts at most {config['MAX_IDS']} IDs; got {len(ids)}.")
+
+    def lookup(item_id):
+        try:
+            result = tool(item_id)
+        except Exception as e:
+            logger.exception(f"Bulk {kind} lookup failed for {item_id}")
+            result = {"status": "error", "message": str(e)}
+        success = result.get("status") == "success"
+        row = {"id": item_id, "status": result.get("status"), "message": "" if success else result.get("message", "")}
+        row.update(result.get(record_key) or {})
+        return row
+
+    started = time.monotonic()
+    workers = max(1, min(max_workers or config["MAX_WORKERS"], len(ids) or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"bulk-{kind}") as executor:
+        rows = list(executor.map(lookup, ids))
+    logger.info(f"Bulk {kind} lookup of {len(ids)} ID(s) finished in {time.monotonic() - started:.2f}s")
+    return rows
+
+
+def columns(rows):
+    """Column names for a result table: id, status, message, then record fields in first-seen order."""
+    names = ["id", "status", "message"]
+    for row in rows:
+        names.extend(name for name in row if name not in names)
+    return names
+
+
+def rows_to_csv(rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=columns(rows), restval="", extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({name: _cell(value) for name, value in row.items()})
+    return output.getvalue()
+
+
+def _cell(value):
+    if isinstance(value, (dict, list)):
+        return str(value)
+    return value
@@ -0,0 +1,192 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# What a loader says about its result.
+POSITIVE = "positive"   # cache for `ttl`
+NEGATIVE = "negative"   # a definite "not found"; cache for `negative_ttl`
+SKIP = "skip"           # transient failure; do not cache
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+
+
+class _Entry:
+    __slots__ = ("value", "kind", "stored_at", "ttl")
+
+    def __init__(self, value, kind, ttl):
+        self.value = value
+        self.kind = kind
+        self.stored_at = time.monotonic()
+        self.ttl = ttl
+
+    def age(self):
+        return time.monotonic() - self.stored_at
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the function and
+    every caller that arrives while it is in flight waits for and shares its result (or
+    its exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns (result, shared) where shared is True if another caller did the work."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTLs and stale-while-revalidate.
+
+    A fresh entry is returned as is. An entry past its TTL but within `stale_ttl` more
+    seconds is still returned, while one background refresh reloads it. Anything older is
+    loaded synchronously, and concurrent misses for one key share a single load.
+    Loaders return (value, kind); see POSITIVE, NEGATIVE and SKIP.
+    """
+
+    def __init__(self, name, max_entries=1024, ttl=300, stale_ttl=600, negative_ttl=60):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("hits", "stale_hits", "negative_hits", "misses", "coalesced", "refreshes", "evictions", "load_errors"),
+            0,
+        )
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = entry.age()
+                if age <= entry.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["negative_hits" if entry.kind == NEGATIVE else "hits"] += 1
+                    return entry.value
+                if age <= entry.ttl + self.stale_ttl and entry.kind == POSITIVE:
+                    self._entries.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        _refresh_executor.submit(self._refresh, key, loader)
+                    return entry.value
+            self._stats["misses"] += 1
+
+        (value, _), shared = self._flight.do(key, lambda: self._load(key, loader))
+        if shared:
+            with self._lock:
+                self._stats["coalesced"] += 1
+        return value
+
+    def _load(self, key, loader):
+        try:
+            value, kind = loader()
+        except Exception:
+            with self._lock:
+                self._stats["load_errors"] += 1
+            raise
+        if kind == SKIP:
+            with self._lock:
+                self._stats["load_errors"] += 1
+        else:
+            self.put(key, value, kind)
+        return value, kind
+
+    def _refresh(self, key, loader):
+        try:
+            self._flight.do(key, lambda: self._load(key, loader))
+            with self._lock:
+                self._stats["refreshes"] += 1
+        except Exception:
+            logger.exception(f"Background refresh of {self.name} cache entry {key!r} failed")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def put(self, key, value, kind=POSITIVE):
+        ttl = self.negative_ttl if kind == NEGATIVE else self.ttl
+        with self._lock:
+            self._entries[key] = _Entry(value, kind, ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["negative_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def from_settings(name):
+    """Builds a TTLCache from settings.LOOKUP_CACHE[name] (MAX_ENTRIES, TTL, STALE_TTL, NEGATIVE_TTL)."""
+    options = getattr(settings, "LOOKUP_CACHE", {}).get(name, {})
+    return TTLCache(
+        name,
+        max_entries=options.get("MAX_ENTRIES", 1024),
+        ttl=options.get("TTL", 300),
+        stale_ttl=options.get("STALE_TTL", 600),
+        negative_ttl=options.get("NEGATIVE_TTL", 60),
+    )
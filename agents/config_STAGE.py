@@ -24,4 +24,7 @@ PROCESSED_EMAILS_FILE = '/ASTUTE_AP/processed_emails.txt'
 MAIL_INTERVAL_DAYS = 5
 
 BUCKET_ALERT_INTERVAL_IN_MINS = 10
-OCI_BUCKET_RECEIPTS = 'UATNewInvoices'
\ No newline at end of file
+OCI_BUCKET_RECEIPTS = 'UATNewInvoices'
+
+# ORDS handler accepting a JSON array of email-detail rows; None sends the outbox one row per POST.
+APEX_API_URL_EMAIL_BATCH = None
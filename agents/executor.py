@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT_EXECUTOR = {
+    "MAX_WORKERS": 8,    # blocking agent/SDK calls running at once
+    "MAX_PENDING": 32,   # running plus queued; beyond this requests are turned away
+}
+
+
+class ExecutorBusy(Exception):
+    """Raised when the agent executor already has MAX_PENDING calls running or queued."""
+
+
+def executor_config():
+    config = dict(DEFAULT_AGENT_EXECUTOR)
+    config.update(getattr(settings, "AGENT_EXECUTOR", {}))
+    return config
+
+
+_executor = None
+_admission = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _admission
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                config = executor_config()
+                _admission = threading.BoundedSemaphore(max(config["MAX_PENDING"], config["MAX_WORKERS"]))
+                _executor = ThreadPoolExecutor(max_workers=config["MAX_WORKERS"], thread_name_prefix="agent-call")
+    return _executor, _admission
+
+
+def _call(fn, args, kwargs):
+    # Worker threads outlive requests, so they manage their own DB connections.
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def _release(_):
+    _admission.release()
+    metrics.executor_pending.dec()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Runs a blocking call (an agent run, a PeopleSoft lookup) on the bounded agent executor
+    and awaits it, so the ASGI event loop keeps serving other requests meanwhile.
+    Raises ExecutorBusy instead of queueing once MAX_PENDING calls are outstanding.
+    """
+    executor, admission = _get_executor()
+    if not admission.acquire(blocking=False):
+        logger.warning(f"Agent executor is full; rejecting {getattr(fn, '__name__', fn)}")
+        metrics.executor_rejected.inc()
+        raise ExecutorBusy("The server is busy with other agent requests; please retry shortly.")
+    try:
+        future = executor.submit(_call, fn, args, kwargs)
+    except BaseException:
+        admission.release()
+        raise
+    metrics.executor_pending.inc()
+    # Released when the call finishes, not when the awaiting request goes away.
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
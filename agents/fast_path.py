@@ -0,0 +1,68 @@
+import logging
+import re
+
+from django.conf import settings
+
+from . import agent_services
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAST_PATH = {
+    "ENABLED": True,
+    # PeopleSoft auto-numbers PO_ID and VENDOR_ID as 10 zero-padded digits, e.g. "0000000014".
+    # Anything looser ("14", "po#14") goes to the agent, which can ask or pad it, rather than
+    # being sent as is and cached as not found.
+    "PO_ID_PATTERN": r"\d{10}",
+    "VENDOR_ID_PATTERN": r"\d{10}",
+    # Offer the agent's summary as a follow-up request after the direct result is shown.
+    "SUMMARY": True,
+}
+
+# Lead-ins users type before an ID, e.g. "PO# 14", "vendor id: 0000000001".
+_PREFIXES = {
+    "po": re.compile(r"^(?:PO|PURCHASE\s+ORDER)\b(?:\s*(?:NUMBER|NO\.?|ID))?\s*[#:]?\s*", re.IGNORECASE),
+    "vendor": re.compile(r"^(?:VENDOR|SUPPLIER)\b(?:\s*(?:NUMBER|NO\.?|ID))?\s*[#:]?\s*", re.IGNORECASE),
+}
+
+_TOOLS = {
+    "po": (agent_services.get_po_details, "po_header", agent_services.run_po_agent),
+    "vendor": (agent_services.get_vendor_details, "vendor_header", agent_services.run_vendor_agent),
+}
+
+
+def fast_path_config():
+    config = dict(DEFAULT_FAST_PATH)
+    config.update(getattr(settings, "FAST_PATH", {}))
+    return config
+
+
+def structured_id(kind, text):
+    """Returns the ID if `text` is just a PO or vendor ID (optionally with a lead-in), else None."""
+    config = fast_path_config()
+    pattern = config["PO_ID_PATTERN"] if kind == "po" else config["VENDOR_ID_PATTERN"]
+    candidate = _PREFIXES[kind].sub("", (text or "").strip()).strip().upper()
+    if re.fullmatch(pattern, candidate):
+        return candidate
+    return None
+
+
+def lookup(kind, text):
+    """
+    Answers a PO or vendor request. A well-formed ID goes straight to the PeopleSoft tool and
+    the record is returned as is; anything else is handed to the agent as before.
+    """
+    tool, record_key, run_agent = _TOOLS[kind]
+    item_id = structured_id(kind, text) if fast_path_config()["ENABLED"] else None
+    if item_id is None:
+        return run_agent(text)
+
+    logger.info(f"Fast path: direct {kind} lookup for {item_id}")
+    result = tool(item_id)
+    if result.get("status") == "success":
+        return {"status": "success", "message": "", "record": result.get(record_key), "fast_path": True}
+    return {"status": "error", "message": result.get("message", ""), "fast_path": True}
+
+
+def summarize(kind, item_id):
+    """The agent's answer for an ID already shown by the fast path; its tool call hits the lookup cache."""
+    return _TOOLS[kind][2](item_id)
@@ -0,0 +1,112 @@
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPSTREAM = {
+    "POOL_CONNECTIONS": 4,
+    "POOL_MAXSIZE": 10,
+    "CONNECT_TIMEOUT": 5,
+    "READ_TIMEOUT": 30,
+    "RETRIES": 3,
+    "BACKOFF": 0.5,
+    "BACKOFF_JITTER": 0.5,
+    "RETRY_STATUSES": (429, 502, 503, 504),
+}
+
+# upstream -> stage name in agents.metrics
+METRIC_STAGES = {"apex": "apex_insert", "peoplesoft": "peoplesoft_call"}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def upstream_config(upstream):
+    """Settings for a named upstream from settings.HTTP_UPSTREAMS, over the defaults."""
+    config = dict(DEFAULT_UPSTREAM)
+    configured = getattr(settings, "HTTP_UPSTREAMS", {})
+    config.update(configured.get("default", {}))
+    config.update(configured.get(upstream, {}))
+    return config
+
+
+def _build_session(config):
+    retry = Retry(
+        total=config["RETRIES"],
+        connect=config["RETRIES"],
+        read=config["RETRIES"],
+        status=config["RETRIES"],
+        # Only idempotent methods are retried after the request may have reached the server;
+        # connection failures are retried for every method.
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        status_forcelist=config["RETRY_STATUSES"],
+        backoff_factor=config["BACKOFF"],
+        backoff_jitter=config["BACKOFF_JITTER"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config["POOL_CONNECTIONS"],
+        pool_maxsize=config["POOL_MAXSIZE"],
+        pool_block=False,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(upstream, url):
+    """Returns the shared keep-alive Session for the host of `url`, tuned for `upstream`."""
+    parts = urlsplit(url)
+    key = (upstream, parts.scheme, parts.netloc)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _build_session(upstream_config(upstream))
+                _sessions[key] = session
+                logger.debug(f"Created HTTP session for {upstream} upstream {parts.netloc}")
+    return session
+
+
+def request(upstream, method, url, **kwargs):
+    """
+    Sends a request through the pooled session for `upstream`. A (connect, read) timeout
+    from the upstream's settings is applied unless the caller passes its own.
+    """
+    if "timeout" not in kwargs:
+        config = upstream_config(upstream)
+        kwargs["timeout"] = (config["CONNECT_TIMEOUT"], config["READ_TIMEOUT"])
+    stage = METRIC_STAGES.get(upstream, f"{upstream}_http")
+    with metrics.timed(stage):
+        response = get_session(upstream, url).request(method, url, **kwargs)
+    if response.status_code >= 500:
+        metrics.record_error(stage)
+    return response
+
+
+def get(upstream, url, **kwargs):
+    return request(upstream, "GET", url, **kwargs)
+
+
+def post(upstream, url, **kwargs):
+    return request(upstream, "POST", url, **kwargs)
+
+
+def close_sessions():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
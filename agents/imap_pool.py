@@ -0,0 +1,178 @@
+import atexit
+import imaplib
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """An authenticated IMAP connection plus the bookkeeping the pool needs."""
+
+    def __init__(self, mail):
+        self.mail = mail
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def close(self):
+        try:
+            self.mail.logout()
+        except Exception as e:
+            logger.debug(f"Ignoring logout error on pooled IMAP connection: {e}")
+
+
+class IMAPConnectionPool:
+    """
+    Thread-safe pool of logged-in IMAP connections with the mailbox already selected.
+
+    Connections idle for longer than `idle_timeout` are logged out, connections idle
+    for longer than `health_check_after` are NOOP-checked before reuse, and a broken
+    connection is replaced transparently. At most `max_size` connections exist at once;
+    callers block for up to `acquire_timeout` seconds when all of them are in use.
+    """
+
+    def __init__(self, host, user, password, mailbox='inbox', max_size=4, idle_timeout=300,
+                 health_check_after=30, acquire_timeout=60, connect_timeout=30):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.mailbox = mailbox
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self.connect_timeout = connect_timeout
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._closed = False
+
+    def _connect(self):
+        started = time.monotonic()
+        with metrics.timed("imap_connect"):
+            mail = imaplib.IMAP4_SSL(self.host, timeout=self.connect_timeout)
+            try:
+                mail.login(self.user, self.password)
+                result, _ = mail.select(self.mailbox)
+                if result != 'OK':
+                    raise imaplib.IMAP4.error(f"SELECT {self.mailbox} failed")
+            except Exception:
+                PooledConnection(mail).close()
+                raise
+        logger.info(f"Opened IMAP connection to {self.host} in {time.monotonic() - started:.2f}s.")
+        return PooledConnection(mail)
+
+    def _is_healthy(self, conn):
+        if conn.mail.state != 'SELECTED':
+            return False
+        if time.monotonic() - conn.last_used < self.health_check_after:
+            return True
+        try:
+            result, _ = conn.mail.noop()
+            return result == 'OK'
+        except Exception as e:
+            logger.info(f"Pooled IMAP connection failed NOOP, reconnecting: {e}")
+            return False
+
+    def _evict_idle(self):
+        """Drops connections idle past idle_timeout. Caller holds the lock."""
+        now = time.monotonic()
+        expired = [conn for conn in self._idle if now - conn.last_used > self.idle_timeout]
+        for conn in expired:
+            self._idle.remove(conn)
+        return expired
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No IMAP connection available within {self.acquire_timeout}s")
+        try:
+            while True:
+                with self._lock:
+                    if self._closed:
+                        raise RuntimeError("IMAP connection pool is closed")
+                    expired = self._evict_idle()
+                    conn = self._idle.pop() if self._idle else None
+                for stale in expired:
+                    stale.close()
+                if conn is None:
+                    return self._connect()
+                if self._is_healthy(conn):
+                    return conn
+                conn.close()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        try:
+            if discard or self._closed:
+                conn.close()
+                return
+            # Unsolicited responses pile up on long-lived connections.
+            conn.mail.untagged_responses.clear()
+            conn.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the duration of the block. A connection that raised
+        a socket or protocol-abort error is discarded instead of being returned to the pool.
+        """
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn.mail
+        except (imaplib.IMAP4.abort, OSError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            conn.close()
+
+    @classmethod
+    def from_settings(cls, **overrides):
+        """Builds a pool for the SMTP_HOST mailbox using settings.IMAP_POOL, with optional overrides."""
+        options = getattr(settings, 'IMAP_POOL', {})
+        kwargs = {
+            'mailbox': options.get('MAILBOX', 'inbox'),
+            'max_size': options.get('MAX_SIZE', 4),
+            'idle_timeout': options.get('IDLE_TIMEOUT', 300),
+            'health_check_after': options.get('HEALTH_CHECK_AFTER', 30),
+            'acquire_timeout': options.get('ACQUIRE_TIMEOUT', 60),
+            'connect_timeout': options.get('CONNECT_TIMEOUT', 30),
+        }
+        kwargs.update(overrides)
+        return cls(settings.SMTP_HOST, settings.SMTP_USER, settings.SMTP_PASSWORD, **kwargs)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_imap_pool():
+    """Returns the process-wide pool for the SMTP_HOST mailbox, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = IMAPConnectionPool.from_settings()
+                atexit.register(_pool.close)
+    return _pool
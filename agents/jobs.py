@@ -0,0 +1,168 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import agent_services
+from . import progress
+from .models import AgentJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT_JOBS = {
+    "ENABLED": True,
+    "POLL_INTERVAL": 2,          # seconds a worker sleeps when the queue is empty
+    "PROGRESS_INTERVAL": 1,      # seconds between progress writes for a running job
+    "STALE_AFTER": 900,          # a running job without a heartbeat this long is marked failed
+    "IN_PROCESS_WORKERS": 1,     # worker threads started in the web process; 0 = run_agent_jobs only
+}
+
+# kind -> callable taking the job's params as keyword arguments and returning the agent result dict
+JOB_KINDS = {
+    "email": agent_services.run_Email_agent,
+    "alertsummary": agent_services.run_alertsummary_agent,
+    "po": agent_services.run_po_agent,
+    "vendor": agent_services.run_vendor_agent,
+}
+
+
+def jobs_config():
+    config = dict(DEFAULT_AGENT_JOBS)
+    config.update(getattr(settings, "AGENT_JOBS", {}))
+    return config
+
+
+def is_enabled():
+    return jobs_config()["ENABLED"]
+
+
+def enqueue(kind, **params):
+    """Queues an agent run and returns the AgentJob; a worker picks it up."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    job = AgentJob.objects.create(kind=kind, params=params)
+    if jobs_config()["IN_PROCESS_WORKERS"]:
+        transaction.on_commit(ensure_workers_started)
+    _work_available.set()
+    logger.info(f"Queued {job}")
+    return job
+
+
+def _fail_stale_jobs():
+    cutoff = timezone.now() - timedelta(seconds=jobs_config()["STALE_AFTER"])
+    stale = AgentJob.objects.filter(status=AgentJob.RUNNING, heartbeat_at__lt=cutoff)
+    count = stale.update(status=AgentJob.FAILED, error="The worker running this job stopped responding.",
+                         finished_at=timezone.now())
+    if count:
+        logger.warning(f"Marked {count} stale agent job(s) as failed.")
+
+
+def claim_next(worker_id):
+    """Moves the oldest queued job to running for this worker. Returns it, or None."""
+    _fail_stale_jobs()
+    while True:
+        job_id = (AgentJob.objects.filter(status=AgentJob.QUEUED)
+                  .order_by("created_at", "id").values_list("id", flat=True).first())
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = AgentJob.objects.filter(id=job_id, status=AgentJob.QUEUED).update(
+            status=AgentJob.RUNNING, worker=worker_id, started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return AgentJob.objects.get(id=job_id)
+
+
+class _ProgressWriter:
+    """Merges reported progress into job.progress, writing at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, job):
+        self.job = job
+        self.interval = jobs_config()["PROGRESS_INTERVAL"]
+        self.last_write = 0.0
+
+    def __call__(self, stage, data):
+        self.job.progress = {**self.job.progress, **data, "stage": stage}
+        if time.monotonic() - self.last_write >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.last_write = time.monotonic()
+        AgentJob.objects.filter(id=self.job.id).update(progress=self.job.progress, heartbeat_at=timezone.now())
+
+
+def _heartbeat(job_id, finished, interval):
+    # Agent calls can go quiet for minutes; keep the job from looking abandoned.
+    try:
+        while not finished.wait(interval):
+            AgentJob.objects.filter(id=job_id).update(heartbeat_at=timezone.now())
+    finally:
+        close_old_connections()
+
+
+def run_job(job):
+    """Runs a claimed job to completion and records its result."""
+    writer = _ProgressWriter(job)
+    finished = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job.id, finished, jobs_config()["STALE_AFTER"] / 3),
+                     name=f"agent-job-{job.id}-heartbeat", daemon=True).start()
+    logger.info(f"Running {job}")
+    try:
+        with progress.listening(writer):
+            result = JOB_KINDS[job.kind](**job.params)
+        failed = isinstance(result, dict) and result.get("status") == "error"
+        job.status = AgentJob.FAILED if failed else AgentJob.SUCCEEDED
+        job.result = result
+        job.error = result.get("message", "") if failed else ""
+    except Exception as e:
+        logger.exception(f"{job} failed")
+        job.status = AgentJob.FAILED
+        job.error = str(e)
+    finally:
+        finished.set()
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "progress", "result", "error", "finished_at"])
+    logger.info(f"Finished {job}")
+    return job
+
+
+def work(worker_id, stopping, once=False):
+    """Claims and runs jobs until `stopping` is set (or the queue is empty, with once=True)."""
+    poll_interval = jobs_config()["POLL_INTERVAL"]
+    while not stopping.is_set():
+        close_old_connections()
+        job = claim_next(worker_id)
+        if job is not None:
+            run_job(job)
+            continue
+        if once:
+            return
+        _work_available.wait(poll_interval)
+        _work_available.clear()
+
+
+def worker_id(suffix=""):
+    return f"{socket.gethostname()}:{os.getpid()}{suffix}"
+
+
+_work_available = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+_stopping = threading.Event()
+
+
+def ensure_workers_started():
+    """Starts IN_PROCESS_WORKERS daemon worker threads in this process, once."""
+    with _workers_lock:
+        _workers[:] = [thread for thread in _workers if thread.is_alive()]
+        for n in range(len(_workers), jobs_config()["IN_PROCESS_WORKERS"]):
+            thread = threading.Thread(target=work, args=(worker_id(f"/thread-{n}"), _stopping),
+                                      name=f"agent-job-worker-{n}", daemon=True)
+            thread.start()
+            _workers.append(thread)
@@ -0,0 +1,539 @@
+import re
+import base64
+import binascii
+import imaplib
+import quopri
+import logging
+import select
+import tempfile
+import time
+from email.header import decode_header, make_header
+from urllib.parse import unquote_to_bytes
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of messages per batched FETCH so the command line stays well below server limits.
+FETCH_BATCH_SIZE = 500
+
+_TOKEN_RE = re.compile(
+    rb'\s*(?:'
+    rb'(?P<open>\()|(?P<close>\))'
+    rb'|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|\{(?P<literal>\d+)\}$'
+    rb'|(?P<atom>[^\s()"\[{]+(?:\[[^\]]*\](?:<\d+>)?)?)'
+    rb')'
+)
+
+
+class _Literal(bytes):
+    """Raw literal payload handed back by imaplib as the second item of a tuple."""
+
+
+class _Atom(str):
+    """Unquoted IMAP atom such as a number, a flag or a FETCH item name."""
+
+
+_OPEN = object()
+_CLOSE = object()
+
+
+def _tokens(data):
+    """Yields tokens from an imaplib response list, keeping literals as raw bytes."""
+    for item in data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            prefix, literal = item
+            yield from _tokens([prefix])
+            yield _Literal(literal)
+            continue
+        pos = 0
+        while pos < len(item):
+            match = _TOKEN_RE.match(item, pos)
+            if not match or match.end() == pos:
+                if item[pos:].strip():
+                    raise ValueError(f"Unparseable IMAP response near {item[pos:pos + 40]!r}")
+                break
+            pos = match.end()
+            if match.group('open'):
+                yield _OPEN
+            elif match.group('close'):
+                yield _CLOSE
+            elif match.group('quoted') is not None:
+                yield re.sub(rb'\\(.)', rb'\1', match.group('quoted')).decode('utf-8', errors='replace')
+            elif match.group('atom'):
+                atom = match.group('atom').decode('ascii', errors='replace')
+                yield None if atom.upper() == 'NIL' else _Atom(atom)
+
+
+def _parse(tokens):
+    """Builds nested lists out of the flat token stream."""
+    stack = [[]]
+    for token in tokens:
+        if token is _OPEN:
+            stack.append([])
+        elif token is _CLOSE:
+            finished = stack.pop()
+            stack[-1].append(finished)
+        else:
+            stack[-1].append(token)
+    return stack[0]
+
+
+def parse_fetch_response(data):
+    """
+    Parses the data list returned by imaplib's fetch/uid FETCH into
+    a list of (sequence_number, {ITEM: value}) tuples.
+    """
+    values = _parse(_tokens(data))
+    responses = []
+    for index in range(0, len(values) - 1, 2):
+        seq, items = values[index], values[index + 1]
+        if not isinstance(items, list):
+            continue
+        attributes = {}
+        for pos in range(0, len(items) - 1, 2):
+            attributes[str(items[pos]).upper()] = items[pos + 1]
+        responses.append((str(seq), attributes))
+    return responses
+
+
+def _params(value):
+    """Turns an IMAP ("KEY" "VALUE" ...) parameter list into a dict with upper-case keys."""
+    if not isinstance(value, list):
+        return {}
+    return {_text(value[i]).upper(): _text(value[i + 1]) for i in range(0, len(value) - 1, 2)}
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def _param_filename(params, key):
+    if key in params and params[key]:
+        return params[key]
+    # RFC 2231 encoded (and possibly continued) parameter values
+    extended = {k: v for k, v in params.items() if k.startswith(f"{key}*")}
+    if not extended:
+        return None
+    ordered = sorted(extended.items(), key=lambda kv: int(re.sub(r'\D', '', kv[0].split('*')[1]) or 0))
+    raw = ''.join(str(v) for _, v in ordered)
+    if any(k.endswith('*') for k in extended):
+        charset, _, encoded = raw.split("'", 2) if raw.count("'") >= 2 else ('', '', raw)
+        return unquote_to_bytes(encoded).decode(charset or 'utf-8', errors='replace')
+    return raw
+
+
+def decode_mime_header(value):
+    """Decodes RFC 2047 encoded-words the same way the legacy RFC822 path does."""
+    if value is None:
+        return ''
+    return str(make_header(decode_header(value)))
+
+
+class BodyPart:
+    """A single non-multipart leaf of a BODYSTRUCTURE tree."""
+
+    def __init__(self, section, structure):
+        self.section = section
+        self.maintype = _text(structure[0]).lower()
+        self.subtype = _text(structure[1]).lower()
+        self.params = _params(structure[2])
+        self.encoding = _text(structure[5] or '7bit').lower()
+        self.size = int(structure[6] or 0)
+
+        if self.maintype == 'text':
+            extension_start = 8
+        elif (self.maintype, self.subtype) == ('message', 'rfc822'):
+            extension_start = 10
+        else:
+            extension_start = 7
+        disposition = structure[extension_start + 1] if len(structure) > extension_start + 1 else None
+        if isinstance(disposition, list) and disposition:
+            self.disposition = _text(disposition[0]).lower()
+            self.disposition_params = _params(disposition[1] if len(disposition) > 1 else None)
+        else:
+            self.disposition = None
+            self.disposition_params = {}
+
+    @property
+    def content_type(self):
+        return f"{self.maintype}/{self.subtype}"
+
+    @property
+    def filename(self):
+        """Mirrors email.message.Message.get_filename(): disposition filename, then Content-Type name."""
+        return _param_filename(self.disposition_params, 'FILENAME') or _param_filename(self.params, 'NAME')
+
+    @property
+    def is_attachment(self):
+        # Same rule as the msg.walk() loop: a Content-Disposition header and a filename.
+        return self.disposition is not None and bool(self.filename)
+
+    @property
+    def charset(self):
+        return str(self.params.get('CHARSET') or 'utf-8')
+
+
+def walk_bodystructure(structure, prefix=''):
+    """Yields every leaf BodyPart of a BODYSTRUCTURE with its IMAP section number."""
+    if not isinstance(structure, list) or not structure:
+        return
+    if isinstance(structure[0], list):
+        number = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            number += 1
+            yield from walk_bodystructure(child, f"{prefix}{number}.")
+        return
+    section = prefix.rstrip('.') or '1'
+    part = BodyPart(section, structure)
+    yield part
+    if part.content_type == 'message/rfc822' and len(structure) > 8 and isinstance(structure[8], list):
+        nested = structure[8]
+        if isinstance(nested[0], list):
+            yield from walk_bodystructure(nested, f"{section}.")
+        else:
+            yield from walk_bodystructure(nested, f"{section}.1.")
+
+
+def attachment_parts(structure):
+    return [part for part in walk_bodystructure(structure) if part.is_attachment]
+
+
+def first_text_part(structure):
+    return next((part for part in walk_bodystructure(structure) if part.content_type == 'text/plain'), None)
+
+
+def decode_part_payload(data, encoding):
+    """Undoes the Content-Transfer-Encoding of a fetched BODY[n] section."""
+    if data is None:
+        raise ValueError("No data to decode; the section was not fetched")
+    if isinstance(data, str):
+        data = data.encode('utf-8', errors='replace')
+    encoding = (encoding or '').lower()
+    if encoding == 'base64':
+        try:
+            return base64.b64decode(data)
+        except binascii.Error:
+            # Same leniency as Message.get_payload(decode=True): drop junk and fix the padding.
+            cleaned = re.sub(rb'[^A-Za-z0-9+/]', b'', data)
+            return binascii.a2b_base64(cleaned + b'=' * (-len(cleaned) % 4))
+    if encoding == 'quoted-printable':
+        return quopri.decodestring(data)
+    return bytes(data)
+
+
+def batched(items, size=FETCH_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fetch_bodystructures(mail, message_ids, uid=False):
+    """
+    Runs one batched FETCH (BODYSTRUCTURE) per FETCH_BATCH_SIZE messages and
+    returns {message_id: [BodyPart, ...]} for messages that carry attachments.
+    """
+    with_attachments = {}
+    key = 'UID' if uid else None
+    for batch in batched(message_ids):
+        message_set = ','.join(m.decode() if isinstance(m, bytes) else str(m) for m in batch)
+        if uid:
+            result, data = uid_fetch(mail, message_set, '(UID BODYSTRUCTURE)')
+        else:
+            result, data = mail.fetch(message_set, '(BODYSTRUCTURE)')
+        if result != 'OK':
+            raise imaplib.IMAP4.error(f"BODYSTRUCTURE fetch failed for {message_set}")
+        for seq, attributes in parse_fetch_response(data):
+            message_id = str(attributes.get(key)) if key else seq
+            parts = attachment_parts(attributes.get('BODYSTRUCTURE'))
+            if parts:
+                with_attachments[message_id] = parts
+    return with_attachments
+
+
+def fetch_sections(mail, message_id, sections, header_fields=('FROM', 'SUBJECT'), uid=False):
+    """
+    Fetches only the given body sections (plus a few header fields) of one message
+    with BODY.PEEK so nothing else is transferred and the \\Seen flag is left alone.
+    Returns (headers_bytes, {section: raw_bytes}).
+
+    Untagged FETCH responses for other messages (e.g. a FLAGS update the server sends
+    unsolicited) are ignored; raises imaplib.IMAP4.error when the message's own
+    response or any requested section is missing.
+    """
+    items = ['UID'] if uid else []
+    items += [f"BODY.PEEK[HEADER.FIELDS ({' '.join(header_fields)})]"]
+    items += [f"BODY.PEEK[{section}]" for section in sections]
+    query = f"({' '.join(items)})"
+    if uid:
+        result, data = uid_fetch(mail, str(message_id), query)
+    else:
+        result, data = mail.fetch(str(message_id), query)
+    if result != 'OK':
+        raise imaplib.IMAP4.error(f"Section fetch failed for message {message_id}")
+    attributes = _response_for(parse_fetch_response(data), message_id, uid)
+    if attributes is None:
+        raise imaplib.IMAP4.error(f"No FETCH response for message {message_id}")
+    headers = b''
+    bodies = {}
+    for name, value in attributes.items():
+        if name.startswith('BODY[HEADER.FIELDS'):
+            headers = bytes(value or b'')
+        elif name.startswith('BODY[') and value is not None:
+            bodies[name[5:name.index(']')]] = value
+    missing = [section for section in sections if section not in bodies]
+    if missing:
+        raise imaplib.IMAP4.error(f"Section(s) {', '.join(missing)} missing from FETCH of message {message_id}")
+    return headers, bodies
+
+
+def _response_for(responses, message_id, uid=False):
+    """The attributes of the FETCH response for `message_id` (a UID if `uid`), or None."""
+    for seq, attributes in responses:
+        if str(attributes.get('UID') if uid else seq) == str(message_id):
+            return attributes
+    return None
+
+
+def imap_quote(value):
+    """Quotes a search key as an IMAP quoted string."""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def any_of(criteria):
+    """Folds search criteria into IMAP's binary OR: OR a OR b c."""
+    criteria = list(criteria)
+    if not criteria:
+        raise ValueError("any_of() needs at least one criterion")
+    # Built from the right without recursion; rule sets can have hundreds of terms.
+    folded = criteria[-1]
+    for criterion in reversed(criteria[:-1]):
+        folded = f"OR {criterion} {folded}"
+    return folded
+
+
+def uid_fetch(mail, message_set, query):
+    """UID FETCH, timed and byte-counted as the imap_fetch stage."""
+    with metrics.timed("imap_fetch"):
+        result, data = mail.uid('FETCH', message_set, query)
+    metrics.add_bytes("imap_fetch", sum(len(item[1]) for item in data or () if isinstance(item, tuple) and item[1]))
+    return result, data
+
+
+def search_uids(mail, criteria):
+    """Runs UID SEARCH and returns the matching UIDs as strings."""
+    with metrics.timed("imap_search"):
+        result, data = mail.uid('SEARCH', criteria)
+    if result != 'OK':
+        raise imaplib.IMAP4.error(f"UID SEARCH failed: {criteria}")
+    return [uid.decode() for uid in (data[0] or b'').split()]
+
+
+def fetch_headers_and_structure(mail, uids, header_fields=('FROM', 'SUBJECT')):
+    """
+    One batched UID FETCH of the requested header fields and BODYSTRUCTURE.
+    Returns {uid: (header_bytes, bodystructure)}.
+    """
+    found = {}
+    query = f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({' '.join(header_fields)})])"
+    for batch in batched(uids):
+        result, data = uid_fetch(mail, ','.join(batch), query)
+        if result != 'OK':
+            raise imaplib.IMAP4.error(f"Header fetch failed for {','.join(batch)}")
+        for _, attributes in parse_fetch_response(data):
+            headers = next((v for k, v in attributes.items() if k.startswith('BODY[HEADER.FIELDS')), b'')
+            found[str(attributes.get('UID'))] = (bytes(headers or b''), attributes.get('BODYSTRUCTURE'))
+    return found
+
+
+def fetch_section_prefixes(mail, uids_by_section, limit):
+    """
+    Fetches at most `limit` bytes of one section per message with BODY.PEEK[n]<0.limit>,
+    one batched UID FETCH per distinct section number. Returns {uid: raw_bytes}.
+    """
+    prefixes = {}
+    for section, uids in uids_by_section.items():
+        for batch in batched(uids):
+            query = f"(UID BODY.PEEK[{section}]<0.{limit}>)"
+            result, data = uid_fetch(mail, ','.join(batch), query)
+            if result != 'OK':
+                raise imaplib.IMAP4.error(f"Prefix fetch failed for {','.join(batch)}")
+            for _, attributes in parse_fetch_response(data):
+                body = next((v for k, v in attributes.items() if k.startswith('BODY[')), b'')
+                prefixes[str(attributes.get('UID'))] = body
+    return prefixes
+
+
+def decode_part_prefix(data, encoding):
+    """Like decode_part_payload() but tolerant of a section cut off at an arbitrary byte."""
+    if isinstance(data, str):
+        data = data.encode('utf-8', errors='replace')
+    data = data or b''
+    if (encoding or '').lower() == 'base64':
+        cleaned = re.sub(rb'[^A-Za-z0-9+/=]', b'', data)
+        data = cleaned[:len(cleaned) - len(cleaned) % 4]
+    elif (encoding or '').lower() == 'quoted-printable':
+        # Drop a soft escape split across the cut so it is not mis-decoded.
+        data = re.sub(rb'=[0-9A-Fa-f]?$', b'', data)
+    return decode_part_payload(data, encoding)
+
+
+def uid_validity(mail, mailbox_name='INBOX'):
+    """UIDVALIDITY of the selected mailbox, from the SELECT response or a STATUS call."""
+    _, data = mail.response('UIDVALIDITY')
+    if not data or data[0] is None:
+        result, data = mail.status(mailbox_name, '(UIDVALIDITY)')
+        if result != 'OK':
+            raise imaplib.IMAP4.error(f"STATUS failed for {mailbox_name}")
+        match = re.search(rb'UIDVALIDITY (\d+)', data[0])
+        return int(match.group(1))
+    return int(data[-1])
+
+
+def uid_next(mail, mailbox_name='INBOX'):
+    """UIDNEXT of the mailbox from a STATUS call: the UID the next delivered message will get."""
+    result, data = mail.status(mailbox_name, '(UIDNEXT)')
+    if result != 'OK':
+        raise imaplib.IMAP4.error(f"STATUS failed for {mailbox_name}")
+    match = re.search(rb'UIDNEXT (\d+)', data[0])
+    return int(match.group(1))
+
+
+def uids_after(mail, last_uid):
+    """UIDs strictly greater than `last_uid`, ascending (UID SEARCH UID n:*)."""
+    # "n:*" always includes the highest UID, even when it is below n.
+    return sorted((uid for uid in search_uids(mail, f"UID {int(last_uid) + 1}:*") if int(uid) > int(last_uid)), key=int)
+
+
+def supports_idle(mail):
+    return 'IDLE' in getattr(mail, 'capabilities', ())
+
+
+def idle_wait(mail, timeout, poll=5.0, should_stop=None):
+    """
+    Issues IMAP IDLE (RFC 2177) and blocks until the server reports a mailbox change,
+    `timeout` seconds pass or `should_stop()` returns True, then ends it with DONE.
+    Returns the untagged responses received while idling, e.g. [b'* 12 EXISTS'].
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b' IDLE\r\n')
+    line = mail.readline()
+    while line.startswith(b'*'):
+        line = mail.readline()
+    if not line.startswith(b'+'):
+        raise imaplib.IMAP4.error(f"IDLE rejected: {line.strip()!r}")
+
+    events = []
+    deadline = time.monotonic() + timeout
+    sock = mail.sock
+    try:
+        while not events and time.monotonic() < deadline:
+            if should_stop and should_stop():
+                break
+            pending = getattr(sock, 'pending', lambda: 0)()
+            wait = min(poll, max(deadline - time.monotonic(), 0))
+            if pending or select.select([sock], [], [], wait)[0]:
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Connection closed while idling")
+                events.append(line.rstrip(b'\r\n'))
+    finally:
+        mail.send(b'DONE\r\n')
+
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+        if line.startswith(tag):
+            if not line[len(tag):].strip().upper().startswith(b'OK'):
+                raise imaplib.IMAP4.error(f"IDLE failed: {line.strip()!r}")
+            break
+        events.append(line.rstrip(b'\r\n'))
+    return events
+
+
+def has_new_mail(events):
+    return any(re.match(rb'\* \d+ (EXISTS|RECENT)', event, re.IGNORECASE) for event in events)
+
+
+class StreamingDecoder:
+    """
+    Incrementally undoes base64 / quoted-printable transfer encoding, writing the
+    decoded bytes to `sink` so no more than one chunk is ever held in memory.
+    """
+
+    def __init__(self, encoding, sink):
+        self.encoding = (encoding or '').lower()
+        self.sink = sink
+        self._pending = b''
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8', errors='replace')
+        if self.encoding == 'base64':
+            self._pending += re.sub(rb'[^A-Za-z0-9+/=]', b'', data)
+            usable = len(self._pending) - len(self._pending) % 4
+            block, self._pending = self._pending[:usable], self._pending[usable:]
+            if block:
+                self.sink.write(decode_part_payload(block, 'base64'))
+        elif self.encoding == 'quoted-printable':
+            self._pending += data
+            cut = self._pending.rfind(b'\n') + 1
+            block, self._pending = self._pending[:cut], self._pending[cut:]
+            if block:
+                self.sink.write(quopri.decodestring(block))
+        else:
+            self.sink.write(data)
+
+    def close(self):
+        if self._pending:
+            self.sink.write(decode_part_payload(self._pending, self.encoding))
+            self._pending = b''
+
+
+def stream_section(mail, uid, section, encoding, size, chunk_size=1024 * 1024, spool_max_size=4 * 1024 * 1024):
+    """
+    Downloads one body section of `size` encoded bytes (its BODYSTRUCTURE size) in
+    `chunk_size` pieces with BODY.PEEK[n]<offset.size>, decoding as it goes into a
+    SpooledTemporaryFile (in memory up to `spool_max_size`, then on disk). Returns the
+    file rewound to the start; the caller closes it. Raises imaplib.IMAP4.error when a
+    chunk fetch fails or the server's response for the UID is missing.
+
+    `size` only guides the loop: the section is read until the server has no more bytes,
+    and a BODYSTRUCTURE size that is slightly off is logged rather than treated as a failure.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_max_size)
+    decoder = StreamingDecoder(encoding, spool)
+    offset = 0
+    try:
+        while True:
+            query = f"(UID BODY.PEEK[{section}]<{offset}.{chunk_size}>)"
+            result, data = uid_fetch(mail, str(uid), query)
+            if result != 'OK':
+                raise imaplib.IMAP4.error(f"Chunk fetch failed for UID {uid} section {section} at {offset}")
+            attributes = _response_for(parse_fetch_response(data), uid, uid=True)
+            if attributes is None:
+                raise imaplib.IMAP4.error(f"No FETCH response for UID {uid} section {section} at {offset}")
+            chunk = next((v for k, v in attributes.items() if k.startswith('BODY[')), None)
+            if not chunk:
+                break
+            decoder.write(chunk)
+            offset += len(chunk)
+            # Past `size` a short chunk is the end of the section; before it, a short chunk may
+            # only be a server's cap on partial fetches, so keep asking until nothing comes back.
+            if offset >= size and len(chunk) < chunk_size:
+                break
+        if offset != size:
+            logger.warning(f"UID {uid} section {section} is {offset} bytes, BODYSTRUCTURE said {size}; keeping all of it.")
+        decoder.close()
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
@@ -0,0 +1,150 @@
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+
+from agents import backfill, outbox
+from agents.imap_pool import IMAPConnectionPool
+from agents.models import BackfillChunk, EmailDetailOutbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-ingests invoice attachments from a historical date range. The range is split into "
+        "UID chunks processed over several IMAP connections; each chunk is checkpointed, so "
+        "rerunning the same range resumes where it stopped without redoing finished chunks. "
+        "It holds the mailbox's scan lease while it runs, so watch_inbox and email agent runs "
+        "wait for it. SIGTERM/SIGINT stops it after the chunks in progress."
+    )
+
+    def add_arguments(self, parser):
+        config = backfill.backfill_config()
+        parser.add_argument('--since', type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD).")
+        parser.add_argument('--until', type=date.fromisoformat, default=None,
+                            help="Last day, inclusive (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument('--connections', type=int, default=config["CONNECTIONS"],
+                            help="IMAP connections working on chunks in parallel.")
+        parser.add_argument('--chunk-size', type=int, default=config["CHUNK_SIZE"],
+                            help="Messages per chunk (only used when the range is first planned).")
+        parser.add_argument('--max-commands-per-second', type=float, default=config["MAX_COMMANDS_PER_SECOND"],
+                            help="Rate limit for IMAP commands across all connections; 0 = unlimited.")
+        parser.add_argument('--no-dedup', action='store_true',
+                            help="Upload attachments even if their content is in the attachment index "
+                                 "(e.g. after the bucket was lost).")
+        parser.add_argument('--restart', action='store_true', help="Discard this range's chunks and plan again.")
+        parser.add_argument('--status', action='store_true', help="Show this range's progress and exit.")
+
+    def handle(self, *args, **options):
+        since, until = options['since'], options['until'] or date.today()
+        if until < since:
+            raise CommandError("--until is before --since.")
+        run = backfill.run_name(since, until)
+        if options['status']:
+            self._show_status(run)
+            return
+
+        owner = f"backfill:{socket.gethostname()}:{os.getpid()}"
+        if not backfill.lock_mailbox(owner):
+            raise CommandError("Another scan of this mailbox is running (watch_inbox or an email agent run); "
+                               "retry once it has finished.")
+        try:
+            self._backfill(run, since, until, owner, options)
+        finally:
+            backfill.unlock_mailbox(owner)
+        self._show_status(run, unsent=self._drain_outbox())
+
+    def _backfill(self, run, since, until, owner, options):
+        connections = max(1, options['connections'])
+        pool = IMAPConnectionPool.from_settings(max_size=connections)
+        try:
+            with pool.connection() as mail:
+                try:
+                    chunks = backfill.plan(mail, run, since, until, options['chunk_size'], restart=options['restart'])
+                except ValueError as e:
+                    raise CommandError(str(e))
+            pending = chunks.filter(status=BackfillChunk.PENDING).count()
+            self.stdout.write(f"Backfilling '{run}': {pending} of {chunks.count()} chunk(s) to process "
+                              f"over {connections} connection(s).")
+
+            stopping = threading.Event()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda *_: stopping.set())
+            rate = options['max_commands_per_second']
+            limiter = backfill.RateLimiter(rate) if rate > 0 else None
+            lock = threading.Lock()
+
+            def on_chunk(chunk, summary):
+                with lock:
+                    if not backfill.lock_mailbox(owner):
+                        self.stderr.write("Lost the mailbox scan lease; stopping after the chunks in progress.")
+                        stopping.set()
+                    self.stdout.write(
+                        f"UID {chunk.first_uid}-{chunk.last_uid} {chunk.status}: {summary['processed_emails']} "
+                        f"message(s), {summary['processed_attachments']} attachment(s), "
+                        f"{summary['duplicate_attachments']} duplicate(s), {summary['errors']} error(s)."
+                    )
+
+            threads = [
+                threading.Thread(
+                    target=backfill.work, name=f"backfill-{n}",
+                    args=(pool, run, since, until),
+                    kwargs={"limiter": limiter, "dedup": False if options['no_dedup'] else None,
+                            "stopping": stopping, "on_chunk": on_chunk},
+                )
+                for n in range(connections)
+            ]
+            for thread in threads:
+                thread.start()
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    # Short joins keep the main thread responsive to signals.
+                    thread.join(timeout=1)
+        finally:
+            pool.close()
+
+    def _drain_outbox(self):
+        """Sends the APEX rows queued by the backfill. Returns how many are still unsent."""
+        if not outbox.is_enabled():
+            return 0
+        sent = failed = 0
+        # Rows the background flusher has claimed are waited for, up to one claim lease.
+        deadline = time.monotonic() + outbox.lease_seconds()
+        while True:
+            batch_sent, batch_failed = outbox.flush_until_empty()
+            sent, failed = sent + batch_sent, failed + batch_failed
+            sending = EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.SENDING).exists()
+            if batch_failed or not sending or time.monotonic() >= deadline:
+                break
+            time.sleep(0.5)
+        pending = EmailDetailOutbox.objects.filter(
+            status__in=[EmailDetailOutbox.PENDING, EmailDetailOutbox.SENDING]
+        ).count()
+        dead = EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.DEAD).count()
+        self.stdout.write(f"APEX outbox: sent {sent} row(s), {failed} failed; {pending} pending, {dead} dead-lettered.")
+        return pending + dead
+
+    def _show_status(self, run, unsent=0):
+        chunks = BackfillChunk.objects.filter(run=run)
+        if not chunks.exists():
+            self.stdout.write(f"No backfill planned for '{run}'.")
+            return
+        by_status = {row["status"]: row for row in
+                     chunks.values("status").annotate(count=Count("id"), messages=Sum("messages"))}
+        summary = ", ".join(f"{status}: {row['count']} chunk(s) / {row['messages']} message(s)"
+                            for status, row in sorted(by_status.items()))
+        self.stdout.write(f"{run} — {summary}")
+        for chunk in chunks.filter(status=BackfillChunk.FAILED).order_by("first_uid"):
+            self.stdout.write(f"  UID {chunk.first_uid}-{chunk.last_uid} failed after UID {chunk.done_uid}: {chunk.error}")
+        if set(by_status) == {BackfillChunk.DONE}:
+            if unsent:
+                self.stdout.write(self.style.WARNING(
+                    f"Every chunk is ingested, but {unsent} APEX row(s) are not sent yet; "
+                    f"run flush_outbox (--dead lists dead-lettered rows)."
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS("Backfill complete."))
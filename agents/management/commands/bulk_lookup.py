@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agents import agent_services, bulk_lookup
+
+
+class Command(BaseCommand):
+    help = (
+        "Looks up many POs or vendors in PeopleSoft concurrently and writes the results as CSV. "
+        "IDs come from --ids, a CSV file (--file), or both."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(bulk_lookup.LOOKUPS), help="What to look up.")
+        parser.add_argument('--ids', default='', help="Comma or space separated IDs.")
+        parser.add_argument('--file', default=None, help="CSV file with a PO_ID/VENDOR_ID column, or IDs in the first column.")
+        parser.add_argument('--output', default=None, help="Write the CSV here instead of stdout.")
+        parser.add_argument('--workers', type=int, default=None, help="Concurrent lookups (defaults to BULK_LOOKUP['MAX_WORKERS']).")
+        parser.add_argument('--summarize', action='store_true', help="Also ask the agent to summarize the results.")
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        ids = bulk_lookup.parse_ids(options['ids'])
+        if options['file']:
+            with open(options['file'], 'rb') as f:
+                ids = bulk_lookup.unique_ids(ids + bulk_lookup.parse_csv_ids(kind, f.read()))
+        if not ids:
+            raise CommandError("No IDs were given; use --ids or --file.")
+
+        try:
+            rows = bulk_lookup.bulk_lookup(kind, ids, max_workers=options['workers'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        table_csv = bulk_lookup.rows_to_csv(rows)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.write(table_csv)
+        else:
+            self.stdout.write(table_csv, ending='')
+
+        failed = sum(1 for row in rows if row['status'] != 'success')
+        self.stderr.write(self.style.SUCCESS(f"Looked up {len(rows)} {kind} ID(s), {failed} failed."))
+        if options['summarize']:
+            summary = agent_services.run_bulk_summary_agent(kind, table_csv)
+            self.stderr.write(summary['message'])
@@ -0,0 +1,63 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from agents import outbox
+from agents.models import EmailDetailOutbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends queued APEX email-detail rows from the write-behind outbox. Runs one pass by "
+        "default, or keeps draining with --loop. Dead-lettered rows can be listed and requeued."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep flushing until interrupted.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between passes with --loop.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Rows claimed per batch.")
+        parser.add_argument('--dead', action='store_true', help="List dead-lettered rows and exit.")
+        parser.add_argument('--requeue-dead', action='store_true', help="Move dead-lettered rows back to pending.")
+
+    def handle(self, *args, **options):
+        if options['dead']:
+            self._report_dead()
+            return
+        if options['requeue_dead']:
+            count = EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.DEAD).update(
+                status=EmailDetailOutbox.PENDING, attempts=0, next_attempt_at=timezone.now()
+            )
+            self.stdout.write(self.style.SUCCESS(f"Requeued {count} dead-lettered row(s)."))
+            return
+
+        if not options['loop']:
+            sent, failed = outbox.flush_until_empty(options['batch_size'])
+            self._report(sent, failed)
+            return
+
+        stopping = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stopping.append(True))
+        while not stopping:
+            close_old_connections()
+            sent, failed = outbox.flush_until_empty(options['batch_size'])
+            if sent or failed:
+                self._report(sent, failed)
+            time.sleep(options['interval'])
+        self.stdout.write("Outbox flusher stopped.")
+
+    def _report(self, sent, failed):
+        pending = EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.PENDING).count()
+        dead = EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.DEAD).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {sent} row(s), {failed} failed; {pending} pending, {dead} dead-lettered."
+        ))
+
+    def _report_dead(self):
+        rows = EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.DEAD).order_by('id')
+        for row in rows:
+            self.stdout.write(f"{row.id}\tUID {row.l_uid}\t{row.attempts} attempt(s)\t{row.last_error}")
+        self.stdout.write(self.style.SUCCESS(f"{rows.count()} dead-lettered row(s)."))
@@ -0,0 +1,81 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from agents import agent_services, oci_clients
+from agents.models import AttachmentDigest
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds the attachment deduplication index by hashing the objects already in the "
+        "invoice bucket. Objects that are already indexed are skipped, so it can be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bucket', default=None, help="Bucket to index (defaults to settings.OCI_BUCKET_NAME).")
+        parser.add_argument('--prefix', default=None, help="Only index objects whose name starts with this prefix.")
+        parser.add_argument('--workers', type=int, default=4, help="Objects downloaded and hashed in parallel.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Index rows written per bulk insert.")
+
+    def handle(self, *args, **options):
+        bucket = options['bucket'] or agent_services.bucket_name
+        namespace = oci_clients.get_namespace()
+        local = threading.local()
+
+        def client():
+            if not hasattr(local, 'client'):
+                local.client = oci_clients.new_object_storage_client()
+            return local.client
+
+        def digest(obj):
+            response = client().get_object(namespace, bucket, obj.name)
+            sha256 = hashlib.sha256()
+            size = 0
+            for chunk in response.data.raw.stream(CHUNK_SIZE, decode_content=False):
+                sha256.update(chunk)
+                size += len(chunk)
+            return AttachmentDigest(sha256=sha256.hexdigest(), size=size, object_name=obj.name, bucket=bucket)
+
+        indexed = set(AttachmentDigest.objects.filter(bucket=bucket).values_list('object_name', flat=True))
+        to_index = [obj for obj in self._list_objects(client(), namespace, bucket, options['prefix'])
+                    if obj.name not in indexed]
+        self.stdout.write(f"{len(to_index)} object(s) in '{bucket}' to index ({len(indexed)} already indexed).")
+
+        rows = []
+        written = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(digest, obj) for obj in to_index]
+            for obj, future in zip(to_index, futures):
+                try:
+                    rows.append(future.result())
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Could not hash '{obj.name}': {e}")
+                if len(rows) >= options['batch_size']:
+                    written += self._flush(rows)
+        written += self._flush(rows)
+        self.stdout.write(self.style.SUCCESS(f"Hashed {written} object(s) into the index; {failed} failed."))
+
+    def _list_objects(self, client, namespace, bucket, prefix):
+        start = None
+        while True:
+            response = client.list_objects(namespace, bucket, prefix=prefix, start=start, fields='name,size')
+            yield from response.data.objects
+            start = response.data.next_start_with
+            if not start:
+                return
+
+    def _flush(self, rows):
+        # Identical content under two names keeps the first; the rest are duplicates already.
+        AttachmentDigest.objects.bulk_create(rows, ignore_conflicts=True)
+        count = len(rows)
+        rows.clear()
+        return count
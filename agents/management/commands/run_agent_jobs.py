@@ -0,0 +1,36 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from agents import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued agent jobs (email scans, alert summaries, lookups) outside the web "
+        "process. Stops after the current job on SIGTERM/SIGINT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1, help="Jobs run concurrently by this worker.")
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        stopping = threading.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stopping.set())
+
+        threads = [
+            threading.Thread(target=jobs.work, args=(jobs.worker_id(f"/{n}"), stopping, options['once']),
+                             name=f"agent-job-worker-{n}")
+            for n in range(max(1, options['threads']))
+        ]
+        self.stdout.write(f"Agent job worker started with {len(threads)} thread(s).")
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                # Short joins keep the main thread responsive to signals.
+                thread.join(timeout=1)
+        self.stdout.write(self.style.SUCCESS("Agent job worker stopped."))
@@ -0,0 +1,94 @@
+import imaplib
+import logging
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from agents import agent_services, mailbox, outbox
+from agents.imap_pool import IMAPConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Holds an IMAP IDLE session on the inbox and ingests invoice attachments as soon as "
+        "mail arrives. Resumes from the mailbox checkpoint after a dropped connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-timeout', type=int, default=600,
+                            help="Seconds before IDLE is re-issued (servers drop IDLE after ~30 minutes).")
+        parser.add_argument('--poll-interval', type=int, default=60,
+                            help="Seconds between checks when the server does not support IDLE.")
+        parser.add_argument('--max-backoff', type=int, default=300,
+                            help="Upper bound in seconds for the reconnect and lock-retry backoff.")
+        parser.add_argument('--lock-retry', type=int, default=5,
+                            help="Seconds before retrying a scan skipped because another scan held the "
+                                 "mailbox lease; doubles on each retry.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        pool = IMAPConnectionPool.from_settings(max_size=1, health_check_after=0)
+        # Rows left pending by an earlier run are sent even if no new mail arrives.
+        outbox.start_flusher()
+        backoff = 1
+        self.stdout.write("Watching inbox for new invoices...")
+        try:
+            while not self.stopping:
+                try:
+                    with pool.connection() as mail:
+                        backoff = 1
+                        self._watch(mail, options)
+                except (imaplib.IMAP4.error, OSError) as e:
+                    logger.warning(f"Inbox watcher lost its connection, retrying in {backoff}s: {e}")
+                    self._sleep(backoff)
+                    backoff = min(backoff * 2, options['max_backoff'])
+        finally:
+            pool.close()
+        self.stdout.write("Inbox watcher stopped.")
+
+    def _watch(self, mail, options):
+        # Catch up on anything that arrived while we were disconnected.
+        self._ingest(mail, options)
+        while not self.stopping:
+            if mailbox.supports_idle(mail):
+                events = mailbox.idle_wait(mail, options['idle_timeout'], should_stop=lambda: self.stopping)
+                if self.stopping:
+                    break
+                if not mailbox.has_new_mail(events):
+                    # Scan anyway: a missed EXISTS must not leave mail waiting for the next one.
+                    logger.debug("IDLE timed out without new mail; running a catch-up scan.")
+            else:
+                self._sleep(options['poll_interval'])
+                mail.noop()
+            self._ingest(mail, options)
+
+    def _ingest(self, mail, options):
+        delay = options['lock_retry']
+        summary = agent_services.ingest_new_messages(mail, agent_services.new_scan_summary())
+        while summary["skipped_locked"] and not self.stopping:
+            # Another scan holds the mailbox lease; retry rather than wait for the next mail.
+            logger.info(f"Another scan of the inbox is running; retrying in {delay}s.")
+            self._sleep(delay)
+            delay = min(delay * 2, options['max_backoff'])
+            mail.noop()
+            summary = agent_services.ingest_new_messages(mail, agent_services.new_scan_summary())
+        if summary["processed_emails"] or summary["errors"]:
+            self.stdout.write(
+                f"Scanned {summary['processed_emails']} message(s), uploaded "
+                f"{summary['processed_attachments']} attachment(s), {summary['skipped_emails']} message(s) "
+                f"skipped, {summary['errors']} error(s)."
+            )
+
+    def _sleep(self, seconds):
+        deadline = time.monotonic() + seconds
+        while not self.stopping and time.monotonic() < deadline:
+            time.sleep(min(1, deadline - time.monotonic()))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,187 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_METRICS = {
+    # When set, /metrics and /lookup-cache/stats/ require "Authorization: Bearer <TOKEN>".
+    "TOKEN": None,
+}
+
+# Seconds; covers sub-millisecond cache hits up to multi-minute agent runs.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# stage -> upstream it waits on; errors are counted per upstream.
+STAGES = {
+    "imap_connect": "imap",
+    "imap_search": "imap",
+    "imap_fetch": "imap",
+    "mime_parse": "local",
+    "object_upload": "object_storage",
+    "apex_insert": "apex",
+    "peoplesoft_call": "peoplesoft",
+    "agent_setup": "genai_agent",
+    "agent_session_create": "genai_agent",
+    "agent_run": "genai_agent",
+}
+
+
+def metrics_config():
+    config = dict(DEFAULT_METRICS)
+    config.update(getattr(settings, "METRICS", {}))
+    return config
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines += [line for key, value in items for line in self._sample_lines(key, value)]
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _sample_lines(self, key, value):
+        yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _sample_lines(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', le)])} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+        yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    """
+    Metrics of this process, rendered in the Prometheus text format. Each server worker
+    process keeps its own; scrape every worker (or run one per scrape target).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "oci_agents_stage_seconds", "Time spent in each stage of ingest, lookups and agent runs.", ["stage"]))
+stage_errors = registry.register(Counter(
+    "oci_agents_stage_errors_total", "Failed stage operations by upstream.", ["stage", "upstream"]))
+stage_bytes = registry.register(Counter(
+    "oci_agents_stage_bytes_total", "Bytes fetched from IMAP or uploaded to Object Storage.", ["stage"]))
+attachments = registry.register(Counter(
+    "oci_agents_attachments_total", "Invoice attachments by outcome.", ["outcome"]))
+agent_runs = registry.register(Counter(
+    "oci_agents_agent_runs_total", "Agent runs by agent and outcome.", ["agent", "outcome"]))
+request_seconds = registry.register(Histogram(
+    "oci_agents_http_request_seconds", "Time to a response for each view (to the first byte for streams).",
+    ["view", "method"]))
+requests_total = registry.register(Counter(
+    "oci_agents_http_requests_total", "Responses by view, method and status code.", ["view", "method", "status"]))
+requests_in_progress = registry.register(Gauge(
+    "oci_agents_http_requests_in_progress", "Requests being handled by this process."))
+executor_pending = registry.register(Gauge(
+    "oci_agents_executor_pending", "Blocking agent calls running or queued on the agent executor."))
+executor_rejected = registry.register(Counter(
+    "oci_agents_executor_rejected_total", "Agent calls turned away because the executor was full."))
+
+
+def observe(stage, seconds):
+    stage_seconds.observe(seconds, stage=stage)
+
+
+def record_error(stage):
+    stage_errors.inc(stage=stage, upstream=STAGES.get(stage, "other"))
+
+
+def add_bytes(stage, count):
+    if count:
+        stage_bytes.inc(count, stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    """Records the block's duration under `stage`, and an error for `stage` if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_error(stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started)
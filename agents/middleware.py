@@ -0,0 +1,50 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Times every request into agents.metrics, labelled with the URL name of the view that
+    handled it. Streaming responses are timed to the first byte, not to the end of the stream.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.requests_in_progress.dec()
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.requests_in_progress.dec()
+        self._observe(request, response, started)
+        return response
+
+    def _start(self):
+        metrics.requests_in_progress.inc()
+        return time.perf_counter()
+
+    def _observe(self, request, response, started):
+        match = request.resolver_match
+        view = (match.view_name if match else None) or "unmatched"
+        metrics.request_seconds.observe(time.perf_counter() - started, view=view, method=request.method)
+        metrics.requests_total.inc(view=view, method=request.method, status=response.status_code)
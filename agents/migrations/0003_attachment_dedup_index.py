@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0002_mailboxcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('object_name', models.CharField(max_length=1024)),
+                ('bucket', models.CharField(blank=True, max_length=255)),
+                ('email_uid', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['object_name'], name='agents_atta_object__7bf588_idx')],
+                'constraints': [models.UniqueConstraint(fields=('sha256', 'size'), name='unique_attachment_content')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DuplicateAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_uid', models.CharField(max_length=64)),
+                ('filename', models.CharField(max_length=1024)),
+                ('from_email', models.CharField(blank=True, max_length=1024)),
+                ('subject', models.CharField(blank=True, max_length=1024)),
+                ('seen_at', models.DateTimeField(auto_now_add=True)),
+                ('original', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicates', to='agents.attachmentdigest')),
+            ],
+        ),
+    ]
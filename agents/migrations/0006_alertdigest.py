@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0005_agentjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mailbox', models.CharField(max_length=255)),
+                ('day', models.DateField()),
+                ('uid_validity', models.BigIntegerField()),
+                ('last_uid', models.BigIntegerField(default=0)),
+                ('total_emails', models.PositiveIntegerField(default=0)),
+                ('alerts', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('mailbox', 'day'), name='unique_alert_digest_day')],
+            },
+        ),
+    ]
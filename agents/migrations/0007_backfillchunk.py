@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0006_alertdigest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run', models.CharField(max_length=255)),
+                ('uid_validity', models.BigIntegerField()),
+                ('first_uid', models.BigIntegerField()),
+                ('last_uid', models.BigIntegerField()),
+                ('done_uid', models.BigIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run', 'status'], name='agents_back_run_6588fc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('run', 'first_uid'), name='unique_backfill_chunk')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0007_backfillchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailboxcheckpoint',
+            name='locked_by',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='mailboxcheckpoint',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
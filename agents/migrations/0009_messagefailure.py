@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0008_mailboxcheckpoint_lock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageFailure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mailbox', models.CharField(max_length=255)),
+                ('uid_validity', models.BigIntegerField()),
+                ('uid', models.BigIntegerField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('skipped', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('mailbox', 'uid_validity', 'uid'), name='unique_message_failure')],
+            },
+        ),
+    ]
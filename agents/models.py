@@ -1,4 +1,7 @@
-from django.db import models
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
 from django.contrib.auth.models import BaseUserManager,AbstractBaseUser,PermissionsMixin
 import uuid
 
@@ -42,4 +45,298 @@ class AgentsApp(models.Model):
     url_name = models.CharField(max_length=100)
     type = models.CharField(max_length=100)
     category = models.CharField(max_length=100)
-    status = models.CharField(max_length=100)
\ No newline at end of file
+    status = models.CharField(max_length=100)
+
+class MailboxCheckpoint(models.Model):
+    """
+    Highest IMAP UID fully ingested from a mailbox, valid only while the
+    server keeps the same UIDVALIDITY for it.
+    """
+    mailbox = models.CharField(max_length=255, unique=True)
+    uid_validity = models.BigIntegerField()
+    last_uid = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Scan lease: only its holder scans the mailbox and advances the checkpoint.
+    locked_by = models.CharField(max_length=255, blank=True, default="")
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def load(cls, mailbox, uid_validity):
+        """Returns the checkpoint for `mailbox`, or None when there is none or UIDVALIDITY changed."""
+        checkpoint = cls.objects.filter(mailbox=mailbox).first()
+        if checkpoint is None or checkpoint.uid_validity != uid_validity:
+            return None
+        return checkpoint
+
+    @classmethod
+    def reset(cls, mailbox, uid_validity, last_uid=0):
+        checkpoint, _ = cls.objects.update_or_create(
+            mailbox=mailbox, defaults={"uid_validity": uid_validity, "last_uid": last_uid}
+        )
+        return checkpoint
+
+    @classmethod
+    def try_lock(cls, mailbox, owner, lease_seconds):
+        """
+        Takes the scan lease on `mailbox` for `owner` unless someone else holds one that
+        has not expired. Returns True when `owner` now holds it. A mailbox without a row
+        gets a placeholder (UIDVALIDITY 0, which no server uses) that load() ignores.
+        """
+        now = timezone.now()
+        cls.objects.get_or_create(mailbox=mailbox, defaults={"uid_validity": 0})
+        free = Q(locked_until__isnull=True) | Q(locked_until__lt=now) | Q(locked_by=owner)
+        return cls.objects.filter(free, mailbox=mailbox).update(
+            locked_by=owner, locked_until=now + timedelta(seconds=lease_seconds)
+        ) == 1
+
+    @classmethod
+    def unlock(cls, mailbox, owner):
+        cls.objects.filter(mailbox=mailbox, locked_by=owner).update(locked_by="", locked_until=None)
+
+    def advance(self, uid):
+        uid = int(uid)
+        if uid > self.last_uid:
+            self.last_uid = uid
+            # Conditional, so a slower concurrent run can never move the checkpoint backwards.
+            type(self).objects.filter(pk=self.pk, last_uid__lt=uid).update(last_uid=uid, updated_at=timezone.now())
+
+    def __str__(self):
+        return f"{self.mailbox} (UIDVALIDITY {self.uid_validity}) @ {self.last_uid}"
+
+
+class MessageFailure(models.Model):
+    """
+    Failed ingest attempts at one message. Once `attempts` reaches the scan's limit the
+    message is marked `skipped` and the checkpoint moves past it, so a message that can
+    never be fetched or stored does not block the mailbox; `last_error` says why.
+    """
+    mailbox = models.CharField(max_length=255)
+    uid_validity = models.BigIntegerField()
+    uid = models.BigIntegerField()
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    skipped = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["mailbox", "uid_validity", "uid"], name="unique_message_failure"),
+        ]
+
+    @classmethod
+    def record(cls, mailbox, uid_validity, uid, error, max_attempts):
+        """Counts one failed attempt at `uid`; the returned row is `skipped` from the max_attempts-th on."""
+        with transaction.atomic():
+            cls.objects.get_or_create(mailbox=mailbox, uid_validity=uid_validity, uid=int(uid))
+            failure = cls.objects.select_for_update().get(mailbox=mailbox, uid_validity=uid_validity, uid=int(uid))
+            failure.attempts += 1
+            failure.last_error = str(error)
+            failure.skipped = failure.attempts >= max_attempts
+            failure.save()
+        return failure
+
+    def __str__(self):
+        state = "skipped" if self.skipped else f"{self.attempts} failed attempt(s)"
+        return f"{self.mailbox} (UIDVALIDITY {self.uid_validity}) UID {self.uid}: {state}"
+
+
+class AttachmentDigest(models.Model):
+    """Content-addressed index of attachments already stored in Object Storage."""
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    object_name = models.CharField(max_length=1024)
+    bucket = models.CharField(max_length=255, blank=True)
+    email_uid = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["sha256", "size"], name="unique_attachment_content"),
+        ]
+        indexes = [models.Index(fields=["object_name"])]
+
+    def __str__(self):
+        return f"{self.object_name} ({self.sha256[:12]}…, {self.size} bytes)"
+
+
+class DuplicateAttachment(models.Model):
+    """An attachment that was not re-uploaded because its content was already indexed."""
+    original = models.ForeignKey(AttachmentDigest, on_delete=models.CASCADE, related_name="duplicates")
+    email_uid = models.CharField(max_length=64)
+    filename = models.CharField(max_length=1024)
+    from_email = models.CharField(max_length=1024, blank=True)
+    subject = models.CharField(max_length=1024, blank=True)
+    seen_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"UID {self.email_uid} '{self.filename}' -> {self.original.object_name}"
+
+
+class EmailDetailOutbox(models.Model):
+    """
+    Write-behind queue of EmailData payloads for APEX_API_URL_EMAIL. Rows are written
+    during the mailbox scan and drained by agents.outbox in batches.
+    """
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    DEAD = "dead"
+    STATUS_CHOICES = [(PENDING, "Pending"), (SENDING, "Sending"), (SENT, "Sent"), (DEAD, "Dead letter")]
+
+    payload = models.JSONField()
+    l_uid = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"Outbox #{self.pk} UID {self.l_uid} [{self.status}]"
+
+
+class AgentJob(models.Model):
+    """
+    An agent run queued from a view and executed by a job worker (agents.jobs).
+    `progress` holds the counters reported while it runs; `result` the run's return value.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (SUCCEEDED, "Succeeded"), (FAILED, "Failed")]
+
+    kind = models.CharField(max_length=32)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=128, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    @property
+    def done(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def as_dict(self):
+        return {
+            "id": self.pk,
+            "kind": self.kind,
+            "status": self.status,
+            "done": self.done,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.kind} [{self.status}]"
+
+
+class AlertDigest(models.Model):
+    """
+    Alert messages already classified for one mailbox and day. Each alert summary run
+    only classifies messages above `last_uid` and merges them in, so it no longer
+    re-scans everything since midnight. Valid only while UIDVALIDITY is unchanged.
+    """
+    mailbox = models.CharField(max_length=255)
+    day = models.DateField()
+    uid_validity = models.BigIntegerField()
+    last_uid = models.BigIntegerField(default=0)
+    total_emails = models.PositiveIntegerField(default=0)
+    alerts = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["mailbox", "day"], name="unique_alert_digest_day"),
+        ]
+
+    @classmethod
+    def load(cls, mailbox, day, uid_validity):
+        """Returns the digest for `mailbox` on `day`, starting a fresh one when there is none or UIDVALIDITY changed."""
+        digest, created = cls.objects.get_or_create(mailbox=mailbox, day=day, defaults={"uid_validity": uid_validity})
+        if not created and digest.uid_validity != uid_validity:
+            digest.uid_validity = uid_validity
+            digest.last_uid = 0
+            digest.total_emails = 0
+            digest.alerts = []
+            digest.save()
+        return digest
+
+    def merge(self, uids, alerts):
+        """
+        Adds newly seen message UIDs and the alerts found among them. UIDs at or below
+        `last_uid` (merged meanwhile by a concurrent run) are ignored.
+        """
+        with transaction.atomic():
+            current = type(self).objects.select_for_update().get(pk=self.pk)
+            new_uids = [int(uid) for uid in uids if int(uid) > current.last_uid]
+            if new_uids and current.uid_validity == self.uid_validity:
+                current.alerts = current.alerts + [a for a in alerts if int(a["uid"]) > current.last_uid]
+                current.total_emails += len(new_uids)
+                current.last_uid = max(new_uids)
+                current.save(update_fields=["alerts", "total_emails", "last_uid", "updated_at"])
+        self.alerts, self.total_emails, self.last_uid = current.alerts, current.total_emails, current.last_uid
+
+    @classmethod
+    def prune(cls, mailbox, keep_from):
+        """Deletes this mailbox's digests for days before `keep_from`."""
+        return cls.objects.filter(mailbox=mailbox, day__lt=keep_from).delete()[0]
+
+    def __str__(self):
+        return f"{self.mailbox} {self.day} @ {self.last_uid}: {len(self.alerts)} alert(s) of {self.total_emails}"
+
+
+class BackfillChunk(models.Model):
+    """
+    One UID range of a backfill_invoices run (agents.backfill). `done_uid` is the last
+    message in the range fully ingested, so an interrupted chunk resumes after it.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    run = models.CharField(max_length=255)
+    uid_validity = models.BigIntegerField()
+    first_uid = models.BigIntegerField()
+    last_uid = models.BigIntegerField()
+    done_uid = models.BigIntegerField(default=0)
+    messages = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["run", "first_uid"], name="unique_backfill_chunk"),
+        ]
+        indexes = [models.Index(fields=["run", "status"])]
+
+    def advance(self, uid):
+        uid = int(uid)
+        if uid > self.done_uid:
+            self.done_uid = uid
+            # Only the progress column; status is owned by the worker running the chunk.
+            type(self).objects.filter(pk=self.pk, done_uid__lt=uid).update(done_uid=uid)
+
+    def __str__(self):
+        return f"{self.run} UID {self.first_uid}-{self.last_uid} @ {self.done_uid} [{self.status}]"
@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+
+import oci
+from django.conf import settings
+
+from . import config_STAGE as l_env
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_config = None
+_object_storage = None
+_namespace = None
+
+
+def get_oci_config():
+    """The OCI SDK config from l_env.OCI_CONFIG, read on first use."""
+    global _config
+    if _config is None:
+        with _lock:
+            if _config is None:
+                _config = oci.config.from_file(l_env.OCI_CONFIG)
+    return _config
+
+
+def new_object_storage_client():
+    """A fresh ObjectStorageClient, for callers that keep one per thread."""
+    return oci.object_storage.ObjectStorageClient(get_oci_config())
+
+
+def get_object_storage_client():
+    """The process-wide ObjectStorageClient, built on first use."""
+    global _object_storage
+    if _object_storage is None:
+        client = new_object_storage_client()
+        with _lock:
+            if _object_storage is None:
+                _object_storage = client
+    return _object_storage
+
+
+def get_namespace():
+    """
+    The tenancy's Object Storage namespace. The first call makes the GetNamespace request;
+    a failure is not cached, so the next call retries.
+    """
+    global _namespace
+    if _namespace is None:
+        started = time.monotonic()
+        namespace = get_object_storage_client().get_namespace().data
+        with _lock:
+            if _namespace is None:
+                _namespace = namespace
+                logger.info(f"Resolved Object Storage namespace in {time.monotonic() - started:.2f}s.")
+    return _namespace
+
+
+def warm_up():
+    """Resolves the config, client and namespace and builds the registered agents now."""
+    # Imported here: agent_services registers the agents and itself imports this module.
+    from . import agent_services
+
+    started = time.monotonic()
+    try:
+        get_namespace()
+        agent_services.agent_registry.warm()
+        logger.info(f"OCI warm-up finished in {time.monotonic() - started:.2f}s.")
+    except Exception as e:
+        # Requests will connect on first use instead.
+        logger.warning(f"OCI warm-up failed: {e}")
+
+
+def start_warm_up():
+    """Runs warm_up() on a daemon thread when settings.OCI_WARM_UP is on, so boot never waits on it."""
+    if not getattr(settings, "OCI_WARM_UP", False):
+        return None
+    thread = threading.Thread(target=warm_up, name="oci-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,221 @@
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import config_STAGE as l_env
+from . import http_client
+from .models import EmailDetailOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX = {
+    "ENABLED": True,
+    "BATCH_SIZE": 50,
+    "FLUSH_INTERVAL": 2,      # seconds between polls when idle
+    "MAX_ATTEMPTS": 8,        # then the row is dead-lettered
+    "BACKOFF": 5,             # seconds, doubled per attempt with jitter
+    "MAX_BACKOFF": 600,
+    "LEASE_SECONDS": None,    # a row stuck in "sending" this long is retried; None derives it (lease_seconds)
+    "HIGH_WATERMARK": 5000,   # enqueue() waits while more rows than this are pending
+    "BACKPRESSURE_WAIT": 30,  # longest enqueue() waits for the backlog to drain
+}
+
+
+def outbox_config():
+    config = dict(DEFAULT_OUTBOX)
+    config.update(getattr(settings, "APEX_OUTBOX", {}))
+    return config
+
+
+def is_enabled():
+    return outbox_config()["ENABLED"]
+
+
+def lease_seconds(config=None):
+    """
+    How long a claimed batch stays in "sending" before another flusher may retry it.
+    Unless LEASE_SECONDS is set, it covers the slowest possible batch: BATCH_SIZE rows
+    POSTed one by one, each timing out on connect and read on every retry of the "apex"
+    upstream, so a live flusher never has its rows claimed and sent a second time.
+    """
+    config = config or outbox_config()
+    if config["LEASE_SECONDS"]:
+        return config["LEASE_SECONDS"]
+    upstream = http_client.upstream_config("apex")
+    per_request = (upstream["CONNECT_TIMEOUT"] + upstream["READ_TIMEOUT"]) * (upstream["RETRIES"] + 1)
+    return config["BATCH_SIZE"] * per_request + 60
+
+
+def enqueue(payload, l_uid=""):
+    """Stores one APEX email-detail payload for the background flusher."""
+    row = EmailDetailOutbox.objects.create(payload=payload, l_uid=str(l_uid))
+    transaction.on_commit(wake_flusher)
+    return row
+
+
+def wait_for_capacity():
+    """
+    Backpressure for producers: blocks while the pending backlog is above HIGH_WATERMARK,
+    for at most BACKPRESSURE_WAIT seconds. Returns False if the backlog is still too large.
+    """
+    config = outbox_config()
+    deadline = time.monotonic() + config["BACKPRESSURE_WAIT"]
+    while EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.PENDING).count() > config["HIGH_WATERMARK"]:
+        if time.monotonic() >= deadline:
+            logger.warning("APEX outbox backlog is above its high watermark; continuing anyway.")
+            return False
+        wake_flusher()
+        time.sleep(1)
+    return True
+
+
+def _claim(batch_size, lease_seconds):
+    """Atomically moves up to batch_size due rows to "sending" so only one flusher sends them."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=lease_seconds)
+    with transaction.atomic():
+        EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.SENDING, claimed_at__lt=stale).update(
+            status=EmailDetailOutbox.PENDING
+        )
+        ids = list(
+            EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.PENDING, next_attempt_at__lte=now)
+            .order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        EmailDetailOutbox.objects.filter(id__in=ids, status=EmailDetailOutbox.PENDING).update(
+            status=EmailDetailOutbox.SENDING, claimed_at=now
+        )
+    return list(EmailDetailOutbox.objects.filter(id__in=ids, status=EmailDetailOutbox.SENDING, claimed_at=now).order_by("id"))
+
+
+def _mark_sent(rows):
+    EmailDetailOutbox.objects.filter(id__in=[row.id for row in rows], status=EmailDetailOutbox.SENDING).update(
+        status=EmailDetailOutbox.SENT, sent_at=timezone.now(), claimed_at=None
+    )
+
+
+def _post_rows(rows):
+    """
+    Sends rows to ORDS, as one batched request when a batch endpoint is configured,
+    otherwise one by one, marking each row sent as soon as its own POST succeeds.
+    Returns failed rows with errors.
+    """
+    batch_url = getattr(l_env, "APEX_API_URL_EMAIL_BATCH", None)
+    if batch_url and len(rows) > 1:
+        try:
+            response = http_client.post("apex", batch_url, json=[row.payload for row in rows])
+            response.raise_for_status()
+            return []
+        except requests.exceptions.RequestException as e:
+            return [(row, str(e)) for row in rows]
+
+    failed = []
+    for row in rows:
+        try:
+            response = http_client.post("apex", l_env.APEX_API_URL_EMAIL, json=row.payload)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            failed.append((row, str(e)))
+        else:
+            _mark_sent([row])
+    return failed
+
+
+def flush_once(batch_size=None):
+    """Sends one batch of due rows. Returns (sent, failed) counts."""
+    config = outbox_config()
+    rows = _claim(batch_size or config["BATCH_SIZE"], lease_seconds(config))
+    if not rows:
+        return 0, 0
+
+    failed = _post_rows(rows)
+    failed_ids = {row.id for row, _ in failed}
+    _mark_sent([row for row in rows if row.id not in failed_ids])
+    now = timezone.now()
+    for row, error in failed:
+        row.attempts += 1
+        row.last_error = error[:2000]
+        row.claimed_at = None
+        if row.attempts >= config["MAX_ATTEMPTS"]:
+            row.status = EmailDetailOutbox.DEAD
+            logger.error(f"Dead-lettered APEX insert for UID {row.l_uid} after {row.attempts} attempts: {error}")
+        else:
+            delay = min(config["BACKOFF"] * (2 ** (row.attempts - 1)), config["MAX_BACKOFF"]) * (0.5 + random.random())
+            row.status = EmailDetailOutbox.PENDING
+            row.next_attempt_at = now + timedelta(seconds=delay)
+            logger.warning(f"APEX insert for UID {row.l_uid} failed (attempt {row.attempts}), retrying in {delay:.0f}s: {error}")
+        row.save(update_fields=["attempts", "last_error", "claimed_at", "status", "next_attempt_at"])
+    sent = len(rows) - len(failed)
+    if sent:
+        logger.info(f"Flushed {sent} APEX email-detail row(s) from the outbox.")
+    return sent, len(failed)
+
+
+def flush_until_empty(batch_size=None):
+    """Drains every due row; stops early when a whole batch fails so a down endpoint is not hammered."""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = flush_once(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if not sent:
+            return total_sent, total_failed
+
+
+class OutboxFlusher(threading.Thread):
+    """Daemon thread that drains the outbox while the process runs."""
+
+    def __init__(self):
+        super().__init__(name="apex-outbox-flusher", daemon=True)
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                close_old_connections()
+                flush_until_empty()
+            except Exception:
+                logger.exception("APEX outbox flush failed")
+            _flusher_wakeup.wait(outbox_config()["FLUSH_INTERVAL"])
+            _flusher_wakeup.clear()
+        close_old_connections()
+
+    def stop(self):
+        self.stopping.set()
+        _flusher_wakeup.set()
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+_flusher_wakeup = threading.Event()
+
+
+def wake_flusher():
+    ensure_flusher_started()
+    _flusher_wakeup.set()
+
+
+def start_flusher():
+    """
+    Starts the flusher at process boot when the outbox is enabled, so rows left pending
+    by a previous process are sent without waiting for the next enqueue.
+    """
+    if not is_enabled():
+        return None
+    return ensure_flusher_started()
+
+
+def ensure_flusher_started():
+    global _flusher
+    if _flusher is None or not _flusher.is_alive():
+        with _flusher_lock:
+            if _flusher is None or not _flusher.is_alive():
+                _flusher = OutboxFlusher()
+                _flusher.start()
+    return _flusher
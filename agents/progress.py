@@ -0,0 +1,33 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+@contextmanager
+def listening(callback):
+    """
+    Sends progress events reported on this thread to callback(stage, data) for the
+    duration of the block. Agent tools run on the thread that called Agent.run, so a
+    listener installed around a run sees the tools' events.
+    """
+    previous = getattr(_local, "callback", None)
+    _local.callback = callback
+    try:
+        yield
+    finally:
+        _local.callback = previous
+
+
+def report(stage, **data):
+    """Reports a progress event to the current thread's listener, if any. Never raises."""
+    callback = getattr(_local, "callback", None)
+    if callback is None:
+        return
+    try:
+        callback(stage, data)
+    except Exception:
+        logger.exception(f"Progress listener failed on '{stage}'")
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import progress
+from .executor import ExecutorBusy, run_blocking
+from .models import AgentJob
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15
+# Tool output can be large (e.g. a full PO header); events carry a preview.
+MAX_EVENT_TEXT = 2000
+
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event with a JSON payload."""
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def _preview(data):
+    return {
+        key: value[:MAX_EVENT_TEXT] if isinstance(value, str) else value
+        for key, value in data.items()
+    }
+
+
+async def stream_call(fn, *args):
+    """
+    Runs fn(*args) on the agent executor and yields SSE messages: one per progress event
+    the call reports, then `result` with its return value and `done`. Comment lines keep
+    idle connections open through proxies while the call is quiet.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def push(stage, data):
+        loop.call_soon_threadsafe(events.put_nowait, (stage, _preview(data)))
+
+    def call():
+        with progress.listening(push):
+            return fn(*args)
+
+    yield sse_event("started", {})
+    task = asyncio.ensure_future(run_blocking(call))
+    try:
+        while True:
+            getter = asyncio.ensure_future(events.get())
+            finished, _ = await asyncio.wait({getter, task}, timeout=KEEPALIVE_SECONDS,
+                                             return_when=asyncio.FIRST_COMPLETED)
+            if getter in finished:
+                stage, data = getter.result()
+                yield sse_event(stage, data)
+                continue
+            if not getter.cancel() and not getter.cancelled():
+                # Completed between the wait and the cancel; keep the event.
+                stage, data = getter.result()
+                yield sse_event(stage, data)
+            if task in finished:
+                break
+            yield ": keepalive\n\n"
+
+        # Events pushed just before the call returned.
+        while not events.empty():
+            stage, data = events.get_nowait()
+            yield sse_event(stage, data)
+        try:
+            result = task.result()
+        except ExecutorBusy as e:
+            result = {"status": "error", "message": str(e)}
+        except Exception as e:
+            logger.exception("Streamed agent call failed")
+            result = {"status": "error", "message": str(e)}
+        yield sse_event("result", result)
+        yield sse_event("done", {})
+    finally:
+        # The client went away; the run itself finishes on its worker thread.
+        if not task.done():
+            logger.info("SSE client disconnected before the agent run finished")
+
+
+async def stream_job(job_id, interval=0.5):
+    """Yields SSE messages as a queued AgentJob's progress changes, until it finishes."""
+    get_job = sync_to_async(lambda: AgentJob.objects.filter(pk=job_id).first())
+    last_status = last_progress = None
+    idle = 0.0
+    while True:
+        job = await get_job()
+        if job is None:
+            yield sse_event("error", {"message": f"Job {job_id} not found."})
+            return
+        if job.status != last_status:
+            last_status = job.status
+            yield sse_event("status", {"status": job.status})
+        if job.progress != last_progress:
+            last_progress = job.progress
+            idle = 0.0
+            yield sse_event("progress", job.progress)
+        if job.done:
+            yield sse_event("result", job.as_dict())
+            yield sse_event("done", {})
+            return
+        await asyncio.sleep(interval)
+        idle += interval
+        if idle >= KEEPALIVE_SECONDS:
+            idle = 0.0
+            yield ": keepalive\n\n"
@@ -1,3 +1,915 @@
-from django.test import TestCase
+import asyncio
+import base64
+import imaplib
+import quopri
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+import oci
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from benchmarks.offline import stubs
+from benchmarks.offline.corpus import Corpus
+from benchmarks.offline.imap_server import IMAPServer
+
+from . import (agent_registry, agent_services, alert_rules, backfill, bulk_lookup, cache, config_STAGE, executor, fast_path,
+               jobs, mailbox, metrics, mime_pipeline, oci_clients, outbox, uploads, views)
+from .management.commands import watch_inbox
+from .middleware import RequestMetricsMiddleware
+from .models import AgentJob, AlertDigest, BackfillChunk, EmailDetailOutbox, MailboxCheckpoint, MessageFailure
+
+
+ATTACHMENT_STRUCTURE = (
+    b'(("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 12 1 NIL NIL NIL)'
+    b'("APPLICATION" "PDF" ("NAME" "invoice.pdf") NIL NIL "BASE64" 8 NIL ("ATTACHMENT" ("FILENAME" "invoice.pdf")) NIL NIL)'
+    b'("MESSAGE" "RFC822" NIL NIL NIL "7BIT" 300 ("Mon, 1 Jan 2024 00:00:00 +0000" "Fwd" NIL NIL NIL NIL NIL NIL NIL NIL)'
+    b' (("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 5 1 NIL NIL NIL)'
+    b'("APPLICATION" "OCTET-STREAM" NIL NIL NIL "BASE64" 4 NIL ("ATTACHMENT" ("FILENAME*" "utf-8\'\'r%C3%A9sum%C3%A9.bin")) NIL NIL)'
+    b' "MIXED" NIL NIL NIL) 10 NIL NIL NIL NIL)'
+    b' "MIXED" ("BOUNDARY" "b1") NIL NIL NIL)'
+)
+
+
+class FakeMail:
+    """
+    Answers the imaplib calls agents.mailbox makes with canned data: UID SEARCH returns
+    `search`, STATUS reports `uid_next`, and UID FETCH of BODY[n] sections serves
+    `sections` (partial <offset.length> fetches included), preceded by `unsolicited`
+    untagged responses as a server may send them at any time.
+    """
+
+    def __init__(self, validity=7, search=(), uid_next=1, sections=None, uid='42', unsolicited=()):
+        self.validity = validity
+        self.search = [str(u) for u in search]
+        self.uid_next = uid_next
+        self.sections = sections or {}
+        self.message_uid = uid
+        self.unsolicited = list(unsolicited)
+        self.commands = []
+
+    def response(self, code):
+        return code, [str(self.validity).encode()]
+
+    def status(self, name, items):
+        return 'OK', [f'{name} (UIDNEXT {self.uid_next} UIDVALIDITY {self.validity})'.encode()]
+
+    def uid(self, command, *args):
+        self.commands.append((command,) + args)
+        if command == 'SEARCH':
+            return 'OK', [' '.join(self.search).encode()]
+        if command == 'FETCH':
+            return 'OK', self.unsolicited + self._fetch(args[1])
+        return 'OK', [None]
+
+    def _fetch(self, query):
+        items = [f'UID {self.message_uid}'.encode()]
+        literals = []
+        for match in re.finditer(r'BODY\.PEEK\[([^\]]*)\](?:<(\d+)\.(\d+)>)?', query):
+            section, offset, length = match.groups()
+            if section.startswith('HEADER.FIELDS'):
+                data, name = b'From: a@example.com\r\nSubject: Invoice\r\n\r\n', f'BODY[{section}]'
+            elif section in self.sections:
+                data, name = self.sections[section], f'BODY[{section}]'
+            else:
+                continue
+            if offset is not None:
+                data = data[int(offset):int(offset) + int(length)]
+                name += f'<{offset}>'
+            literals.append((name.encode(), data))
+        if not literals:
+            return [b'1 (' + b' '.join(items) + b')']
+        response = []
+        prefix = b'1 (' + b' '.join(items)
+        for name, data in literals:
+            response.append((prefix + b' ' + name + b' {%d}' % len(data), data))
+            prefix = b''
+        response.append(b')')
+        return response
+
+
+class BodyStructureTests(TestCase):
+    def test_walker_numbers_nested_sections_and_finds_attachments(self):
+        [(_, attributes)] = mailbox.parse_fetch_response([b'3 (UID 9 BODYSTRUCTURE ' + ATTACHMENT_STRUCTURE + b')'])
+        self.assertEqual(str(attributes['UID']), '9')
+        parts = list(mailbox.walk_bodystructure(attributes['BODYSTRUCTURE']))
+        self.assertEqual([p.section for p in parts], ['1', '2', '3', '3.1', '3.2'])
+        attachments = mailbox.attachment_parts(attributes['BODYSTRUCTURE'])
+        self.assertEqual([(p.section, p.filename, p.encoding, p.size) for p in attachments],
+                         [('2', 'invoice.pdf', 'base64', 8), ('3.2', 'résumé.bin', 'base64', 4)])
+        self.assertEqual(mailbox.first_text_part(attributes['BODYSTRUCTURE']).section, '1')
+
+    def test_single_part_message_is_section_1(self):
+        structure = mailbox.parse_fetch_response([b'1 (BODYSTRUCTURE ("TEXT" "PLAIN" NIL NIL NIL "7BIT" 3 1))'])[0][1]
+        self.assertEqual([p.section for p in mailbox.walk_bodystructure(structure['BODYSTRUCTURE'])], ['1'])
+
+    def test_parse_fetch_response_keeps_literals_as_bytes(self):
+        data = [(b'5 (UID 12 BODY[2] {5}', b'a)b(c'), b' FLAGS (\\Seen))']
+        [(seq, attributes)] = mailbox.parse_fetch_response(data)
+        self.assertEqual(seq, '5')
+        self.assertEqual(bytes(attributes['BODY[2]']), b'a)b(c')
+        self.assertEqual(attributes['FLAGS'], ['\\Seen'])
+
+
+class FetchSectionsTests(TestCase):
+    def test_picks_the_response_for_the_uid_over_an_unsolicited_fetch(self):
+        mail = FakeMail(sections={'2': b'QUJD'}, unsolicited=[b'7 (FLAGS (\\Seen))'])
+        headers, sections = mailbox.fetch_sections(mail, '42', ['2'], uid=True)
+        self.assertIn(b'Subject: Invoice', headers)
+        self.assertEqual(mailbox.decode_part_payload(sections['2'], 'base64'), b'ABC')
+
+    def test_unsolicited_fetch_alone_is_an_error(self):
+        mail = FakeMail(uid='41', sections={'2': b'QUJD'}, unsolicited=[b'7 (FLAGS (\\Seen))'])
+        with self.assertRaises(imaplib.IMAP4.error):
+            mailbox.fetch_sections(mail, '42', ['2'], uid=True)
+
+    def test_missing_section_is_an_error(self):
+        mail = FakeMail(sections={'2': b'QUJD'})
+        with self.assertRaises(imaplib.IMAP4.error):
+            mailbox.fetch_sections(mail, '42', ['2', '3'], uid=True)
+
+    def test_decode_part_payload_does_not_turn_none_into_empty_bytes(self):
+        with self.assertRaises(ValueError):
+            mailbox.decode_part_payload(None, 'base64')
+
+
+class StreamingTests(TestCase):
+    payload = bytes(range(256)) * 40
+
+    def test_base64_decoder_handles_any_chunk_boundary(self):
+        encoded = base64.encodebytes(self.payload)
+        for size in (1, 3, 7, 76, 77, 1000):
+            sink = BytesIO()
+            decoder = mailbox.StreamingDecoder('base64', sink)
+            for start in range(0, len(encoded), size):
+                decoder.write(encoded[start:start + size])
+            decoder.close()
+            self.assertEqual(sink.getvalue(), self.payload, f"chunk size {size}")
+
+    def test_quoted_printable_decoder_keeps_escapes_split_across_chunks(self):
+        text = ("Prix total: 100€ = cent euros, ligne très longue " * 20).encode()
+        encoded = quopri.encodestring(text)
+        sink = BytesIO()
+        decoder = mailbox.StreamingDecoder('quoted-printable', sink)
+        for start in range(0, len(encoded), 5):
+            decoder.write(encoded[start:start + 5])
+        decoder.close()
+        self.assertEqual(sink.getvalue(), text)
+
+    def test_stream_section_reassembles_chunks_for_the_uid(self):
+        encoded = base64.encodebytes(self.payload)
+        mail = FakeMail(sections={'2': encoded}, unsolicited=[b'7 (FLAGS ())'])
+        with mailbox.stream_section(mail, '42', '2', 'base64', len(encoded), chunk_size=1000) as f:
+            self.assertEqual(f.read(), self.payload)
+
+    def test_stream_section_keeps_a_section_that_differs_from_the_bodystructure_size(self):
+        encoded = base64.encodebytes(self.payload)
+        for stated in (len(encoded) + 100, len(encoded) - 100, 2000):
+            mail = FakeMail(sections={'2': encoded})
+            with self.assertLogs('agents.mailbox', 'WARNING'):
+                with mailbox.stream_section(mail, '42', '2', 'base64', stated, chunk_size=1000) as f:
+                    self.assertEqual(f.read(), self.payload, f"stated size {stated}")
+
+    def test_stream_section_asks_again_after_a_short_chunk_before_the_size(self):
+        encoded = base64.encodebytes(self.payload)
+        mail = FakeMail(sections={'2': encoded})
+        real_fetch = mail._fetch
+        # A server capping partial fetches at 600 bytes.
+        mail._fetch = lambda query: real_fetch(query.replace('.1000>', '.600>'))
+        with mailbox.stream_section(mail, '42', '2', 'base64', len(encoded), chunk_size=1000) as f:
+            self.assertEqual(f.read(), self.payload)
+
+    def test_stream_section_without_a_response_for_the_uid_is_an_error(self):
+        mail = FakeMail(uid='41', sections={'2': b'QUJD'}, unsolicited=[b'7 (FLAGS ())'])
+        with self.assertRaises(imaplib.IMAP4.error):
+            mailbox.stream_section(mail, '42', '2', 'base64', 4, chunk_size=2)
+
+
+class CheckpointTests(TestCase):
+    def test_bootstrap_starts_below_the_first_message_in_the_window(self):
+        checkpoint, uids = agent_services.find_new_messages(FakeMail(search=[9, 5, 12], uid_next=13))
+        self.assertEqual(uids, ['5', '9', '12'])
+        self.assertEqual(MailboxCheckpoint.objects.get(pk=checkpoint.pk).last_uid, 4)
+
+    def test_bootstrap_of_an_empty_window_starts_at_uidnext(self):
+        checkpoint, uids = agent_services.find_new_messages(FakeMail(search=[], uid_next=500))
+        self.assertEqual(uids, [])
+        self.assertEqual(MailboxCheckpoint.objects.get(pk=checkpoint.pk).last_uid, 499)
+
+    def test_valid_checkpoint_searches_after_its_uid(self):
+        MailboxCheckpoint.reset(agent_services.mailbox_key(), 7, last_uid=30)
+        mail = FakeMail(search=[30, 31, 33])
+        checkpoint, uids = agent_services.find_new_messages(mail)
+        self.assertEqual(uids, ['31', '33'])
+        self.assertEqual(mail.commands[0], ('SEARCH', 'UID 31:*'))
+
+    def test_uidvalidity_change_bootstraps_again(self):
+        MailboxCheckpoint.reset(agent_services.mailbox_key(), 6, last_uid=30)
+        checkpoint, _ = agent_services.find_new_messages(FakeMail(validity=7, search=[], uid_next=3))
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.uid_validity, checkpoint.last_uid), (7, 2))
+
+    def test_advance_never_moves_backwards(self):
+        checkpoint = MailboxCheckpoint.reset('box', 1, last_uid=5)
+        stale = MailboxCheckpoint.objects.get(pk=checkpoint.pk)
+        checkpoint.advance(9)
+        stale.advance(7)
+        self.assertEqual(MailboxCheckpoint.objects.get(pk=checkpoint.pk).last_uid, 9)
+
+    def test_scan_lease_is_exclusive_until_released_or_expired(self):
+        self.assertTrue(MailboxCheckpoint.try_lock('box', 'a', 60))
+        self.assertFalse(MailboxCheckpoint.try_lock('box', 'b', 60))
+        MailboxCheckpoint.unlock('box', 'a')
+        self.assertTrue(MailboxCheckpoint.try_lock('box', 'b', 60))
+        MailboxCheckpoint.objects.filter(mailbox='box').update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(MailboxCheckpoint.try_lock('box', 'a', 60))
+        # The placeholder row a lock creates is not a checkpoint.
+        self.assertIsNone(MailboxCheckpoint.load('box', 1))
+
+    def test_ingest_skips_while_another_scan_holds_the_lease(self):
+        MailboxCheckpoint.try_lock(agent_services.mailbox_key(), 'other-worker', 60)
+        mail = FakeMail(search=[1, 2])
+        summary = agent_services.ingest_new_messages(mail, agent_services.new_scan_summary())
+        self.assertTrue(summary['skipped_locked'])
+        self.assertEqual(mail.commands, [])
+
+
+class WatchInboxTests(TestCase):
+    options = {'idle_timeout': 600, 'poll_interval': 60, 'max_backoff': 300, 'lock_retry': 5}
+
+    def setUp(self):
+        self.command = watch_inbox.Command()
+        self.command.stopping = False
+        self.sleeps = []
+        self.command._sleep = self.sleeps.append
+
+    def summary(self, **values):
+        return dict(agent_services.new_scan_summary(), **values)
+
+    def test_scan_skipped_for_the_lease_is_retried_with_backoff(self):
+        summaries = [self.summary(skipped_locked=True), self.summary(skipped_locked=True), self.summary()]
+        with mock.patch.object(agent_services, 'ingest_new_messages', side_effect=summaries) as ingest:
+            self.command._ingest(mock.Mock(), self.options)
+        self.assertEqual(ingest.call_count, 3)
+        self.assertEqual(self.sleeps, [5, 10])
+
+    def test_idle_timeout_runs_a_catch_up_scan(self):
+        def ingest(mail, summary):
+            self.command.stopping = ingest_calls.call_count == 2
+            return summary
+
+        with mock.patch.object(mailbox, 'supports_idle', return_value=True), \
+                mock.patch.object(mailbox, 'idle_wait', return_value=[]), \
+                mock.patch.object(agent_services, 'ingest_new_messages', side_effect=ingest) as ingest_calls:
+            self.command._watch(mock.Mock(), self.options)
+        # Once on connect, once after IDLE timed out without EXISTS.
+        self.assertEqual(ingest_calls.call_count, 2)
+
+
+class UploadPipelineTests(TestCase):
+    def pipeline(self, client, **options):
+        pipeline = uploads.UploadPipeline(lambda: client, 'ns', 'bucket', max_workers=1, backoff=0, **options)
+        self.addCleanup(pipeline.shutdown)
+        return pipeline
+
+    def test_throttling_and_server_errors_are_retried_from_the_start_of_the_file(self):
+        client = mock.Mock()
+        bodies = []
+
+        def put_object(namespace, bucket, name, body, content_length):
+            bodies.append(body.read())
+            if len(bodies) < 3:
+                raise oci.exceptions.ServiceError(429 if len(bodies) == 1 else 503, 'Busy', {}, 'try again')
+
+        client.put_object.side_effect = put_object
+        result = self.pipeline(client).submit('1_invoice.pdf', BytesIO(b'%PDF')).result(5)
+        self.assertEqual(result, '1_invoice.pdf')
+        self.assertEqual(bodies, [b'%PDF'] * 3)
+
+    def test_client_errors_are_not_retried(self):
+        client = mock.Mock()
+        client.put_object.side_effect = oci.exceptions.ServiceError(404, 'BucketNotFound', {}, 'no bucket')
+        with self.assertRaises(oci.exceptions.ServiceError):
+            self.pipeline(client).submit('1_invoice.pdf', b'%PDF').result(5)
+        self.assertEqual(client.put_object.call_count, 1)
+
+    def test_retries_stop_after_max_retries(self):
+        client = mock.Mock()
+        client.put_object.side_effect = ConnectionResetError
+        with self.assertRaises(ConnectionResetError):
+            self.pipeline(client, max_retries=2).submit('1_invoice.pdf', b'%PDF').result(5)
+        self.assertEqual(client.put_object.call_count, 3)
+
+    def test_objects_above_the_threshold_use_a_multipart_upload(self):
+        client = mock.Mock()
+        pipeline = self.pipeline(client, multipart_threshold=4, part_size=2)
+        with mock.patch('oci.object_storage.UploadManager') as manager:
+            pipeline.submit('small.pdf', b'1234').result(5)
+            pipeline.submit('large.pdf', b'12345').result(5)
+        self.assertEqual([c.args[2] for c in client.put_object.call_args_list], ['small.pdf'])
+        [(args, kwargs)] = manager.return_value.upload_stream.call_args_list
+        self.assertEqual((args[2], args[3].read(), kwargs['part_size']), ('large.pdf', b'12345', 2))
+
+
+@override_settings(APEX_OUTBOX={"MAX_ATTEMPTS": 2, "BACKOFF": 1, "BATCH_SIZE": 10})
+class OutboxTests(TestCase):
+    def _rows(self, count):
+        return [EmailDetailOutbox.objects.create(payload={"n": n}, l_uid=str(n)) for n in range(count)]
+
+    def test_failed_rows_are_retried_with_backoff_then_dead_lettered(self):
+        [row] = self._rows(1)
+        with mock.patch.object(outbox, '_post_rows', side_effect=lambda rows: [(r, "502") for r in rows]):
+            self.assertEqual(outbox.flush_once(), (0, 1))
+            row.refresh_from_db()
+            self.assertEqual((row.status, row.attempts), (EmailDetailOutbox.PENDING, 1))
+            self.assertGreater(row.next_attempt_at, timezone.now())
+            # Not due yet, so nothing is claimed.
+            self.assertEqual(outbox.flush_once(), (0, 0))
+            EmailDetailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.flush_once(), (0, 1))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (EmailDetailOutbox.DEAD, 2))
+
+    def test_rows_are_sent_once(self):
+        rows = self._rows(3)
+        posted = []
+        with mock.patch.object(outbox, '_post_rows', side_effect=lambda batch: posted.extend(batch) or []):
+            self.assertEqual(outbox.flush_until_empty(), (3, 0))
+            self.assertEqual(outbox.flush_until_empty(), (0, 0))
+        self.assertEqual(sorted(r.pk for r in posted), sorted(r.pk for r in rows))
+        self.assertEqual(EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.SENT).count(), 3)
+
+    def test_claimed_rows_are_not_claimed_again_until_the_lease_expires(self):
+        self._rows(2)
+        first = outbox._claim(10, lease_seconds=60)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(outbox._claim(10, lease_seconds=60), [])
+        EmailDetailOutbox.objects.update(claimed_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(len(outbox._claim(10, lease_seconds=60)), 2)
+
+    def test_rows_posted_before_a_batch_outlasts_its_lease_are_not_claimed_again(self):
+        self._rows(3)
+        posted, reclaimed = [], []
+
+        def slow_post(upstream, url, json):
+            # Each POST takes longer than the lease, and another flusher claims what is left.
+            EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.SENDING).update(
+                claimed_at=timezone.now() - timedelta(hours=1))
+            reclaimed.append({row.payload["n"] for row in outbox._claim(10, lease_seconds=60)})
+            posted.append(json["n"])
+            return mock.Mock()
+
+        with mock.patch.object(config_STAGE, 'APEX_API_URL_EMAIL_BATCH', None, create=True), \
+                mock.patch.object(outbox.http_client, 'post', side_effect=slow_post):
+            self.assertEqual(outbox.flush_once(), (3, 0))
+        self.assertEqual(posted, [0, 1, 2])
+        self.assertEqual(reclaimed[1:], [{1, 2}, {2}])
+        self.assertEqual(EmailDetailOutbox.objects.filter(status=EmailDetailOutbox.SENT).count(), 3)
+
+    def test_default_lease_outlasts_a_batch_of_timeouts(self):
+        upstream = {"CONNECT_TIMEOUT": 5, "READ_TIMEOUT": 20, "RETRIES": 3}
+        with override_settings(HTTP_UPSTREAMS={"apex": upstream}):
+            self.assertGreater(outbox.lease_seconds(), 10 * (5 + 20) * 4)
+        with override_settings(APEX_OUTBOX={"LEASE_SECONDS": 90}):
+            self.assertEqual(outbox.lease_seconds(), 90)
+
+
+class TTLCacheTests(TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        lookups = cache.TTLCache('test', max_entries=2, ttl=60)
+        lookups.put('a', 1)
+        lookups.put('b', 2)
+        lookups.get_or_load('a', lambda: self.fail("'a' should be cached"))
+        lookups.put('c', 3)
+        self.assertEqual(lookups.get_or_load('b', lambda: (20, cache.POSITIVE)), 20)
+        self.assertEqual(lookups.stats()['evictions'], 2)
+
+    def test_negative_entries_use_their_own_ttl_and_skips_are_not_cached(self):
+        lookups = cache.TTLCache('test', ttl=60, negative_ttl=0, stale_ttl=60)
+        loads = []
+
+        def not_found():
+            loads.append(1)
+            return None, cache.NEGATIVE
+
+        lookups.get_or_load('x', not_found)
+        time.sleep(0.01)
+        lookups.get_or_load('x', not_found)
+        self.assertEqual(len(loads), 2)   # expired negatives are never served stale
+
+        lookups.get_or_load('y', lambda: ('down', cache.SKIP))
+        self.assertEqual(lookups.get_or_load('y', lambda: ('up', cache.POSITIVE)), 'up')
+
+    def test_stale_entry_is_served_while_one_background_refresh_runs(self):
+        lookups = cache.TTLCache('test', ttl=0, stale_ttl=60)
+        lookups.put('k', 'old')
+        time.sleep(0.01)
+        refreshed = threading.Event()
+
+        def reload():
+            refreshed.set()
+            return 'new', cache.POSITIVE
+
+        self.assertEqual(lookups.get_or_load('k', reload), 'old')
+        self.assertTrue(refreshed.wait(5))
+        deadline = time.monotonic() + 5
+        while lookups.stats()['refreshes'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(lookups._entries['k'].value, 'new')
+        self.assertEqual(lookups.stats()['stale_hits'], 1)
+
+
+class LookupCacheStatsViewTests(TestCase):
+    def test_stats_require_the_metrics_token_when_one_is_set(self):
+        with override_settings(METRICS={"TOKEN": "s3cret"}):
+            self.assertEqual(self.client.get('/lookup-cache/stats/').status_code, 401)
+            response = self.client.get('/lookup-cache/stats/', headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'po', 'vendor'})
+        self.assertEqual(self.client.get('/lookup-cache/stats/').status_code, 200)
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = cache.SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return 'value'
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while not calls:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertEqual({value for value, _ in results}, {'value'})
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flight = cache.SingleFlight()
+        with self.assertRaises(RuntimeError):
+            flight.do('k', mock.Mock(side_effect=RuntimeError))
+        self.assertEqual(flight.do('k', lambda: 1), (1, False))
+
+
+class AlertRuleTests(TestCase):
+    rules = alert_rules.RuleSet.from_dict(alert_rules.DEFAULT_RULES)
+
+    def test_terms_match_whole_words_only(self):
+        self.assertFalse(self.rules.classify(subject="Importantly, the dashboard moved", body="criticality review")["is_alert"])
+        self.assertFalse(self.rules.classify(subject="Unalerted changes", body="forewarnings")["is_alert"])
+
+    def test_plural_and_inflected_forms_count_as_their_rule(self):
+        for subject in ("Security Alerts for your account", "Disk space warnings", "New notifications", "Alerting resumed"):
+            self.assertTrue(self.rules.classify(subject=subject)["is_alert"], subject)
+        result = self.rules.classify(subject="Alerts: alert storm", body="alerted twice")
+        self.assertEqual((result["score"], result["terms"]), (2.0, ["alert"]))
+
+    def test_search_terms_leave_out_forms_the_server_already_matches(self):
+        self.assertEqual(self.rules.terms("subject"), ["critical", "alert", "warning", "important", "notification"])
+        rules = alert_rules.RuleSet.from_dict({"rules": [{"term": "disk full", "forms": ["disks full", "out of space"]}]})
+        self.assertEqual(rules.terms("body"), ["disk full", "disks full", "out of space"])
+
+    def test_scores_add_up_to_a_severity(self):
+        result = self.rules.classify(subject="CRITICAL alert", body="Disk almost full.")
+        self.assertTrue(result["is_alert"])
+        self.assertEqual(result["score"], 5.0)
+        self.assertEqual(result["severity"], "critical")
+        self.assertEqual(sorted(result["terms"]), ["alert", "critical"])
+
+
+class AgentRegistryTests(TestCase):
+    def test_agents_on_the_same_endpoint_register_the_same_tools(self):
+        tools_by_endpoint = {}
+        for name, spec in agent_registry.registry._specs.items():
+            tools_by_endpoint.setdefault(spec.endpoint_key, {})[name] = list(spec.tools or [])
+        for endpoint, tools in tools_by_endpoint.items():
+            self.assertEqual(len({tuple(t) for t in tools.values()}), 1, f"{endpoint}: {tools}")
+
+
+class FastPathTests(TestCase):
+    def test_structured_id_accepts_full_ids_with_or_without_a_lead_in(self):
+        for text in ('0000000014', ' po# 0000000014 ', 'PO NUMBER: 0000000014', 'purchase order 0000000014'):
+            self.assertEqual(fast_path.structured_id('po', text), '0000000014', text)
+        self.assertEqual(fast_path.structured_id('vendor', 'Vendor ID 0000000001'), '0000000001')
+
+    def test_partial_or_free_text_ids_go_to_the_agent(self):
+        for text in ('14', 'po#14', '00000000141', 'X000000014', 'po 0000000014 please', '', None):
+            self.assertIsNone(fast_path.structured_id('po', text), text)
+        self.assertIsNone(fast_path.structured_id('vendor', 'po 0000000014'))
+
+    def test_lookup_of_a_partial_id_runs_the_agent_instead_of_caching_a_miss(self):
+        agent = mock.Mock(return_value={"status": "success", "message": "PO 0000000014 is approved"})
+        tool = mock.Mock()
+        with mock.patch.dict(fast_path._TOOLS, {"po": (tool, "po_header", agent)}):
+            self.assertEqual(fast_path.lookup('po', 'po#14')["message"], "PO 0000000014 is approved")
+        agent.assert_called_once_with('po#14')
+        tool.assert_not_called()
+
+
+class ExecutorTests(TestCase):
+    def setUp(self):
+        # A one-slot agent executor whose slot is already taken.
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        admission = threading.BoundedSemaphore(1)
+        admission.acquire()
+        for name, value in (('_executor', pool), ('_admission', admission)):
+            patcher = mock.patch.object(executor, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_full_executor_raises_executor_busy(self):
+        call = mock.Mock()
+        with self.assertRaises(executor.ExecutorBusy):
+            asyncio.run(executor.run_blocking(call))
+        call.assert_not_called()
+
+    def test_views_answer_503_while_the_executor_is_full(self):
+        response = self.client.get('/agent-summary/po/', {'id': '0000000014'})
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.json()['busy'])
+
+        response = self.client.post('/bulk-lookup/', {'kind': 'po', 'ids': ['0000000014']}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(views.BUSY_RETRY_AFTER))
+
+
+@override_settings(AGENT_JOBS={"STALE_AFTER": 60})
+class AgentJobTests(TestCase):
+    def test_a_job_is_claimed_by_one_worker_only(self):
+        job = AgentJob.objects.create(kind='po', params={'po_number': '0000000014'})
+        self.assertEqual(jobs.claim_next('worker-a'), job)
+        self.assertIsNone(jobs.claim_next('worker-b'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (AgentJob.RUNNING, 'worker-a'))
+
+    def test_a_job_claimed_by_another_worker_meanwhile_is_skipped(self):
+        first = AgentJob.objects.create(kind='po')
+        second = AgentJob.objects.create(kind='po')
+        now = timezone.now
+
+        def claimed_by_another_worker_first():
+            # Another worker claims the oldest job between this worker's SELECT and UPDATE.
+            AgentJob.objects.filter(id=first.id, status=AgentJob.QUEUED).update(status=AgentJob.RUNNING, worker='other')
+            return now()
+
+        with mock.patch.object(jobs, '_fail_stale_jobs'), \
+                mock.patch.object(jobs.timezone, 'now', side_effect=claimed_by_another_worker_first):
+            self.assertEqual(jobs.claim_next('worker-a'), second)
+        first.refresh_from_db()
+        self.assertEqual(first.worker, 'other')
+
+    def test_running_jobs_without_a_recent_heartbeat_are_failed(self):
+        now = timezone.now()
+        stale = AgentJob.objects.create(kind='email', status=AgentJob.RUNNING, heartbeat_at=now - timedelta(seconds=61))
+        alive = AgentJob.objects.create(kind='email', status=AgentJob.RUNNING, heartbeat_at=now - timedelta(seconds=30))
+        self.assertIsNone(jobs.claim_next('worker-a'))
+        stale.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual(stale.status, AgentJob.FAILED)
+        self.assertIn("stopped responding", stale.error)
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(alive.status, AgentJob.RUNNING)
+
+    def test_heartbeat_keeps_a_quiet_job_from_going_stale(self):
+        job = AgentJob.objects.create(kind='email', status=AgentJob.RUNNING,
+                                      heartbeat_at=timezone.now() - timedelta(seconds=59))
+        finished = mock.Mock()
+        finished.wait.side_effect = [False, True]   # one interval passes, then the run ends
+        with mock.patch.object(jobs, 'close_old_connections'):
+            jobs._heartbeat(job.id, finished, 20)
+        self.assertIsNone(jobs.claim_next('worker-a'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, AgentJob.RUNNING)
+        self.assertLess(timezone.now() - job.heartbeat_at, timedelta(seconds=5))
+
+
+class AlertDigestTests(TestCase):
+    day = timezone.localdate()
+
+    def alert(self, uid):
+        return {"uid": str(uid), "from": "monitor@example.com", "subject": f"CRITICAL alert {uid}", "score": 5.0}
+
+    def test_concurrent_runs_merge_each_message_once(self):
+        first = AlertDigest.load('box', self.day, 7)
+        second = AlertDigest.load('box', self.day, 7)
+        first.merge(['1', '2', '3'], [self.alert(2)])
+        # The second run searched before the first merged, so it saw 2 and 3 again.
+        second.merge(['2', '3', '4'], [self.alert(3), self.alert(4)])
+        digest = AlertDigest.objects.get(pk=first.pk)
+        self.assertEqual((digest.last_uid, digest.total_emails), (4, 4))
+        self.assertEqual([a["uid"] for a in digest.alerts], ['2', '4'])
+        self.assertEqual((second.last_uid, second.alerts), (4, digest.alerts))
+
+    def test_uidvalidity_change_starts_the_day_over(self):
+        old = AlertDigest.load('box', self.day, 7)
+        old.merge(['10', '11'], [self.alert(11)])
+        fresh = AlertDigest.load('box', self.day, 8)
+        self.assertEqual((fresh.last_uid, fresh.total_emails, fresh.alerts), (0, 0, []))
+        # A run still holding the old UIDVALIDITY must not merge its UIDs into the new one.
+        old.merge(['12'], [self.alert(12)])
+        fresh.refresh_from_db()
+        self.assertEqual((fresh.uid_validity, fresh.last_uid, fresh.alerts), (8, 0, []))
+
+    def test_prune_keeps_recent_days_and_other_mailboxes(self):
+        for days_ago in range(4):
+            AlertDigest.load('box', self.day - timedelta(days=days_ago), 7)
+        AlertDigest.load('other', self.day - timedelta(days=3), 7)
+        self.assertEqual(AlertDigest.prune('box', self.day - timedelta(days=1)), 2)
+        self.assertEqual(sorted(AlertDigest.objects.filter(mailbox='box').values_list('day', flat=True)),
+                         [self.day - timedelta(days=1), self.day])
+        self.assertTrue(AlertDigest.objects.filter(mailbox='other').exists())
+
+
+@override_settings(MIME_PIPELINE={"ENABLED": True, "WORKERS": 2, "MIN_MESSAGES": 1, "MAX_IN_FLIGHT": 2})
+class MimePipelineTests(TestCase):
+    uids = [str(uid) for uid in range(1, 41)]
+
+    def message(self, uid):
+        # Sizes vary so workers finish out of order.
+        body = base64.encodebytes(bytes(range(256)) * (40 if int(uid) % 3 == 0 else 1)).decode()
+        return (f"From: billing@example.com\r\nSubject: Invoice {uid}\r\nMIME-Version: 1.0\r\n"
+                f"Content-Type: multipart/mixed; boundary=b\r\n\r\n--b\r\nContent-Type: application/pdf\r\n"
+                f"Content-Disposition: attachment; filename=\"{uid}.pdf\"\r\nContent-Transfer-Encoding: base64\r\n\r\n"
+                f"{body}\r\n--b--\r\n").encode()
+
+    def test_results_come_back_in_uid_order_and_stop_at_a_failed_fetch(self):
+        fetch = lambda uid: None if uid == '35' else self.message(uid)
+        results = list(mime_pipeline.parse_messages(fetch, self.uids))
+        self.assertEqual([uid for uid, _ in results], self.uids[:35])
+        self.assertIsNone(results[-1][1])
+        for uid, (_, subject, attachments) in results[:-1]:
+            self.assertEqual((subject, attachments[0][0]), (f"Invoice {uid}", f"{uid}.pdf"))
+
+    def test_closing_early_stops_the_fetch_thread_and_the_pool(self):
+        fetched = []
+        messages = mime_pipeline.parse_messages(lambda uid: fetched.append(uid) or self.message(uid), self.uids)
+        self.assertEqual([next(messages)[0] for _ in range(3)], ['1', '2', '3'])
+        messages.close()
+        self.assertLess(len(fetched), 12)   # bounded by MAX_IN_FLIGHT, not the whole backlog
+        self.assertFalse(any(t.name == "mime-fetch" and t.is_alive() for t in threading.enumerate()))
+
+
+class MetricsTests(TestCase):
+    def test_registry_renders_the_prometheus_text_format(self):
+        registry = metrics.Registry()
+        errors = registry.register(metrics.Counter("test_errors_total", "Errors by path.", ["path"]))
+        latency = registry.register(metrics.Histogram("test_seconds", "Latency.", buckets=(0.1, 1)))
+        busy = registry.register(metrics.Gauge("test_busy", "Busy workers."))
+        errors.inc(path='C:\\inbox "new"\nline')
+        errors.inc(2, path="/a")
+        for seconds in (0.05, 0.5, 5):
+            latency.observe(seconds)
+        busy.inc()
+        busy.dec(0.5)
+        self.assertEqual(registry.render(), "\n".join([
+            '# HELP test_errors_total Errors by path.',
+            '# TYPE test_errors_total counter',
+            'test_errors_total{path="/a"} 2',
+            'test_errors_total{path="C:\\\\inbox \\"new\\"\\nline"} 1',
+            '# HELP test_seconds Latency.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            'test_seconds_sum 5.55',
+            'test_seconds_count 3',
+            '# HELP test_busy Busy workers.',
+            '# TYPE test_busy gauge',
+            'test_busy 0.5',
+        ]) + "\n")
+
+    def test_middleware_times_async_views_on_the_event_loop(self):
+        async def view(request):
+            return HttpResponse(status=201)
+
+        async def broken_view(request):
+            raise RuntimeError
+
+        key = ("unmatched", "GET", "201")
+        before = metrics.requests_total._values.get(key, 0)
+        in_progress = metrics.requests_in_progress._values.get((), 0)
+        middleware = RequestMetricsMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get('/')))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(metrics.requests_total._values[key], before + 1)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(RequestMetricsMiddleware(broken_view)(RequestFactory().get('/')))
+        self.assertEqual(metrics.requests_in_progress._values.get((), 0), in_progress)
+
+
+class OfflineStandInTests(TestCase):
+    """
+    End-to-end checks against the stand-ins of the offline benchmark suite
+    (benchmarks/offline): a synthetic mailbox served over a real IMAP socket, the Object
+    Storage stub, ORDS and PeopleSoft on a local HTTP server, and the scripted agent.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.imap = IMAPServer(Corpus(0)).start()
+        cls.upstreams = stubs.UpstreamServer().start()
+        for server in (cls.imap, cls.upstreams):
+            cls.addClassCleanup(server.server_close)
+            cls.addClassCleanup(server.shutdown)
+        cls.enterClassContext(mock.patch.object(oci_clients, 'get_oci_config', return_value={}))
+        cls.enterClassContext(mock.patch('oci.object_storage.ObjectStorageClient', stubs.ObjectStorageStub))
+        cls.enterClassContext(mock.patch.object(config_STAGE, 'APEX_API_URL_EMAIL', cls.upstreams.url('/ords/email')))
+        cls.enterClassContext(mock.patch.object(config_STAGE, 'APEX_API_URL_EMAIL_BATCH', None, create=True))
+        cls.enterClassContext(override_settings(PEOPLESOFT_API_URL={
+            "GET_PO_PEOPLESOFT_API_URL": cls.upstreams.url('/peoplesoft/po'),
+            "GET_VENDOR_PEOPLESOFT_API_URL": cls.upstreams.url('/peoplesoft/vendor'),
+        }))
+
+    def setUp(self):
+        stubs.ObjectStorageStub.reset()
+        self.upstreams.reset()
+        self.imap.unsolicited = False
+        agent_services.po_cache.clear()
+        agent_services.vendor_cache.clear()
+
+    def connect(self, corpus):
+        self.imap.load(corpus)
+        mail = imaplib.IMAP4('127.0.0.1', self.imap.port)
+        mail.login('invoices', 'offline')
+        mail.select('INBOX')
+        self.addCleanup(mail.logout)
+        return mail
+
+    def ingest(self, mail):
+        summary = agent_services.ingest_new_messages(mail, agent_services.new_scan_summary())
+        self.assertEqual(summary['errors'], 0)
+        return summary
+
+    def assertStoredWhole(self, corpus):
+        """Every attachment in the corpus was uploaded once, at its full decoded size."""
+        expected = {str(uid): corpus.meta(uid)[3][2] for uid in range(1, corpus.size + 1) if corpus.meta(uid)[3]}
+        stored = {name.split('_', 1)[0]: size for (_, name), size in stubs.ObjectStorageStub.objects.items()}
+        self.assertEqual(stored, expected)
+
+    def test_ingest_uploads_every_attachment_and_resumes_from_the_checkpoint(self):
+        corpus = Corpus(40, attachment_ratio=0.5, attachment_bytes=2048, duplicate_ratio=0)
+        mail = self.connect(corpus)
+        self.assertEqual(self.ingest(mail)['processed_emails'], 40)
+        self.assertStoredWhole(corpus)
+        self.assertEqual(EmailDetailOutbox.objects.count(), len(stubs.ObjectStorageStub.objects))
+
+        self.assertEqual(self.ingest(mail)['processed_emails'], 0)
+        corpus.grow(3)
+        self.assertEqual(self.ingest(mail)['processed_emails'], 3)
+        self.assertEqual(MailboxCheckpoint.objects.get(mailbox=agent_services.mailbox_key()).last_uid, 43)
+
+    def test_a_message_that_keeps_failing_is_skipped_after_the_attempt_limit(self):
+        corpus = Corpus(10, attachment_ratio=1.0, attachment_bytes=512, duplicate_ratio=0)
+        mail = self.connect(corpus)
+        fetch_attachments = agent_services.fetch_attachments
+
+        def broken_third_message(mail, email_uid, parts):
+            if email_uid == '3':
+                raise imaplib.IMAP4.error("BODY[2] missing")
+            return fetch_attachments(mail, email_uid, parts)
+
+        checkpoint = lambda: MailboxCheckpoint.objects.get(mailbox=agent_services.mailbox_key()).last_uid
+        with mock.patch.object(agent_services, 'fetch_attachments', broken_third_message), \
+                mock.patch.object(agent_services, 'INGEST_MAX_ATTEMPTS', 3):
+            for _ in range(2):
+                summary = agent_services.ingest_new_messages(mail, agent_services.new_scan_summary())
+                self.assertEqual((summary['errors'], summary['skipped_emails']), (1, 0))
+                self.assertEqual(checkpoint(), 2)
+            summary = agent_services.ingest_new_messages(mail, agent_services.new_scan_summary())
+        self.assertEqual((summary['processed_emails'], summary['skipped_emails']), (7, 1))
+        self.assertEqual(checkpoint(), 10)
+        failure = MessageFailure.objects.get(uid=3)
+        self.assertEqual((failure.attempts, failure.skipped, failure.last_error), (3, True, "BODY[2] missing"))
+        self.assertEqual(len(stubs.ObjectStorageStub.objects), 9)
+
+    def test_unsolicited_fetch_responses_do_not_truncate_attachments(self):
+        # Attachments of 1-3 KiB encode to both sides of the chunk size: fetched whole and streamed.
+        corpus = Corpus(30, attachment_ratio=1.0, attachment_bytes=2048, duplicate_ratio=0)
+        mail = self.connect(corpus)
+        self.imap.unsolicited = True
+        with mock.patch.object(agent_services, 'ATTACHMENT_CHUNK_BYTES', 2700):
+            self.assertEqual(self.ingest(mail)['processed_emails'], 30)
+        self.assertStoredWhole(corpus)
+
+    def test_outbox_rows_reach_ords_once(self):
+        mail = self.connect(Corpus(20, attachment_ratio=1.0, attachment_bytes=512))
+        self.ingest(mail)
+        rows = EmailDetailOutbox.objects.count()
+        self.assertEqual(outbox.flush_until_empty(), (rows, 0))
+        self.assertEqual(outbox.flush_until_empty(), (0, 0))
+        self.assertEqual(self.upstreams.ords_rows, rows)
+
+    def test_alerts_beyond_the_body_prefix_are_classified_on_the_whole_body(self):
+        corpus = Corpus(100, attachment_ratio=0, alert_ratio=0.3)
+        mail = self.connect(corpus)
+        with mock.patch.object(agent_services, 'ALERT_BODY_PREFIX_BYTES', 10):
+            alerts = agent_services.scan_alert_candidates(mail, [str(uid) for uid in range(1, 101)])
+        expected = {str(uid) for uid in range(1, 101) if corpus.meta(uid)[0].startswith('Monitoring')}
+        self.assertEqual({alert['uid'] for alert in alerts}, expected)
+        self.assertTrue(all(alert['score'] > 0 for alert in alerts))
+
+    def backfill(self, mail, run, day, **options):
+        summaries = []
+        while (chunk := backfill.claim_next(run)) is not None:
+            summaries.append(backfill.process_chunk(chunk, mail, day, day, **options))
+        return summaries
+
+    def test_backfill_plans_once_and_resumes_a_failed_chunk_after_its_last_message(self):
+        corpus = Corpus(25, attachment_ratio=1.0, attachment_bytes=256, duplicate_ratio=0)
+        mail = self.connect(corpus)
+        run = backfill.run_name(corpus.day, corpus.day)
+        chunks = backfill.plan(mail, run, corpus.day, corpus.day, chunk_size=10)
+        self.assertEqual(list(chunks.order_by('first_uid').values_list('first_uid', 'last_uid', 'messages')),
+                         [(1, 10, 10), (11, 20, 10), (21, 25, 5)])
+
+        fetch_attachments = agent_services.fetch_attachments
+        fetched, failures = [], [imaplib.IMAP4.error("BODY[2] missing")]
+
+        def fetch(mail, email_uid, parts):
+            fetched.append(int(email_uid))
+            if email_uid == '14' and failures:
+                raise failures.pop()
+            return fetch_attachments(mail, email_uid, parts)
+
+        with mock.patch.object(agent_services, 'fetch_attachments', fetch):
+            self.backfill(mail, run, corpus.day)
+            failed = BackfillChunk.objects.get(run=run, status=BackfillChunk.FAILED)
+            self.assertEqual((failed.first_uid, failed.done_uid), (11, 13))
+
+            # A rerun keeps the plan (no new SEARCH of the range) and only redoes the failed chunk's rest.
+            fetched.clear()
+            self.assertEqual(backfill.plan(mail, run, corpus.day, corpus.day, chunk_size=5).count(), 3)
+            self.backfill(mail, run, corpus.day)
+        self.assertEqual(fetched, list(range(14, 21)))
+        self.assertEqual(set(BackfillChunk.objects.filter(run=run).values_list('status', flat=True)), {BackfillChunk.DONE})
+        self.assertStoredWhole(corpus)
+
+    def test_backfill_skips_indexed_attachments_unless_dedup_is_off(self):
+        corpus = Corpus(6, attachment_ratio=1.0, attachment_bytes=256, duplicate_ratio=0)
+        mail = self.connect(corpus)
+        self.ingest(mail)
+        stubs.ObjectStorageStub.reset()
+        run = backfill.run_name(corpus.day, corpus.day)
+
+        backfill.plan(mail, run, corpus.day, corpus.day, chunk_size=10)
+        [summary] = self.backfill(mail, run, corpus.day)
+        self.assertEqual((summary['duplicate_attachments'], len(stubs.ObjectStorageStub.objects)), (6, 0))
+
+        backfill.plan(mail, run, corpus.day, corpus.day, chunk_size=10, restart=True)
+        [summary] = self.backfill(mail, run, corpus.day, dedup=False)
+        self.assertEqual((summary['processed_attachments'], summary['duplicate_attachments']), (6, 0))
+        self.assertStoredWhole(corpus)
+
+    def test_backfill_waits_for_the_mailbox_scan_lease(self):
+        MailboxCheckpoint.try_lock(agent_services.mailbox_key(), 'watch_inbox', 60)
+        with self.assertRaises(CommandError), mock.patch.object(backfill, 'plan') as plan:
+            call_command('backfill_invoices', '--since', timezone.localdate().isoformat())
+        plan.assert_not_called()
+        MailboxCheckpoint.unlock(agent_services.mailbox_key(), 'watch_inbox')
+        # While the backfill holds the lease, live scans skip.
+        self.assertTrue(backfill.lock_mailbox('backfill'))
+        summary = agent_services.ingest_new_messages(FakeMail(), agent_services.new_scan_summary())
+        self.assertTrue(summary['skipped_locked'])
+        backfill.unlock_mailbox('backfill')
+        self.assertTrue(MailboxCheckpoint.try_lock(agent_services.mailbox_key(), 'watch_inbox', 60))
+
+    def test_lookups_are_cached_including_not_found(self):
+        rows = bulk_lookup.bulk_lookup('po', ['0000000014', 'X0000001', '0000000014'])
+        self.assertEqual([row['status'] for row in rows], ['success', 'error', 'success'])
+        self.assertEqual(rows[0]['PO_ID'], '0000000014')
+        bulk_lookup.bulk_lookup('po', ['0000000014', 'X0000001'])
+        self.assertEqual(self.upstreams.requests['peoplesoft'], 2)
+
+    def test_agent_runs_call_their_tool_in_a_fresh_session(self):
+        deleted = []
+        with mock.patch.object(agent_registry, 'Agent', stubs.ScriptedAgent), \
+                mock.patch.object(agent_registry, 'AgentClient', stubs.AgentClientStub), \
+                mock.patch.dict(agent_registry.registry._agents, clear=True), \
+                mock.patch.object(agent_registry.registry, '_client', None), \
+                mock.patch.object(agent_registry.registry, '_delete_session', lambda agent, session_id: deleted.append(session_id)):
+            first = agent_services.run_po_agent('0000000014')
+            second = agent_services.run_po_agent('0000000014')
+        self.assertEqual(first['status'], 'success')
+        self.assertIn('0000000014', first['message'])
+        self.assertEqual(second, first)
+        self.assertEqual(len(set(deleted)), 2)
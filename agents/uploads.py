@@ -0,0 +1,129 @@
+import hashlib
+import io
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import oci
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class UploadPipeline:
+    """
+    Uploads objects to OCI Object Storage on a bounded thread pool.
+
+    Each object is retried with exponential backoff and jitter on throttling, server
+    errors and connection problems. Objects above `multipart_threshold` bytes go through
+    oci.object_storage.UploadManager as a parallel multipart upload. Every worker thread
+    gets its own ObjectStorageClient built by `client_factory`.
+    """
+
+    def __init__(self, client_factory, namespace, bucket_name, max_workers=8, max_retries=3,
+                 backoff=1.0, multipart_threshold=16 * MB, part_size=8 * MB, max_queued=None):
+        self.client_factory = client_factory
+        self.namespace = namespace
+        self.bucket_name = bucket_name
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="oci-upload")
+        # Bounds the bytes held by queued uploads, not just the number of running ones.
+        self._queued = threading.BoundedSemaphore(max_queued or max_workers * 2)
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.client_factory()
+        return self._local.client
+
+    def submit(self, object_name, file_data):
+        """Queues one upload and returns a Future resolving to object_name once it is stored."""
+        self._queued.acquire()
+        try:
+            future = self._executor.submit(self._upload_with_retries, object_name, file_data)
+        except BaseException:
+            self._queued.release()
+            raise
+        future.add_done_callback(lambda _: self._queued.release())
+        return future
+
+    def _upload_with_retries(self, object_name, file_data):
+        attempt = 0
+        while True:
+            try:
+                self._upload(object_name, file_data)
+                logger.info(f"Uploaded '{object_name}' to bucket '{self.bucket_name}'")
+                return object_name
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    logger.error(f"Upload failed for '{object_name}' after {attempt + 1} attempt(s): {e}")
+                    raise
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                logger.warning(f"Upload of '{object_name}' failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                if hasattr(file_data, "seek"):
+                    file_data.seek(0)
+
+    def _upload(self, object_name, file_data):
+        size = _size_of(file_data)
+        client = self._client()
+        with metrics.timed("object_upload"):
+            if size is not None and size <= self.multipart_threshold:
+                client.put_object(self.namespace, self.bucket_name, object_name, file_data, content_length=size)
+            else:
+                stream = io.BytesIO(file_data) if isinstance(file_data, (bytes, bytearray)) else file_data
+                manager = oci.object_storage.UploadManager(client, allow_parallel_uploads=True)
+                manager.upload_stream(self.namespace, self.bucket_name, object_name, stream, part_size=self.part_size)
+        metrics.add_bytes("object_upload", size)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _size_of(file_data):
+    if file_data is None:
+        return 0
+    if isinstance(file_data, (bytes, bytearray)):
+        return len(file_data)
+    try:
+        position = file_data.tell()
+        file_data.seek(0, io.SEEK_END)
+        size = file_data.tell()
+        file_data.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+
+def _is_retryable(error):
+    if isinstance(error, oci.exceptions.ServiceError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout,
+                              oci.exceptions.MultipartUploadError, OSError))
+
+
+def content_digest(file_data, chunk_size=MB):
+    """Returns (sha256 hex digest, size) of bytes or a seekable file, leaving the file rewound."""
+    digest = hashlib.sha256()
+    if file_data is None:
+        return digest.hexdigest(), 0
+    if isinstance(file_data, (bytes, bytearray)):
+        digest.update(file_data)
+        return digest.hexdigest(), len(file_data)
+    size = 0
+    file_data.seek(0)
+    for chunk in iter(lambda: file_data.read(chunk_size), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    file_data.seek(0)
+    return digest.hexdigest(), size
@@ -1,10 +1,17 @@
 from django.urls import path
-from .views import HomeView,GetPOAgentView,GetVendorAgentView,AlertSummaryAgentView,EmailAgentView
+from .views import HomeView,GetPOAgentView,GetVendorAgentView,AlertSummaryAgentView,EmailAgentView,AgentSummaryView,BulkLookupAgentView,JobStatusView,JobStreamView,AgentStreamView,LookupCacheStatsView,MetricsView
 
 urlpatterns = [
     path('',HomeView.as_view(),name='home'),
     path('getpo-agent/',GetPOAgentView, name='getpo_agent'),
     path('getvendor-agent/',GetVendorAgentView, name='getvendor_agent'),
     path('alertsummary-agent/',AlertSummaryAgentView, name='alertsummary_agent'),
-    path('email-agent/',EmailAgentView,name='email_agent')
+    path('email-agent/',EmailAgentView,name='email_agent'),
+    path('agent-summary/<str:kind>/',AgentSummaryView,name='agent_summary'),
+    path('bulk-lookup/',BulkLookupAgentView,name='bulk_lookup'),
+    path('jobs/<int:job_id>/',JobStatusView,name='job_status'),
+    path('jobs/<int:job_id>/stream/',JobStreamView,name='job_stream'),
+    path('agent-stream/<str:kind>/',AgentStreamView,name='agent_stream'),
+    path('lookup-cache/stats/',LookupCacheStatsView,name='lookup_cache_stats'),
+    path('metrics',MetricsView,name='metrics')
 ]
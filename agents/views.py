@@ -1,52 +1,216 @@
 # ai_agents/views.py
 
-from django.shortcuts import render
+import hmac
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
 from . import agent_services # Import our new services file
+from . import bulk_lookup
+from . import fast_path
+from . import jobs
+from . import metrics
+from . import streaming
+from .executor import ExecutorBusy, run_blocking
+from .models import AgentJob
 from django.views.generic import TemplateView
 
 
+# Seconds a client is told to wait when the agent executor is full (503 responses).
+BUSY_RETRY_AFTER = 5
+
+
 class HomeView(TemplateView):
     template_name = 'home.html'
 
-def GetPOAgentView(request):
+async def _run_agent(fn, *args):
+    # Agent runs block for seconds; they go to the bounded agent executor so the
+    # event loop keeps serving other requests while they run.
+    try:
+        return await run_blocking(fn, *args)
+    except ExecutorBusy as e:
+        return {'status': 'error', 'message': str(e), 'busy': True}
+
+async def GetPOAgentView(request):
     context = {}
     if request.method == 'POST':
         po_number = request.POST.get('po_number', '').strip()
         if po_number:
-            # Call our service function to run the agent
-            result = agent_services.run_po_agent(po_number)
+            # Well-formed PO numbers skip the LLM; anything else goes to the agent
+            result = await _run_agent(fast_path.lookup, 'po', po_number)
             context['result'] = result
             context['submitted_po'] = po_number
+            if result.get('fast_path') and fast_path.fast_path_config()['SUMMARY']:
+                context['summary_id'] = fast_path.structured_id('po', po_number)
     return render(request, 'getpo_agent.html', context)
 
-def GetVendorAgentView(request):
+async def GetVendorAgentView(request):
     context = {}
     if request.method == 'POST':
         vendor_id = request.POST.get('vendor_id', '').strip()
         if vendor_id:
-            # Call our service function to run the agent
-            result = agent_services.run_vendor_agent(vendor_id)
+            # Well-formed vendor IDs skip the LLM; anything else goes to the agent
+            result = await _run_agent(fast_path.lookup, 'vendor', vendor_id)
             context['result'] = result
             context['submitted_vendor'] = vendor_id
+            if result.get('fast_path') and fast_path.fast_path_config()['SUMMARY']:
+                context['summary_id'] = fast_path.structured_id('vendor', vendor_id)
     return render(request, 'getvendor_agent.html', context)
 
-def AlertSummaryAgentView(request):
+async def AlertSummaryAgentView(request):
     context = {}
     if request.method == 'POST':
         
+        if jobs.is_enabled():
+            # Queue the run and return at once; the page polls the job status
+            job = await sync_to_async(jobs.enqueue)('alertsummary')
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse(job.as_dict(), status=202)
+            context['job'] = job
+            return render(request, 'alertsummary_agent.html', context)
         # Call our service function to run the agent
-        result = agent_services.run_alertsummary_agent()
+        result = await _run_agent(agent_services.run_alertsummary_agent)
         context['result'] = result
         # context['prompt'] = prompt
     return render(request, 'alertsummary_agent.html', context)
 
-def EmailAgentView(request):
+async def EmailAgentView(request):
     context = {}
     if request.method == 'POST':
         
+        if jobs.is_enabled():
+            # Queue the run and return at once; the page polls the job status
+            job = await sync_to_async(jobs.enqueue)('email')
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse(job.as_dict(), status=202)
+            context['job'] = job
+            return render(request, 'email_agent.html', context)
         # Call our service function to run the agent
-        result = agent_services.run_Email_agent()
+        result = await _run_agent(agent_services.run_Email_agent)
         context['result'] = result
         # context['prompt'] = prompt
     return render(request, 'email_agent.html', context)
 
+async def AgentSummaryView(request, kind):
+    # Agent summary for a PO/vendor already shown by the fast path, fetched by the page afterwards
+    item_id = request.GET.get('id', '').strip()
+    if kind not in ('po', 'vendor') or not item_id:
+        return JsonResponse({'status': 'error', 'message': 'Unknown lookup.'}, status=400)
+    result = await _run_agent(fast_path.summarize, kind, item_id)
+    return JsonResponse(result, status=503 if result.get('busy') else 200)
+
+async def BulkLookupAgentView(request):
+    """
+    Looks up many POs or vendors at once. Accepts a form post (pasted IDs and/or a CSV
+    upload) or a JSON body {"kind": "po", "ids": [...], "summarize": false}. Responds with
+    the result table as HTML, or as JSON / CSV when format=json / format=csv.
+    """
+    context = {'kinds': bulk_lookup.LOOKUPS}
+    if request.method != 'POST':
+        return render(request, 'bulk_lookup.html', context)
+
+    if request.content_type == 'application/json':
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON body.'}, status=400)
+        if not isinstance(body, dict) or not isinstance(body.get('ids', []), list):
+            return JsonResponse({'status': 'error', 'message': '"ids" must be a JSON list of IDs.'}, status=400)
+        kind = body.get('kind', 'po')
+        ids = bulk_lookup.parse_ids(' '.join(str(i) for i in body.get('ids', [])))
+        summarize = bool(body.get('summarize'))
+        output = body.get('format', 'json')
+    else:
+        kind = request.POST.get('kind', 'po')
+        ids = bulk_lookup.parse_ids(request.POST.get('ids', ''))
+        upload = request.FILES.get('ids_file')
+        if upload and kind in bulk_lookup.LOOKUPS:
+            ids = bulk_lookup.unique_ids(ids + bulk_lookup.parse_csv_ids(kind, upload.read()))
+        summarize = request.POST.get('summarize') == 'on'
+        output = request.POST.get('format', 'html')
+
+    if kind not in bulk_lookup.LOOKUPS:
+        error = f"Unknown lookup type '{kind}'."
+    elif not ids:
+        error = "No IDs were given."
+    else:
+        error = None
+    status = 400
+    if error is None:
+        try:
+            rows = await run_blocking(bulk_lookup.bulk_lookup, kind, ids)
+        except ValueError as e:
+            error = str(e)
+        except ExecutorBusy as e:
+            error, status = str(e), 503
+    if error:
+        if output == 'html':
+            context['error'] = error
+            response = render(request, 'bulk_lookup.html', context, status=status)
+        else:
+            response = JsonResponse({'status': 'error', 'message': error}, status=status)
+        if status == 503:
+            response['Retry-After'] = str(BUSY_RETRY_AFTER)
+        return response
+
+    table_csv = bulk_lookup.rows_to_csv(rows)
+    summary = await _run_agent(agent_services.run_bulk_summary_agent, kind, table_csv) if summarize else None
+
+    if output == 'csv':
+        response = HttpResponse(table_csv, content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{kind}_lookup.csv"'
+        return response
+    if output == 'json':
+        return JsonResponse({'status': 'success', 'kind': kind, 'columns': bulk_lookup.columns(rows),
+                             'rows': rows, 'summary': summary})
+
+    names = bulk_lookup.columns(rows)
+    context.update({
+        'submitted_kind': kind,
+        'columns': names,
+        'table': [[row.get(name, '') for name in names] for row in rows],
+        'failed': sum(1 for row in rows if row['status'] != 'success'),
+        'summary': summary,
+    })
+    return render(request, 'bulk_lookup.html', context)
+
+def JobStatusView(request, job_id):
+    # Polled by the agent pages while a queued run is in progress
+    job = get_object_or_404(AgentJob, pk=job_id)
+    return JsonResponse(job.as_dict())
+
+def _event_stream(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+async def AgentStreamView(request, kind):
+    # Streams a read-only PO/vendor lookup (?q=) as Server-Sent Events. The email and alert
+    # agents change state, so they only run from their POST forms or as jobs (jobs/<id>/stream/).
+    query = request.GET.get('q', '').strip()
+    if kind not in ('po', 'vendor') or not query:
+        return JsonResponse({'status': 'error', 'message': 'Unknown agent or missing query.'}, status=400)
+    return _event_stream(streaming.stream_call(fast_path.lookup, kind, query))
+
+async def JobStreamView(request, job_id):
+    # Server-Sent Events for a queued job's progress; the push counterpart of JobStatusView
+    return _event_stream(streaming.stream_job(job_id))
+
+def _metrics_authorized(request):
+    # Operational endpoints require "Authorization: Bearer <METRICS TOKEN>" when a token is set
+    token = metrics.metrics_config()['TOKEN']
+    return not token or hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+def LookupCacheStatsView(request):
+    # Hit/miss counters of this worker process's PeopleSoft lookup caches
+    if not _metrics_authorized(request):
+        return HttpResponse(status=401)
+    return JsonResponse(agent_services.lookup_cache_stats())
+
+def MetricsView(request):
+    # Prometheus scrape endpoint for this worker process (stage latencies, request timings, counters)
+    if not _metrics_authorized(request):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
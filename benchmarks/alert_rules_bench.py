@@ -0,0 +1,85 @@
+"""
+Micro-benchmark for alert classification (agents/alert_rules.py).
+
+    python benchmarks/alert_rules_bench.py [--messages 100000] [--terms 5,50,200,500]
+
+Classifies a synthetic corpus of short messages with rule sets of growing size and compares
+the compiled RuleSet with the substring loop it replaced
+(any(keyword in text for keyword in keywords)). Needs no Django settings or network.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "OCI_Agents_App.settings")
+
+from agents.alert_rules import DEFAULT_RULES, RuleSet  # noqa: E402
+
+WORDS = ("invoice payment order shipment report meeting update server database backup "
+         "customer account quarterly summary review request approval schedule team project").split()
+
+
+def synthetic_terms(count, rng):
+    base = [rule["term"] for rule in DEFAULT_RULES["rules"]]
+    terms = list(base)
+    while len(terms) < count:
+        term = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(5, 12)))
+        if rng.random() < 0.2:
+            term = f"{term} {rng.choice(WORDS)}"
+        terms.append(term)
+    return terms[:count]
+
+
+def synthetic_corpus(count, terms, rng, alert_ratio=0.05):
+    corpus = []
+    for _ in range(count):
+        subject = " ".join(rng.choices(WORDS, k=rng.randint(3, 8)))
+        body = " ".join(rng.choices(WORDS, k=rng.randint(40, 120)))
+        if rng.random() < alert_ratio:
+            body = f"{body} {rng.choice(terms)} {' '.join(rng.choices(WORDS, k=10))}"
+        corpus.append((subject.title(), f"ops@{rng.choice(WORDS)}.example.com", body))
+    return corpus
+
+
+def bench(label, fn, corpus):
+    started = time.perf_counter()
+    hits = sum(1 for subject, sender, body in corpus if fn(subject, sender, body))
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<10} {elapsed:7.2f} s  {elapsed / len(corpus) * 1e6:8.1f} µs/msg  {hits:>7} alert(s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--terms", default="5,50,200,500", help="comma-separated rule set sizes")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for size in (int(n) for n in args.terms.split(",")):
+        rng = random.Random(args.seed)
+        terms = synthetic_terms(size, rng)
+        corpus = synthetic_corpus(args.messages, terms, rng)
+        started = time.perf_counter()
+        rules = RuleSet.from_dict({"rules": [{"term": term, "weight": 1.0, "fields": ["subject", "body"]} for term in terms]})
+        compile_ms = (time.perf_counter() - started) * 1000
+        keywords = [term.lower() for term in terms]
+
+        def substring(subject, sender, body):
+            text = f"{subject}\n{body}".lower()
+            return any(keyword in text for keyword in keywords)
+
+        def compiled(subject, sender, body):
+            return rules.classify(subject, sender, body)["is_alert"]
+
+        print(f"{size} term(s), {args.messages} messages (compile {compile_ms:.1f} ms):")
+        naive = bench("substring", substring, corpus)
+        engine = bench("compiled", compiled, corpus)
+        print(f"  speed-up   {naive / engine:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Throughput benchmark for RFC822 backlog parsing (agents/mime_pipeline.py).
+
+    python benchmarks/mime_pipeline_bench.py [--messages 5000] [--workers 2,4,8] [--fetch-ms 0]
+
+Parses a synthetic backlog of invoice emails (a text body plus a PDF-sized attachment)
+inline and through the process-pool pipeline at each worker count, and reports messages
+per second. --fetch-ms adds a simulated IMAP round trip per message to the fetch stage.
+Needs no IMAP server, OCI access or database.
+"""
+import argparse
+import os
+import sys
+import time
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings  # noqa: E402
+
+from agents import mime_pipeline  # noqa: E402
+
+
+def synthetic_message(i, attachment_bytes):
+    msg = EmailMessage()
+    msg["From"] = f"=?utf-8?q?Supplier_{i}?= <ap{i}@vendor.example.com>"
+    msg["To"] = "invoices@example.com"
+    msg["Subject"] = f"=?utf-8?q?Invoice_{i:06d}_f=C3=BCr_PO_{i % 997:010d}?="
+    msg.set_content("Please find the invoice attached.\n" * 20)
+    msg.add_attachment(os.urandom(attachment_bytes), maintype="application", subtype="pdf", filename=f"invoice_{i}.pdf")
+    return msg.as_bytes()
+
+
+def run(raw, fetch_ms):
+    def fetch(uid):
+        if fetch_ms:
+            time.sleep(fetch_ms / 1000)
+        return raw[uid]
+
+    started = time.perf_counter()
+    messages = mime_pipeline.parse_messages(fetch, list(raw))
+    attachments = sum(len(parsed[2]) for _, parsed in messages)
+    return time.perf_counter() - started, attachments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--workers", default="2,4,8", help="comma-separated process counts")
+    parser.add_argument("--attachment-kb", type=int, default=200)
+    parser.add_argument("--fetch-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings.configure(MIME_PIPELINE={"MIN_MESSAGES": 1})
+    raw = {str(i): synthetic_message(i, args.attachment_kb * 1024) for i in range(1, args.messages + 1)}
+    print(f"{len(raw)} messages, {sum(map(len, raw.values())) / 2**20:.0f} MiB, {os.cpu_count()} CPU(s)")
+
+    settings.MIME_PIPELINE = {"ENABLED": False}
+    baseline, _ = run(raw, args.fetch_ms)
+    print(f"  inline      {baseline:7.2f} s  {len(raw) / baseline:8.0f} msg/s")
+    for workers in (int(n) for n in args.workers.split(",")):
+        settings.MIME_PIPELINE = {"ENABLED": True, "MIN_MESSAGES": 1, "WORKERS": workers}
+        elapsed, _ = run(raw, args.fetch_ms)
+        print(f"  {workers:>2} workers  {elapsed:7.2f} s  {len(raw) / elapsed:8.0f} msg/s  {baseline / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
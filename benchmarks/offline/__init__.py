@@ -0,0 +1,7 @@
+"""
+Local stand-ins for the services the agents talk to, used by benchmarks/offline_suite.py
+and as fixtures by the end-to-end tests in agents/tests.py:
+a synthetic mailbox (corpus) served over a real IMAP socket (imap_server), and Object
+Storage, ORDS/PeopleSoft and GenAI agent stubs (stubs). Nothing here needs network access
+or OCI credentials.
+"""
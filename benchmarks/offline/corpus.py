@@ -0,0 +1,138 @@
+import base64
+import random
+from datetime import date, datetime
+from email.utils import format_datetime
+from functools import lru_cache
+
+# Alert wording matches the default rules in agents/alert_rules.py; invoice wording avoids them.
+ALERT_SUBJECTS = (
+    "CRITICAL: disk usage above 95% on {host}",
+    "Alert: nightly payment run failed on {host}",
+    "Warning: certificate for {host} expires in 7 days",
+    "Important notification: scheduled maintenance of {host}",
+)
+ALERT_BODY_LINES = (
+    "The monitoring system raised a critical alert for {host}.",
+    "Warning: the job on {host} did not finish within its window.",
+)
+INVOICE_WORDS = (
+    "please", "find", "attached", "invoice", "remittance", "payment", "terms", "net", "thirty",
+    "vendor", "purchase", "order", "total", "amount", "due", "regards", "accounts", "payable",
+)
+DUPLICATE_GROUPS = 25    # duplicate attachments share one of this many payloads
+
+
+class Message:
+    """One synthetic message, with the pieces an IMAP server hands out precomputed."""
+
+    __slots__ = ("uid", "raw", "header_fields", "sections", "bodystructure")
+
+    def __init__(self, uid, raw, header_fields, sections, bodystructure):
+        self.uid = uid
+        self.raw = raw
+        self.header_fields = header_fields
+        self.sections = sections
+        self.bodystructure = bodystructure
+
+
+def _quoted(value):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _base64_lines(payload):
+    encoded = base64.b64encode(payload)
+    return b"".join(encoded[i:i + 76] + b"\r\n" for i in range(0, len(encoded), 76))
+
+
+class Corpus:
+    """
+    A mailbox of `size` messages with UIDs 1..size, all received on `day`. Every message
+    is derived from its UID and the seed, so nothing is stored per message and two runs
+    with the same arguments see identical mail. A share of messages carries a PDF
+    attachment (some with content repeated across messages, for dedup) and a share are
+    alerts, worded to hit the default alert rules in the subject or only in the body.
+    """
+
+    def __init__(self, size, attachment_ratio=0.3, attachment_bytes=16 * 1024, alert_ratio=0.05,
+                 duplicate_ratio=0.05, seed=1, day=None, uid_validity=1):
+        self.size = size
+        self.attachment_ratio = attachment_ratio
+        self.attachment_bytes = attachment_bytes
+        self.alert_ratio = alert_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.seed = seed
+        self.day = day or date.today()
+        self.uid_validity = uid_validity
+        self.message = lru_cache(maxsize=128)(self._build)
+        # SEARCH tests several keys against one UID before moving on to the next.
+        self.meta = lru_cache(maxsize=128)(self._meta)
+
+    def grow(self, count):
+        """Delivers `count` more messages; returns the new UIDs."""
+        first = self.size + 1
+        self.size += count
+        return range(first, self.size + 1)
+
+    def _meta(self, uid):
+        """(sender, subject, text, attachment) where attachment is None or (filename, payload seed, size)."""
+        rng = random.Random(self.seed * 2_000_003 + uid)
+        host = f"host{rng.randrange(40):02d}"
+        if rng.random() < self.alert_ratio:
+            sender = f"Monitoring <monitoring@ops{rng.randrange(5)}.example.com>"
+            subject_line = rng.random() < 0.5
+            subject = (rng.choice(ALERT_SUBJECTS) if subject_line else "Status of {host}").format(host=host)
+            lines = [] if subject_line else [rng.choice(ALERT_BODY_LINES).format(host=host)]
+        else:
+            vendor = rng.randrange(1, 2000)
+            sender = f"Supplier {vendor} <ap@vendor{vendor}.example.com>"
+            subject = f"Invoice {uid:07d} for PO {rng.randrange(1, 10**6):010d}"
+            lines = []
+        lines += [" ".join(rng.choice(INVOICE_WORDS) for _ in range(12)) for _ in range(rng.randrange(3, 12))]
+        text = "".join(line + "\r\n" for line in lines)
+
+        attachment = None
+        if rng.random() < self.attachment_ratio:
+            if rng.random() < self.duplicate_ratio:
+                payload_seed = f"{self.seed}:duplicate:{uid % DUPLICATE_GROUPS}"
+                size = self.attachment_bytes
+            else:
+                payload_seed = f"{self.seed}:{uid}"
+                size = max(1, int(self.attachment_bytes * rng.uniform(0.5, 1.5)))
+            attachment = (f"invoice_{uid:07d}.pdf", payload_seed, size)
+        return sender, subject, text, attachment
+
+    def _build(self, uid):
+        sender, subject, text, attachment = self.meta(uid)
+        text = text.encode()
+        received = datetime.combine(self.day, datetime.min.time()).replace(hour=uid % 24, minute=uid % 60).astimezone()
+        headers = (
+            f"From: {sender}\r\nTo: invoices@example.com\r\nSubject: {subject}\r\n"
+            f"Date: {format_datetime(received)}\r\nMessage-ID: <{uid}.{self.seed}@offline.bench>\r\nMIME-Version: 1.0\r\n"
+        ).encode()
+        header_fields = f"From: {sender}\r\nSubject: {subject}\r\n\r\n".encode()
+        lines = text.count(b"\n")
+        text_structure = f'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" {len(text)} {lines})'
+
+        if attachment is None:
+            raw = headers + b"Content-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: 7bit\r\n\r\n" + text
+            return Message(uid, raw, header_fields, {"1": text}, text_structure.encode())
+
+        filename, payload_seed, size = attachment
+        encoded = _base64_lines(random.Random(payload_seed).randbytes(size))
+        boundary = f"=_offline_{uid}"
+        raw = b"".join([
+            headers,
+            f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n\r\n'.encode(),
+            f"--{boundary}\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: 7bit\r\n\r\n".encode(),
+            text,
+            f"\r\n--{boundary}\r\nContent-Type: application/pdf; name=\"{filename}\"\r\n"
+            f"Content-Disposition: attachment; filename=\"{filename}\"\r\nContent-Transfer-Encoding: base64\r\n\r\n".encode(),
+            encoded,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ])
+        attachment_structure = (
+            f'("APPLICATION" "PDF" ("NAME" {_quoted(filename)}) NIL NIL "BASE64" {len(encoded)} NIL '
+            f'("ATTACHMENT" ("FILENAME" {_quoted(filename)})) NIL NIL)'
+        )
+        bodystructure = f'({text_structure}{attachment_structure} "MIXED" ("BOUNDARY" {_quoted(boundary)}) NIL NIL NIL)'
+        return Message(uid, raw, header_fields, {"1": text, "2": encoded}, bodystructure.encode())
@@ -0,0 +1,301 @@
+import re
+import socketserver
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# FETCH items the agents ask for; BODY sections may carry a <offset.length> partial.
+_FETCH_ITEM = re.compile(
+    r"(?P<body>BODY(?P<peek>\.PEEK)?\[(?P<section>[^\]]*)\](?:<(?P<offset>\d+)\.(?P<length>\d+)>)?)"
+    r"|(?P<name>RFC822\.SIZE|RFC822|UID|BODYSTRUCTURE|FLAGS|INTERNALDATE)",
+    re.IGNORECASE,
+)
+_SEARCH_TOKEN = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()]+')
+_DATE_KEYS = {"SINCE", "BEFORE", "ON", "SENTSINCE", "SENTBEFORE", "SENTON"}
+_TEXT_KEYS = {"SUBJECT", "BODY", "FROM", "TEXT"}
+
+
+class IMAPError(Exception):
+    """Reported to the client as a tagged BAD."""
+
+
+def parse_uid_set(value, highest):
+    """Expands an IMAP UID set ("1,4,7:9,20:*") into a sorted list of UIDs in 1..highest."""
+    uids = set()
+    for item in value.split(","):
+        first, _, last = item.partition(":")
+        first = highest if first == "*" else int(first)
+        last = first if not last else highest if last == "*" else int(last)
+        low, high = sorted((first, last))
+        # "n:*" always includes the highest UID, even when it is below n.
+        uids.update(range(max(low, 1), min(high, highest) + 1))
+    return sorted(uids)
+
+
+def _unquote(token):
+    if token.startswith('"'):
+        return re.sub(r"\\(.)", r"\1", token[1:-1])
+    return token
+
+
+class _Search:
+    """Compiles UID SEARCH criteria into a predicate over UIDs of one Corpus."""
+
+    def __init__(self, corpus, seen):
+        self.corpus = corpus
+        self.seen = seen
+
+    def compile(self, criteria):
+        tokens = deque(_SEARCH_TOKEN.findall(criteria))
+        keys = []
+        while tokens:
+            keys.append(self._key(tokens))
+        return self._all(keys)
+
+    def _all(self, keys):
+        # Each key is (predicate, uid range or None); ranges narrow the UIDs that are tested.
+        low, high = 1, None
+        for _, bounds in keys:
+            if bounds:
+                low, high = max(low, bounds[0]), bounds[1] if high is None else min(high, bounds[1])
+        predicates = [predicate for predicate, _ in keys if predicate is not None]
+        predicate = (lambda uid: all(p(uid) for p in predicates)) if predicates else None
+        return predicate, (low, high) if high is not None or low > 1 else None
+
+    def _key(self, tokens):
+        token = tokens.popleft()
+        key = token.upper()
+        if token == "(":
+            keys = []
+            while tokens and tokens[0] != ")":
+                keys.append(self._key(tokens))
+            if not tokens:
+                raise IMAPError("Unbalanced parentheses in SEARCH")
+            tokens.popleft()
+            return self._all(keys)
+        if key == "OR":
+            left, right = self._predicate(self._key(tokens)), self._predicate(self._key(tokens))
+            return (lambda uid: left(uid) or right(uid)), None
+        if key == "NOT":
+            inner = self._predicate(self._key(tokens))
+            return (lambda uid: not inner(uid)), None
+        if key == "ALL":
+            return None, None
+        if key in ("SEEN", "UNSEEN"):
+            seen = self.seen
+            return ((lambda uid: uid in seen) if key == "SEEN" else (lambda uid: uid not in seen)), None
+        if key == "UID":
+            uids = set(parse_uid_set(tokens.popleft(), self.corpus.size))
+            return (lambda uid: uid in uids), (min(uids), max(uids)) if uids else (1, 0)
+        if key in _DATE_KEYS:
+            day = datetime.strptime(_unquote(tokens.popleft()), "%d-%b-%Y").date()
+            # Every message in the corpus is dated corpus.day.
+            if key.endswith("SINCE"):
+                match = self.corpus.day >= day
+            elif key.endswith("BEFORE"):
+                match = self.corpus.day < day
+            else:
+                match = self.corpus.day == day
+            return (None, None) if match else ((lambda uid: False), (1, 0))
+        if key in _TEXT_KEYS:
+            needle = _unquote(tokens.popleft()).lower()
+            return self._text(key, needle), None
+        raise IMAPError(f"Unsupported SEARCH key {token}")
+
+    def _predicate(self, compiled):
+        predicate, bounds = compiled
+        if bounds:
+            low, high = bounds
+            inner = predicate or (lambda uid: True)
+            return lambda uid: low <= uid <= high and inner(uid)
+        return predicate or (lambda uid: True)
+
+    def _text(self, key, needle):
+        meta = self.corpus.meta
+        if key == "SUBJECT":
+            return lambda uid: needle in meta(uid)[1].lower()
+        if key == "FROM":
+            return lambda uid: needle in meta(uid)[0].lower()
+        if key == "BODY":
+            return lambda uid: needle in meta(uid)[2].lower()
+        return lambda uid: any(needle in value.lower() for value in meta(uid)[:3])
+
+
+class _Session(socketserver.StreamRequestHandler):
+    """One client connection: a small IMAP4rev1 subset, enough for agents.mailbox and imaplib."""
+
+    # Responses go out in several writes; without this, delayed ACKs add ~40 ms per command.
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.selected = False
+        self.send(b"* OK [CAPABILITY IMAP4rev1 IDLE] offline benchmark IMAP server ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode("utf-8", errors="replace").rstrip("\r\n").partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            try:
+                if command == "LOGOUT":
+                    self.send(b"* BYE logging out")
+                    self.send(f"{tag} OK LOGOUT completed".encode())
+                    return
+                handler = getattr(self, f"do_{command}", None)
+                if handler is None:
+                    raise IMAPError(f"Unknown command {command}")
+                with self.server.lock:
+                    self.server.commands += 1
+                self.send(f"{tag} OK {handler(args) or command + ' completed'}".encode())
+            except (IMAPError, ValueError, IndexError) as e:
+                self.send(f"{tag} BAD {e}".encode())
+
+    def send(self, data):
+        self.wfile.write(data + b"\r\n")
+
+    def do_CAPABILITY(self, args):
+        self.send(b"* CAPABILITY IMAP4rev1 IDLE")
+
+    def do_LOGIN(self, args):
+        return "LOGIN completed"
+
+    def do_NOOP(self, args):
+        return None
+
+    def do_SELECT(self, args):
+        corpus = self.server.corpus
+        self.selected = True
+        self.send(f"* {corpus.size} EXISTS".encode())
+        self.send(b"* 0 RECENT")
+        self.send(f"* OK [UIDVALIDITY {corpus.uid_validity}] UIDs valid".encode())
+        self.send(f"* OK [UIDNEXT {corpus.size + 1}] Predicted next UID".encode())
+        self.send(b"* FLAGS (\\Seen)")
+        return "[READ-WRITE] SELECT completed"
+
+    do_EXAMINE = do_SELECT
+
+    def do_STATUS(self, args):
+        name = args.split(" ", 1)[0]
+        corpus = self.server.corpus
+        self.send(f"* STATUS {name} (MESSAGES {corpus.size} UIDVALIDITY {corpus.uid_validity} UIDNEXT {corpus.size + 1})".encode())
+
+    def do_UID(self, args):
+        if not self.selected:
+            raise IMAPError("No mailbox selected")
+        command, _, args = args.partition(" ")
+        command = command.upper()
+        if command == "SEARCH":
+            self.search(args)
+        elif command == "FETCH":
+            message_set, _, items = args.partition(" ")
+            self.fetch(message_set, items)
+        elif command == "STORE":
+            message_set, _, flags = args.partition(" ")
+            if "\\SEEN" in flags.upper():
+                uids = parse_uid_set(message_set, self.server.corpus.size)
+                with self.server.lock:
+                    (self.server.seen.difference_update if flags.startswith("-") else self.server.seen.update)(uids)
+        else:
+            raise IMAPError(f"Unsupported UID command {command}")
+        return f"UID {command} completed"
+
+    def search(self, criteria):
+        corpus = self.server.corpus
+        predicate, bounds = _Search(corpus, self.server.seen).compile(criteria)
+        low, high = bounds or (1, corpus.size)
+        uids = range(max(low, 1), min(high if high is not None else corpus.size, corpus.size) + 1)
+        matches = [str(uid) for uid in uids if predicate is None or predicate(uid)]
+        self.send(" ".join(["* SEARCH"] + matches).encode())
+
+    def fetch(self, message_set, items):
+        corpus = self.server.corpus
+        requested = list(_FETCH_ITEM.finditer(items))
+        if not requested:
+            raise IMAPError(f"Unsupported FETCH items {items}")
+        for uid in parse_uid_set(message_set, corpus.size):
+            if self.server.unsolicited and corpus.size > 1:
+                # A flag change on another message, reported in the middle of this FETCH.
+                self.send(b"* %d FETCH (FLAGS (\\Seen))" % (uid % corpus.size + 1))
+            message = corpus.message(uid)
+            parts = [b"UID %d" % uid]
+            for item in requested:
+                if item.group("body"):
+                    parts.append(self._body_item(message, item))
+                    if not item.group("peek"):
+                        self._mark_seen(uid)
+                    continue
+                name = item.group("name").upper()
+                if name == "RFC822":
+                    parts.append(b"RFC822 {%d}\r\n" % len(message.raw) + message.raw)
+                    self._mark_seen(uid)
+                elif name == "RFC822.SIZE":
+                    parts.append(b"RFC822.SIZE %d" % len(message.raw))
+                elif name == "BODYSTRUCTURE":
+                    parts.append(b"BODYSTRUCTURE " + message.bodystructure)
+                elif name == "FLAGS":
+                    parts.append(b"FLAGS (\\Seen)" if uid in self.server.seen else b"FLAGS ()")
+                elif name == "INTERNALDATE":
+                    parts.append(corpus.day.strftime('INTERNALDATE "%d-%b-%Y 09:00:00 +0000"').encode())
+            # imaplib reads "{n}" literals that end a line, so each literal is followed by the next item.
+            self.wfile.write(b"* %d FETCH (" % uid + b" ".join(parts) + b")\r\n")
+
+    def _body_item(self, message, item):
+        section = item.group("section").upper()
+        if section.startswith("HEADER.FIELDS"):
+            data = message.header_fields
+            name = f"BODY[{item.group('section')}]"
+        elif section == "":
+            data = message.raw
+            name = "BODY[]"
+        else:
+            data = message.sections.get(section, b"")
+            name = f"BODY[{section}]"
+        if item.group("offset") is not None:
+            offset = int(item.group("offset"))
+            data = data[offset:offset + int(item.group("length"))]
+            name += f"<{offset}>"
+        return name.encode() + b" {%d}\r\n" % len(data) + data
+
+    def _mark_seen(self, uid):
+        with self.server.lock:
+            self.server.seen.add(uid)
+
+
+class IMAPServer(socketserver.ThreadingTCPServer):
+    """
+    Serves a Corpus over plain IMAP on 127.0.0.1, one thread per connection. `latency`
+    seconds are added before every command to stand in for the round trip to a real
+    mail server. load() swaps in another corpus and forgets which messages were seen.
+    With `unsolicited`, every message in a FETCH response is preceded by an untagged
+    FETCH of another message's flags, as servers may send at any time.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, corpus, latency=0.0, unsolicited=False):
+        super().__init__(("127.0.0.1", 0), _Session)
+        self.corpus = corpus
+        self.latency = latency
+        self.unsolicited = unsolicited
+        self.seen = set()
+        self.commands = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def load(self, corpus):
+        with self.lock:
+            self.corpus = corpus
+            self.seen = set()
+            self.commands = 0
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="offline-imap", daemon=True).start()
+        return self
@@ -0,0 +1,194 @@
+import inspect
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+# PeopleSoft answers 404 for IDs starting with this, so negative caching is exercised too.
+UNKNOWN_ID_PREFIX = "X"
+
+
+class ObjectStorageStub:
+    """
+    Stands in for oci.object_storage.ObjectStorageClient: put_object reads the body, waits
+    `latency` seconds and records the object's size. Instances share one store, as the
+    upload pipeline builds a client per worker thread.
+    """
+
+    latency = 0.0
+    objects = {}
+    lock = threading.Lock()
+
+    def __init__(self, config=None, **kwargs):
+        pass
+
+    @classmethod
+    def reset(cls, latency=None):
+        with cls.lock:
+            cls.objects = {}
+        if latency is not None:
+            cls.latency = latency
+
+    def get_namespace(self, **kwargs):
+        return SimpleNamespace(data="offline-bench", status=200)
+
+    def put_object(self, namespace_name, bucket_name, object_name, put_object_body, **kwargs):
+        if isinstance(put_object_body, (bytes, bytearray)):
+            size = len(put_object_body)
+        else:
+            size = 0
+            for chunk in iter(lambda: put_object_body.read(io.DEFAULT_BUFFER_SIZE * 16), b""):
+                size += len(chunk)
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.objects[(bucket_name, object_name)] = size
+        return SimpleNamespace(status=200, headers={}, data=None)
+
+
+class _UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # keep-alive, like ORDS and the PeopleSoft gateway
+    disable_nagle_algorithm = True   # headers and body are separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        self._delay("peoplesoft")
+        if parts.path == "/peoplesoft/po":
+            po_id = query.get("PO_ID", "")
+            if not po_id or po_id.startswith(UNKNOWN_ID_PREFIX):
+                return self._reply(404, {"error": f"PO {po_id} not found"})
+            return self._reply(200, {"ABS_PO": {"PO_HDR": [{
+                "PO_ID": po_id, "BUSINESS_UNIT": "US001", "PO_STATUS": "D", "VENDOR_ID": f"V{po_id[-6:]}",
+                "PO_DT": "2026-01-15", "PO_AMT": f"{int(re.sub(r'[^0-9]', '', po_id) or 0) % 100000}.00",
+            }]}})
+        if parts.path == "/peoplesoft/vendor":
+            vendor_id = query.get("VENDOR_ID", "")
+            if not vendor_id or vendor_id.startswith(UNKNOWN_ID_PREFIX):
+                return self._reply(404, {"error": f"Vendor {vendor_id} not found"})
+            return self._reply(200, {"ABS_SUPPLIER": {"VENDOR": [{
+                "VENDOR_ID": vendor_id, "NAME1": f"Supplier {vendor_id}", "VENDOR_STATUS": "A", "COUNTRY": "USA",
+            }]}})
+        return self._reply(404, {"error": "no such route"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"null")
+        self._delay("ords")
+        if self.path.startswith("/ords/"):
+            rows = body if isinstance(body, list) else [body]
+            with self.server.lock:
+                self.server.ords_rows += len(rows)
+            return self._reply(200, {"inserted": len(rows)})
+        return self._reply(404, {"error": "no such route"})
+
+    def _delay(self, upstream):
+        with self.server.lock:
+            self.server.requests[upstream] = self.server.requests.get(upstream, 0) + 1
+        latency = self.server.latency.get(upstream, 0.0)
+        if latency:
+            time.sleep(latency)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    """
+    ORDS and PeopleSoft on one local HTTP server:
+
+        POST /ords/email, /ords/email/batch    email-detail rows (a row or a JSON array)
+        GET  /peoplesoft/po?PO_ID=...          ABS_PO.PO_HDR, as the getPO service returns it
+        GET  /peoplesoft/vendor?VENDOR_ID=...  ABS_SUPPLIER.VENDOR
+
+    `latency` maps "ords" and "peoplesoft" to seconds added to each of their requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=None):
+        super().__init__(("127.0.0.1", 0), _UpstreamHandler)
+        self.latency = dict(latency or {})
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.ords_rows = 0
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="offline-upstreams", daemon=True).start()
+        return self
+
+
+_ID = re.compile(r"\b(?=[A-Z0-9]*\d)[A-Z0-9]{1,10}\b")
+
+
+class ScriptedAgent:
+    """
+    Stands in for oci.addons.adk.Agent. Each run() waits `think` seconds (the model deciding
+    on a tool), calls the agent's first tool with the last ID-looking token of the prompt
+    for each of its parameters, reports the call through the ADK callbacks, waits `think`
+    seconds again (the model writing its answer) and returns the tool's output as the answer.
+    Agents without tools answer after one wait.
+    """
+
+    think = 0.0
+
+    def __init__(self, client=None, agent_endpoint_id=None, instructions=None, tools=None, **kwargs):
+        self.agent_endpoint_id = agent_endpoint_id
+        self.tools = list(tools or [])
+
+    def create_session(self):
+        return f"session-{uuid.uuid4().hex}"
+
+    def delete_session(self, session_id):
+        pass
+
+    def run(self, prompt, session_id=None, on_fulfilled_required_action=None, on_invoked_remote_service=None, **kwargs):
+        session_id = session_id or self.create_session()
+        self._wait(on_invoked_remote_service)
+        if not self.tools:
+            return SimpleNamespace(session_id=session_id, final_output=f"Summary of {len(prompt)} characters of input.")
+
+        tool = self.tools[0]
+        ids = _ID.findall(prompt.upper())
+        args = [ids[-1] if ids else ""] * len(inspect.signature(tool).parameters)
+        output = tool(*args)
+        if on_fulfilled_required_action:
+            name = getattr(tool, "_tool_name", tool.__name__)
+            on_fulfilled_required_action(
+                SimpleNamespace(function_call=SimpleNamespace(name=name, arguments=json.dumps(args))),
+                SimpleNamespace(function_call_output=json.dumps(output, default=str)),
+            )
+        self._wait(on_invoked_remote_service)
+        answer = output if isinstance(output, str) else json.dumps(output, default=str)
+        return SimpleNamespace(session_id=session_id, final_output=answer)
+
+    def _wait(self, on_invoked_remote_service):
+        if self.think:
+            time.sleep(self.think)
+        if on_invoked_remote_service:
+            on_invoked_remote_service(None, None)
+
+
+class AgentClientStub:
+    def __init__(self, **kwargs):
+        pass
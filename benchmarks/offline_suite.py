@@ -0,0 +1,456 @@
+"""
+Offline end-to-end benchmark of invoice ingest, alert summaries, PeopleSoft lookups and the views.
+
+    python benchmarks/offline_suite.py [--sizes 1000,10000,100000] [--imap-ms 0] [--storage-ms 0]
+        [--ords-ms 0] [--peoplesoft-ms 0] [--agent-ms 0] [--fetch-mode structure]
+        [--scenarios ingest,alerts,lookups,views] [--json results.json]
+        [--baseline results.json --tolerance 0.25]
+
+Runs the real code paths in this process against local stand-ins (benchmarks/offline):
+a synthetic mailbox served over IMAP on 127.0.0.1, an Object Storage client stub, ORDS and
+PeopleSoft on a local HTTP server, and a scripted agent that calls its tool deterministically.
+The *-ms options add latency per IMAP command, upload, HTTP request and model turn. Uses a
+throwaway sqlite database and needs no network access, credentials or .env settings. The
+stand-ins share the process (and its CPUs) with the code under test, so compare runs made
+on the same machine with the same options.
+
+After an unreported warm-up pass, for each mailbox size it reports throughput, p50/p95/p99 latency and peak RSS of:
+
+    ingest   process_from_email over the whole mailbox, then the APEX outbox rows still unsent
+    alerts   summarize_daily_alerts cold, after 1% new mail, and with nothing new
+    lookups  get_po_details from --threads threads, cold then warm cache
+    views    the PO page (fast path and agent) and the alert summary page, via the test client
+
+followed by per-stage latencies from agents.metrics. With --baseline, the run is compared with
+an earlier --json file and exits with status 1 when a throughput drops, or a p95 grows, by more
+than --tolerance.
+"""
+import argparse
+import functools
+import imaplib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+
+from offline.corpus import Corpus  # noqa: E402
+from offline.imap_server import IMAPServer  # noqa: E402
+from offline import stubs  # noqa: E402
+
+STAGE_METRIC = "oci_agents_stage_seconds_bucket"
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of `samples` (seconds), in milliseconds."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))] * 1000
+
+
+def stage_buckets(metrics):
+    """{stage: [(le, cumulative count), ...]} from the stage histogram in the /metrics text."""
+    buckets = {}
+    for line in metrics.registry.render().splitlines():
+        if not line.startswith(STAGE_METRIC + "{"):
+            continue
+        labels, _, count = line[len(STAGE_METRIC) + 1:].rpartition("} ")
+        fields = dict(item.split("=", 1) for item in labels.split(","))
+        le = fields["le"].strip('"')
+        buckets.setdefault(fields["stage"].strip('"'), []).append((float("inf") if le == "+Inf" else float(le), int(count)))
+    return buckets
+
+
+def histogram_quantile(buckets, q):
+    """Prometheus-style quantile estimate (milliseconds) from cumulative (le, count) buckets."""
+    total = buckets[-1][1]
+    if not total:
+        return None
+    rank = q * total
+    lower, below = 0.0, 0
+    for le, count in buckets:
+        if count >= rank:
+            if le == float("inf"):
+                return lower * 1000
+            return (lower + (le - lower) * (rank - below) / max(count - below, 1)) * 1000
+        lower, below = le, count
+    return lower * 1000
+
+
+def stage_report(metrics, before):
+    """Per-stage count and estimated p50/p95/p99 for observations since `before`."""
+    report = {}
+    for stage, buckets in stage_buckets(metrics).items():
+        previous = dict(before.get(stage, []))
+        delta = [(le, count - previous.get(le, 0)) for le, count in buckets]
+        if delta[-1][1]:
+            report[stage] = {"count": delta[-1][1], **{f"p{int(q * 100)}": histogram_quantile(delta, q) for q in (0.5, 0.95, 0.99)}}
+    return report
+
+
+class MemorySampler:
+    """Peak resident set size (MiB) while the block runs, sampled from /proc every 20 ms."""
+
+    def __init__(self):
+        self.peak = 0.0
+        self._stopping = threading.Event()
+
+    @staticmethod
+    def rss():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+        except (OSError, ValueError):
+            # No /proc: the process-wide high-water mark (KiB on Linux, bytes on macOS).
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+
+    def _sample(self):
+        while not self._stopping.wait(0.02):
+            self.peak = max(self.peak, self.rss())
+
+    def __enter__(self):
+        self.peak = self.rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopping.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.rss())
+
+
+def measure(name, items, fn, latencies=None):
+    """Runs fn() and returns (result, row) with throughput, latency percentiles and peak RSS."""
+    with MemorySampler() as memory:
+        started = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - started
+    count = items(result) if callable(items) else items
+    row = {
+        "scenario": name, "items": count, "seconds": round(seconds, 4),
+        "throughput": round(count / seconds, 2) if seconds else None,
+        "peak_rss_mib": round(memory.peak, 1),
+    }
+    for q in (0.5, 0.95, 0.99):
+        value = percentile(latencies, q) if latencies else None
+        row[f"p{int(q * 100)}_ms"] = round(value, 3) if value is not None else None
+    return result, row
+
+
+class Harness:
+    """Starts the stand-ins, points the settings at them and sets Django up on a temporary database."""
+
+    def __init__(self, args):
+        self.args = args
+        self.imap = IMAPServer(Corpus(0), latency=args.imap_ms / 1000).start()
+        self.upstreams = stubs.UpstreamServer({"ords": args.ords_ms / 1000, "peoplesoft": args.peoplesoft_ms / 1000}).start()
+        self.database = tempfile.NamedTemporaryFile(prefix="offline-bench-", suffix=".sqlite3", delete=False).name
+
+        os.environ.update({
+            "DJANGO_SETTINGS_MODULE": "OCI_Agents_App.settings",
+            "SMTP_HOST": "127.0.0.1", "SMTP_USER": "invoices@offline.bench", "SMTP_PASSWORD": "offline",
+            "SMTP_MAIL_SERVER": "127.0.0.1", "SMTP_MAIL_PORT": str(self.imap.port),
+            "EMAIL_FETCH_MODE": args.fetch_mode,
+        })
+        import oci
+
+        oci.config.from_file = lambda *a, **k: {}
+        oci.object_storage.ObjectStorageClient = stubs.ObjectStorageStub
+        stubs.ObjectStorageStub.reset(latency=args.storage_ms / 1000)
+        stubs.ScriptedAgent.think = args.agent_ms / 1000
+        # The pool opens IMAP4_SSL(host, timeout=...); serve it plain IMAP on the local port instead.
+        imaplib.IMAP4_SSL = functools.partial(imaplib.IMAP4, port=self.imap.port)
+
+        from django.conf import settings
+
+        settings.DATABASES["default"]["NAME"] = self.database
+        # The outbox flusher writes alongside the ingest; IMMEDIATE keeps sqlite from failing
+        # a read transaction's upgrade with "database is locked" instead of waiting.
+        settings.DATABASES["default"].setdefault("OPTIONS", {}).update(timeout=60, transaction_mode="IMMEDIATE")
+        settings.LOGGING_CONFIG = None    # keep debug.log out of it; warnings go to stderr
+        settings.ALLOWED_HOSTS = ["testserver"]
+        settings.AGENT_JOBS = {**getattr(settings, "AGENT_JOBS", {}), "ENABLED": False}
+        settings.OCI_WARM_UP = False
+        settings.PEOPLESOFT_API_URL = {
+            "GET_PO_PEOPLESOFT_API_URL": self.upstreams.url("/peoplesoft/po"),
+            "GET_VENDOR_PEOPLESOFT_API_URL": self.upstreams.url("/peoplesoft/vendor"),
+        }
+
+        import logging
+
+        import django
+        from django.core.management import call_command
+
+        django.setup()
+        logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s %(message)s")
+        call_command("migrate", verbosity=0, interactive=False)
+
+        from agents import agent_registry, agent_services, config_STAGE, metrics, models, outbox
+
+        agent_registry.Agent = stubs.ScriptedAgent
+        agent_registry.AgentClient = stubs.AgentClientStub
+        config_STAGE.APEX_API_URL_EMAIL = self.upstreams.url("/ords/email")
+        config_STAGE.APEX_API_URL_EMAIL_BATCH = self.upstreams.url("/ords/email/batch") if args.ords_batch else None
+        self.services, self.metrics, self.models, self.outbox = agent_services, metrics, models, outbox
+
+    def load(self, size):
+        """Fresh mailbox of `size` messages; clears every table and cache a previous size filled."""
+        args = self.args
+        corpus = Corpus(size, attachment_ratio=args.attachment_ratio, attachment_bytes=args.attachment_kb * 1024,
+                        alert_ratio=args.alert_ratio, duplicate_ratio=args.duplicate_ratio, seed=args.seed,
+                        uid_validity=size)
+        self.imap.load(corpus)
+        m = self.models
+        for model in (m.DuplicateAttachment, m.AttachmentDigest, m.MailboxCheckpoint, m.EmailDetailOutbox, m.AlertDigest):
+            model.objects.all().delete()
+        self.services.po_cache.clear()
+        self.services.vendor_cache.clear()
+        stubs.ObjectStorageStub.reset()
+        self.upstreams.reset()
+        return corpus
+
+    def close(self):
+        self.imap.shutdown()
+        self.upstreams.shutdown()
+        os.unlink(self.database)
+
+
+def bench_ingest(h):
+    rows = []
+    result, row = measure("ingest", lambda r: r.get("processed_emails", 0), h.services.process_from_email)
+    if "error" in result:
+        raise RuntimeError(f"process_from_email failed: {result['error']}")
+    row.update(attachments=result["attachments_uploaded"], duplicates=result["duplicates_skipped"],
+               errors=result["errors"], imap_commands=h.imap.commands)
+    rows.append(row)
+
+    # The background flusher sends rows during the ingest; time what is left once it returns.
+    outbox = h.models.EmailDetailOutbox
+    unsent = outbox.objects.exclude(status=outbox.SENT)
+    left = unsent.count()
+
+    def drain():
+        deadline = time.monotonic() + 600
+        while unsent.exists():
+            h.outbox.flush_until_empty()
+            if time.monotonic() > deadline:
+                raise RuntimeError("APEX outbox did not drain within 10 minutes")
+            time.sleep(0.05)
+
+    _, row = measure("outbox drain", left, drain)
+    row.update(ords_requests=h.upstreams.requests.get("ords", 0), ords_rows=h.upstreams.ords_rows)
+    rows.append(row)
+    return rows
+
+
+def bench_alerts(h, corpus):
+    rows = []
+    summarize = h.services.summarize_daily_alerts
+    _, row = measure("alerts cold", corpus.size, summarize)
+    rows.append(row)
+    new = corpus.grow(max(1, corpus.size // 100))
+    _, row = measure("alerts +1% new", len(new), summarize)
+    rows.append(row)
+    message, row = measure("alerts nothing new", 1, summarize)
+    if not message.startswith("📊"):
+        raise RuntimeError(f"summarize_daily_alerts failed: {message}")
+    row["alert_emails"] = sum(len(digest.alerts) for digest in h.models.AlertDigest.objects.all())
+    rows.append(row)
+    return rows
+
+
+def bench_lookups(h):
+    args = h.args
+    rng = random.Random(args.seed)
+    ids = [f"{i:010d}" for i in range(1, args.distinct_ids + 1)] + [f"X{i:09d}" for i in range(1, 11)]
+    # Popular POs are looked up far more often than the rest.
+    requests = rng.choices(ids, weights=[1 / rank for rank in range(1, len(ids) + 1)], k=args.lookups)
+    rows = []
+    for name in ("lookups cold", "lookups warm"):
+        if name == "lookups cold":
+            h.services.po_cache.clear()
+        latencies = []
+
+        def call(po_id):
+            started = time.perf_counter()
+            h.services.get_po_details(po_id)
+            latencies.append(time.perf_counter() - started)
+
+        def run():
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                list(pool.map(call, requests))
+
+        _, row = measure(name, len(requests), run, latencies)
+        stats = h.services.lookup_cache_stats()["po"]
+        row.update(hit_ratio=stats["hit_ratio"], peoplesoft_requests=h.upstreams.requests.get("peoplesoft", 0))
+        rows.append(row)
+    return rows
+
+
+def bench_views(h):
+    from django.test import Client
+
+    args = h.args
+    client = Client()
+    po_ids = [f"{i:010d}" for i in range(1, args.distinct_ids + 1)]
+    cases = (
+        ("view po fast path", "/getpo-agent/", lambda i: {"po_number": po_ids[i % len(po_ids)]}, args.view_requests),
+        ("view po agent", "/getpo-agent/",
+         lambda i: {"po_number": f"What is the status of purchase order {po_ids[i % len(po_ids)]}?"},
+         max(1, args.view_requests // 4)),
+        ("view alert summary", "/alertsummary-agent/", lambda i: {}, max(1, args.view_requests // 20)),
+    )
+    rows = []
+    for name, path, data, count in cases:
+        latencies = []
+
+        def run():
+            for i in range(count):
+                started = time.perf_counter()
+                response = client.post(path, data(i))
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} answered {response.status_code}")
+
+        _, row = measure(name, count, run, latencies)
+        rows.append(row)
+    return rows
+
+
+def run_scenarios(h, corpus, scenarios):
+    rows = []
+    if "ingest" in scenarios:
+        rows += bench_ingest(h)
+    if "alerts" in scenarios:
+        rows += bench_alerts(h, corpus)
+    if "lookups" in scenarios:
+        rows += bench_lookups(h)
+    if "views" in scenarios:
+        rows += bench_views(h)
+    return rows
+
+
+COLUMNS = (("scenario", "<20", None), ("items", ">9", "d"), ("seconds", ">9", ".2f"), ("throughput", ">11", ".1f"),
+           ("p50_ms", ">9", ".2f"), ("p95_ms", ">9", ".2f"), ("p99_ms", ">9", ".2f"), ("peak_rss_mib", ">9", ".0f"))
+HEADINGS = {"throughput": "items/s", "peak_rss_mib": "RSS MiB"}
+
+
+def _cell(value, align, spec):
+    text = "-" if value is None else format(value, spec) if spec else str(value)
+    return format(text, align)
+
+
+def print_size(size, corpus, rows, stages):
+    print(f"\n== {size:,} messages ({corpus.size:,} after new mail) ==")
+    print("  ".join(_cell(HEADINGS.get(name, name), align, None) for name, align, _ in COLUMNS))
+    for row in rows:
+        extra = {k: v for k, v in row.items() if k not in {name for name, _, _ in COLUMNS} and v is not None}
+        line = "  ".join(_cell(row.get(name), align, spec) for name, align, spec in COLUMNS)
+        print(line + ("  " + " ".join(f"{k}={v}" for k, v in extra.items()) if extra else ""))
+    print(f"  {'stage':<22}{'count':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, values in sorted(stages.items()):
+        print(f"  {stage:<22}{values['count']:>9}" + "".join(_cell(values[q], ">10", ".2f") for q in ("p50", "p95", "p99")))
+
+
+# Options that change the workload; a baseline run with other values is not comparable.
+WORKLOAD_OPTIONS = ("fetch_mode", "attachment_ratio", "attachment_kb", "alert_ratio", "duplicate_ratio", "imap_ms",
+                    "storage_ms", "ords_ms", "peoplesoft_ms", "agent_ms", "ords_batch", "lookups", "distinct_ids",
+                    "threads", "view_requests", "seed")
+MIN_SECONDS = 0.1        # scenarios faster than this are too noisy to compare throughput
+MIN_LATENCY_MS = 1.0     # nor are p95 changes smaller than this
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline`, as readable lines."""
+    regressions = []
+    for size, scenarios in results["sizes"].items():
+        before = {row["scenario"]: row for row in baseline.get("sizes", {}).get(size, {}).get("scenarios", [])}
+        for row in scenarios["scenarios"]:
+            old = before.get(row["scenario"])
+            if not old:
+                continue
+            name = f"{int(size):,} {row['scenario']}"
+            if min(row["seconds"], old["seconds"]) >= MIN_SECONDS and row["throughput"] < old["throughput"] * (1 - tolerance):
+                regressions.append(f"{name}: {row['throughput']:.1f} items/s, was {old['throughput']:.1f}")
+            if (old.get("p95_ms") is not None and row.get("p95_ms") is not None
+                    and row["p95_ms"] - old["p95_ms"] >= MIN_LATENCY_MS and row["p95_ms"] > old["p95_ms"] * (1 + tolerance)):
+                regressions.append(f"{name}: p95 {row['p95_ms']:.2f} ms, was {old['p95_ms']:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated mailbox sizes")
+    parser.add_argument("--scenarios", default="ingest,alerts,lookups,views", help="comma-separated subset to run")
+    parser.add_argument("--fetch-mode", choices=("structure", "rfc822"), default="structure")
+    parser.add_argument("--attachment-ratio", type=float, default=0.3)
+    parser.add_argument("--attachment-kb", type=int, default=16)
+    parser.add_argument("--alert-ratio", type=float, default=0.05)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05)
+    parser.add_argument("--imap-ms", type=float, default=0.0, help="added to every IMAP command")
+    parser.add_argument("--storage-ms", type=float, default=0.0, help="added to every Object Storage upload")
+    parser.add_argument("--ords-ms", type=float, default=0.0, help="added to every ORDS request")
+    parser.add_argument("--peoplesoft-ms", type=float, default=0.0, help="added to every PeopleSoft request")
+    parser.add_argument("--agent-ms", type=float, default=0.0, help="added to each of the two model turns of a run")
+    parser.add_argument("--no-ords-batch", dest="ords_batch", action="store_false",
+                        help="flush the outbox one row per request instead of through the batch endpoint")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--distinct-ids", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--view-requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--warm-up", type=int, default=200, help="mailbox size of an unreported first pass; 0 to skip")
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--baseline", help="results of an earlier --json run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    scenarios = set(args.scenarios.split(","))
+
+    h = Harness(args)
+    results = {"args": vars(args), "cpus": os.cpu_count(), "sizes": {}}
+    try:
+        print(f"Offline benchmark: {os.cpu_count()} CPU(s), {args.fetch_mode} fetch mode, IMAP on port {h.imap.port}")
+        if args.warm_up:
+            # Unreported: imports, templates, connections and agents are set up before anything is timed.
+            run_scenarios(h, h.load(args.warm_up), scenarios)
+        for size in (int(n) for n in args.sizes.split(",")):
+            corpus = h.load(size)
+            before = stage_buckets(h.metrics)
+            rows = run_scenarios(h, corpus, scenarios)
+            stages = stage_report(h.metrics, before)
+            print_size(size, corpus, rows, stages)
+            results["sizes"][str(size)] = {"scenarios": rows, "stages": stages}
+    finally:
+        h.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        differing = [name for name in WORKLOAD_OPTIONS if baseline.get("args", {}).get(name) != results["args"][name]]
+        if differing or baseline.get("cpus") != results["cpus"]:
+            print(f"\nNote: {args.baseline} ran with different {', '.join(differing) or 'CPU count'}; "
+                  "differences are not only code changes.")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            print("\n".join(f"  {line}" for line in regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
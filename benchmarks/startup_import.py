@@ -0,0 +1,93 @@
+"""
+Startup benchmark: how long it takes to import the agents app, and whether the import
+does any I/O (OCI config reads, DNS lookups or socket connects).
+
+    python benchmarks/startup_import.py [--repeat 5]
+
+Each sample imports the URLconf (and with it agents.views and agents.agent_services) in
+a fresh interpreter after django.setup(). Placeholder SMTP settings are used when the
+environment has none, so it runs without a .env. Exits with status 1 if any I/O happened.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child():
+    sys.path.insert(0, ROOT)
+    for key, value in (("SMTP_HOST", "imap.invalid"), ("SMTP_USER", "bench@invalid"), ("SMTP_PASSWORD", "x"),
+                       ("SMTP_MAIL_SERVER", "smtp.invalid"), ("SMTP_MAIL_PORT", "587")):
+        os.environ.setdefault(key, value)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "OCI_Agents_App.settings")
+
+    import socket
+
+    import django
+    import oci
+
+    io_calls = []
+
+    def blocked(name):
+        def call(*args, **kwargs):
+            io_calls.append(name)
+            raise OSError(f"{name} during import")
+        return call
+
+    socket.getaddrinfo = blocked("getaddrinfo")
+    socket.create_connection = blocked("create_connection")
+    socket.socket.connect = blocked("socket.connect")
+    oci.config.from_file = blocked("oci.config.from_file")
+
+    django.setup()
+    started = time.perf_counter()
+    error = None
+    try:
+        import OCI_Agents_App.urls  # noqa: F401
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"import_seconds": elapsed, "io_calls": io_calls, "error": error}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return 0
+
+    samples = []
+    for _ in range(args.repeat):
+        wall = time.perf_counter()
+        out = subprocess.run([sys.executable, __file__, "--child"], capture_output=True, text=True, cwd=ROOT)
+        wall = time.perf_counter() - wall
+        if out.returncode != 0:
+            print(out.stderr, file=sys.stderr)
+            return 1
+        sample = json.loads(out.stdout.strip().splitlines()[-1])
+        sample["process_seconds"] = wall
+        samples.append(sample)
+
+    imports = [s["import_seconds"] for s in samples]
+    processes = [s["process_seconds"] for s in samples]
+    io_calls = sorted({call for s in samples for call in s["io_calls"]})
+    errors = sorted({s["error"] for s in samples if s["error"]})
+    print(f"samples:               {len(samples)}")
+    print(f"URLconf import median: {statistics.median(imports) * 1000:.1f} ms (max {max(imports) * 1000:.1f} ms)")
+    print(f"process boot median:   {statistics.median(processes) * 1000:.1f} ms")
+    print(f"I/O during import:     {', '.join(io_calls) if io_calls else 'none'}")
+    for error in errors:
+        print(f"import error:          {error}")
+    return 1 if io_calls or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())